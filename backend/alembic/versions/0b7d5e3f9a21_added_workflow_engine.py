@@ -0,0 +1,28 @@
+"""Added engine to workflows
+
+Revision ID: 0b7d5e3f9a21
+Revises: e4f1c2a9b6d3
+Create Date: 2026-10-18 16:42:09.731204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0b7d5e3f9a21'
+down_revision: Union[str, None] = 'e4f1c2a9b6d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('workflows', sa.Column('engine', sa.String(), server_default='pandas', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('workflows', 'engine')
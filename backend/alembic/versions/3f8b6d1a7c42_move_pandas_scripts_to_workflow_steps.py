@@ -0,0 +1,73 @@
+"""Moved pandas_scripts and step_stats to workflow_steps, indexed workflows.created_by
+
+Revision ID: 3f8b6d1a7c42
+Revises: 9c4a1f6e2b85
+Create Date: 2026-10-18 21:02:47.913560
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f8b6d1a7c42'
+down_revision: Union[str, None] = '9c4a1f6e2b85'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'workflow_steps',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('workflow_id', sa.Integer(), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.Column('code', sa.Text(), nullable=False),
+        sa.Column('code_hash', sa.String(length=64), nullable=False),
+        sa.Column('stats', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['workflow_id'], ['workflows.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_workflow_steps_workflow_id_position', 'workflow_steps', ['workflow_id', 'position'], unique=True)
+
+    # One row per script, stats taken from the same position (hash as in workflowCompiler.script_hash)
+    op.execute("""
+        INSERT INTO workflow_steps (workflow_id, position, code, code_hash, stats)
+        SELECT w.id, row_number() OVER (PARTITION BY w.id ORDER BY s.ord), s.code,
+               encode(sha256(convert_to(s.code, 'UTF8')), 'hex'),
+               NULLIF(w.step_stats -> (s.ord::int - 1), 'null'::jsonb)
+        FROM workflows w, unnest(w.pandas_scripts) WITH ORDINALITY AS s(code, ord)
+        WHERE s.code IS NOT NULL
+    """)
+
+    op.drop_column('workflows', 'step_stats')
+    op.drop_column('workflows', 'pandas_scripts')
+    op.create_index(op.f('ix_workflows_created_by'), 'workflows', ['created_by'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_workflows_created_by'), table_name='workflows')
+    op.add_column('workflows', sa.Column('pandas_scripts', postgresql.ARRAY(sa.String()), nullable=True))
+    op.add_column('workflows', sa.Column('step_stats', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+    op.execute("""
+        UPDATE workflows w
+        SET pandas_scripts = s.scripts, step_stats = s.stats
+        FROM (
+            SELECT workflow_id, array_agg(code ORDER BY position) AS scripts,
+                   jsonb_agg(stats ORDER BY position) AS stats
+            FROM workflow_steps
+            GROUP BY workflow_id
+        ) s
+        WHERE w.id = s.workflow_id
+    """)
+    op.execute("UPDATE workflows SET pandas_scripts = '{}' WHERE pandas_scripts IS NULL")
+
+    op.drop_index('ix_workflow_steps_workflow_id_position', table_name='workflow_steps')
+    op.drop_table('workflow_steps')
@@ -0,0 +1,29 @@
+"""Added input_columns to workflows
+
+Revision ID: 5d2e8c4b7f10
+Revises: 0b7d5e3f9a21
+Create Date: 2026-10-18 18:20:47.215903
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2e8c4b7f10'
+down_revision: Union[str, None] = '0b7d5e3f9a21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('workflows', sa.Column('input_columns', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('workflows', 'input_columns')
@@ -0,0 +1,30 @@
+"""Added upload_hash to workflows
+
+Revision ID: 9c4a1f6e2b85
+Revises: 5d2e8c4b7f10
+Create Date: 2026-10-18 20:11:36.508127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c4a1f6e2b85'
+down_revision: Union[str, None] = '5d2e8c4b7f10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('workflows', sa.Column('upload_hash', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_workflows_upload_hash'), 'workflows', ['upload_hash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_workflows_upload_hash'), table_name='workflows')
+    op.drop_column('workflows', 'upload_hash')
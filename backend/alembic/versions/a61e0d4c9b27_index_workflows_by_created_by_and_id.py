@@ -0,0 +1,30 @@
+"""Replaced ix_workflows_created_by with (created_by, id) for keyset listings
+
+Revision ID: a61e0d4c9b27
+Revises: 3f8b6d1a7c42
+Create Date: 2026-10-18 21:40:13.276015
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a61e0d4c9b27'
+down_revision: Union[str, None] = '3f8b6d1a7c42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_workflows_created_by_id', 'workflows', ['created_by', 'id'], unique=False)
+    op.drop_index(op.f('ix_workflows_created_by'), table_name='workflows')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(op.f('ix_workflows_created_by'), 'workflows', ['created_by'], unique=False)
+    op.drop_index('ix_workflows_created_by_id', table_name='workflows')
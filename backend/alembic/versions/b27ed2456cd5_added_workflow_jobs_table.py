@@ -0,0 +1,48 @@
+"""Added workflow_jobs table
+
+Revision ID: b27ed2456cd5
+Revises: 43bfec8460a7
+Create Date: 2026-10-18 10:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b27ed2456cd5'
+down_revision: Union[str, None] = '43bfec8460a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('workflow_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('workflow_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('result_path', sa.String(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['workflow_id'], ['workflows.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_workflow_jobs_id'), 'workflow_jobs', ['id'], unique=False)
+    op.create_index(op.f('ix_workflow_jobs_workflow_id'), 'workflow_jobs', ['workflow_id'], unique=False)
+    # Workers only ever scan for claimable jobs
+    op.create_index('ix_workflow_jobs_claimable', 'workflow_jobs', ['status', 'id'], unique=False,
+                    postgresql_where=sa.text("status IN ('queued', 'running')"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_workflow_jobs_claimable', table_name='workflow_jobs')
+    op.drop_index(op.f('ix_workflow_jobs_workflow_id'), table_name='workflow_jobs')
+    op.drop_index(op.f('ix_workflow_jobs_id'), table_name='workflow_jobs')
+    op.drop_table('workflow_jobs')
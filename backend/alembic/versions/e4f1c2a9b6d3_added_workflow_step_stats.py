@@ -0,0 +1,29 @@
+"""Added step_stats to workflows
+
+Revision ID: e4f1c2a9b6d3
+Revises: b27ed2456cd5
+Create Date: 2026-10-18 14:05:22.418530
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4f1c2a9b6d3'
+down_revision: Union[str, None] = 'b27ed2456cd5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('workflows', sa.Column('step_stats', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('workflows', 'step_stats')
@@ -1,14 +1,29 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 # from app.routes.excelProcess import excel
 # from app.routes.excelProcess.excelProcessor import router as excel_router
 from app.routes.workflow.workflow import router as workflow_router
 from app.routes.profile.profile import router as profile_router
+from app.routes.workflow.workflowExecutor import start_executor, shutdown_executor
+from app.routes.workflow.workflowJobs import start_job_workers, stop_job_workers
+from app.routes.workflow.workflowUploadStore import MAX_UPLOAD_MB, request_too_large
+from app.utils.metrics import render_metrics
 
 
 app = FastAPI()
 
 
+# Oversized uploads are refused from their Content-Length, before the body is read and spooled to disk
+UPLOAD_PATHS = {"/workflow/start-workflow", "/workflow/process-file"}
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    if request.url.path in UPLOAD_PATHS and request_too_large(request.headers.get("content-length")):
+        return JSONResponse(status_code=413, content={"detail": f"Uploads are limited to {MAX_UPLOAD_MB} MB"})
+    return await call_next(request)
+
+# Added last so it wraps everything, refusals included
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173", "http://localhost:8080"],  # Frontend URL
@@ -22,8 +37,24 @@ app.add_middleware(
 app.include_router(workflow_router, prefix="/workflow", tags=["Workflow"])
 app.include_router(profile_router, prefix="/profile", tags=["Profile"])
 
+# Pre-warm the sandbox processes that run generated pandas code, then start the job workers
+@app.on_event("startup")
+async def startup():
+    start_executor()
+    start_job_workers()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await stop_job_workers()
+    shutdown_executor()
+
 @app.get("/")
 async def read_root():
     return {"message": "Excel processing API!"}
 
+# Prometheus-style metrics (DB pool, caches, ...)
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return render_metrics()
+
 # To run the app, use: uvicorn main:app --reload
\ No newline at end of file
@@ -1,25 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import HTTPAuthorizationCredentials,APIKeyHeader,OAuth2PasswordRequestForm
 from app.routes.profile.profileModels import User
 from app.routes.profile.profileSchemas import UserCreate, UserResponse, Token
-from app.routes.profile.profileHelperFunctions import hash_password, verify_password, create_jwt_token, verify_google_token, get_current_user
-from app.utils.db import get_db
+from app.routes.profile.profileHelperFunctions import hash_password, verify_password, password_needs_rehash, create_jwt_token, verify_google_token, get_current_user, get_current_user_id
+from app.routes.profile.profilePasswordExecutor import password_hasher
+from app.utils.db import get_async_db
 from dotenv import load_dotenv
 
 router = APIRouter()
 oauth2_scheme = APIKeyHeader(name="Authorization", auto_error=True)
 
 
+def client_ip(request: Request):
+    return request.client.host if request.client else None
+
+
 # Signup API (Site Registration)
 @router.post("/signup", response_model=Token)
-def signup(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
+async def signup(user: UserCreate, request: Request, db: AsyncSession = Depends(get_async_db)):
+    db_user = (await db.execute(select(User).where(User.email == user.email))).scalars().first()
     
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_password = hash_password(user.password)
+    # bcrypt is CPU-bound, it runs on its own bounded executor
+    hashed_password = await password_hasher.run(hash_password, user.password, client_ip=client_ip(request))
     new_user = User(
         email=user.email,
         hashed_password=hashed_password,
@@ -31,39 +39,47 @@ def signup(user: UserCreate, db: Session = Depends(get_db)):
     )
 
     db.add(new_user)
-    db.commit()
+    await db.commit()
 
-    return {"access_token": create_jwt_token(user.email), "token_type": "bearer"}
+    return {"access_token": create_jwt_token(new_user.email, new_user.id), "token_type": "bearer"}
 
 # Login API (Site Login)
 @router.post("/login", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == form_data.username).first()
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = (await db.execute(select(User).where(User.email == form_data.username))).scalars().first()
     
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not user.hashed_password or not await password_hasher.run(
+        verify_password, form_data.password, user.hashed_password, client_ip=client_ip(request)
+    ):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    return {"access_token": create_jwt_token(user.email), "token_type": "bearer"}
+    # The password is known here, so upgrade hashes made with an outdated cost
+    if password_needs_rehash(user.hashed_password):
+        user.hashed_password = await password_hasher.run(hash_password, form_data.password, client_ip=client_ip(request))
+        await db.commit()
+
+    return {"access_token": create_jwt_token(user.email, user.id), "token_type": "bearer"}
 
 # Google Auth API
 @router.post("/google-login", response_model=Token)
-def google_login(token: str, db: Session = Depends(get_db)):
-    email = verify_google_token(token)
+async def google_login(token: str, db: AsyncSession = Depends(get_async_db)):
+    # Google token verification fetches certificates over HTTP
+    email = await run_in_threadpool(verify_google_token, token)
     if not email:
         raise HTTPException(status_code=400, detail="Invalid Google Token")
 
-    user = db.query(User).filter(User.email == email).first()
+    user = (await db.execute(select(User).where(User.email == email))).scalars().first()
 
     if not user:
         user = User(email=email, auth_provider="google")
         db.add(user)
-        db.commit()
+        await db.commit()
 
-    return {"access_token": create_jwt_token(email), "token_type": "bearer"}
+    return {"access_token": create_jwt_token(user.email, user.id), "token_type": "bearer"}
 
 # Profile Endpoint
 @router.get("/profile")
-def get_profile(user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_profile(user: dict = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     try:
         # JWT standard uses 'sub' for subject identifier
         user_email = user.get("sub")
@@ -74,8 +90,9 @@ def get_profile(user: dict = Depends(get_current_user), db: Session = Depends(ge
                 detail="Invalid token: missing email/subject"
             )
             
-        # Fetch user profile from the database
-        user = db.query(User).filter(User.email == user_email).first()
+        # Fetch user profile from the database (by primary key, the id comes from the token)
+        user_id = await get_current_user_id(user, db)
+        user = await db.get(User, user_id) if user_id else None
         
         if not user:
             raise HTTPException(
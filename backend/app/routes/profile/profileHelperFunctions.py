@@ -1,26 +1,59 @@
 import jwt
 import bcrypt
 import os
+import threading
+import time
+from cachetools import TLRUCache, TTLCache
 from google.oauth2 import id_token
 from google.auth.transport import requests
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBearer
 from jwt import ExpiredSignatureError, DecodeError
+from sqlalchemy import event, select
+from app.routes.profile.profileModels import User
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 security = HTTPBearer()
+
+# Decoded tokens and email -> user id lookups are cached for hot-path requests
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "300"))  # Seconds
+
+
+def _token_expiry(token, payload, now):
+    # Never keep a token cached past its own expiry
+    ttl = AUTH_CACHE_TTL
+    if "exp" in payload:
+        ttl = min(ttl, payload["exp"] - time.time())
+    return now + ttl
+
+
+_token_cache = TLRUCache(maxsize=AUTH_CACHE_SIZE, ttu=_token_expiry)
+_user_id_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+_cache_lock = threading.Lock()
+
+# bcrypt cost factor; stored hashes with a different cost are upgraded on the next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
 # Hash password
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode()
 
 # Verify password
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode(), hashed_password.encode())
 
-# Generate JWT token
-def create_jwt_token(email: str) -> str:
-    return jwt.encode({"sub": email}, SECRET_KEY, algorithm=ALGORITHM)
+# Whether a stored hash was made with a different cost than the configured one ("$2b$<cost>$...")
+def password_needs_rehash(hashed_password: str) -> bool:
+    try:
+        return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return False
+
+# Generate JWT token (carries the user id so requests don't have to look it up)
+def create_jwt_token(email: str, user_id: int) -> str:
+    return jwt.encode({"sub": email, "uid": user_id}, SECRET_KEY, algorithm=ALGORITHM)
 
 # Verify Google OAuth token
 def verify_google_token(token: str):
@@ -32,17 +65,58 @@ def verify_google_token(token: str):
 
 # Get current user
 # Authentication Dependency
-def get_current_user(credentials: str = Depends(security)):
+async def get_current_user(credentials: str = Depends(security)):
+    token = credentials.credentials  # Extract token
+
+    with _cache_lock:
+        cached = _token_cache.get(token)
+    if cached is not None:
+        return cached
+
     try:
-        print(f"Received Credentials: {credentials}")  # Debugging
-        token = credentials.credentials  # Extract token
-        print(f"Extracted Token: {token}")  # Debugging
-        
         decoded_token = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return decoded_token  # This will contain user details from the token
     except ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token has expired")
     except DecodeError:
         raise HTTPException(status_code=401, detail="Invalid token")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+    with _cache_lock:
+        _token_cache[token] = decoded_token
+    return decoded_token  # This will contain user details from the token
+
+
+# User id of the token owner: embedded in new tokens, looked up (and cached) for older ones
+async def get_current_user_id(current_user: dict, db):
+    if current_user.get("uid"):
+        return current_user["uid"]
+
+    email = current_user.get("sub")
+    if not email:
+        return None
+
+    with _cache_lock:
+        user_id = _user_id_cache.get(email)
+    if user_id is not None:
+        return user_id
+
+    user_id = (await db.execute(select(User.id).where(User.email == email))).scalar()
+    if user_id is not None:
+        with _cache_lock:
+            _user_id_cache[email] = user_id
+    return user_id
+
+
+# Drop cached auth state of a user whenever the user row changes
+def invalidate_user(email: str) -> None:
+    with _cache_lock:
+        _user_id_cache.pop(email, None)
+        for token in [t for t, payload in _token_cache.items() if payload.get("sub") == email]:
+            _token_cache.pop(token, None)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target):
+    invalidate_user(target.email)
@@ -0,0 +1,63 @@
+import asyncio
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+from app.utils.metrics import register_collector
+
+# bcrypt gets its own small pool so login storms can't starve the threadpool used by the data endpoints
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+# Hash operations allowed to wait or run at once before new ones are rejected with 503
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+# Hash operations a single client IP may have in flight before getting 429
+PASSWORD_HASH_PER_IP = int(os.getenv("PASSWORD_HASH_PER_IP", "2"))
+
+
+class PasswordHasher:
+    """Runs bcrypt on a bounded executor with a global queue limit and a per-IP concurrency limit."""
+
+    def __init__(self, workers: int, max_pending: int, per_ip: int):
+        self.max_pending = max_pending
+        self.per_ip = per_ip
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        # Only touched from the event loop, no locking needed
+        self.pending = 0
+        self.rejected = 0
+        self._pending_per_ip = defaultdict(int)
+
+    @asynccontextmanager
+    async def _slot(self, client_ip):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Too many authentication requests, try again shortly", headers={"Retry-After": "1"})
+        if client_ip and self._pending_per_ip[client_ip] >= self.per_ip:
+            self.rejected += 1
+            raise HTTPException(status_code=429, detail="Too many concurrent authentication requests", headers={"Retry-After": "1"})
+
+        self.pending += 1
+        if client_ip:
+            self._pending_per_ip[client_ip] += 1
+        try:
+            yield
+        finally:
+            self.pending -= 1
+            if client_ip:
+                self._pending_per_ip[client_ip] -= 1
+                if not self._pending_per_ip[client_ip]:
+                    del self._pending_per_ip[client_ip]
+
+    async def run(self, fn, *args, client_ip: str = None):
+        async with self._slot(client_ip):
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING, PASSWORD_HASH_PER_IP)
+
+
+@register_collector
+def password_hasher_metrics():
+    return [
+        ("password_hash_pending", "gauge", "Password hash operations queued or running.", [({}, password_hasher.pending)]),
+        ("password_hash_rejected_total", "counter", "Password hash operations rejected by the limits.", [({}, password_hasher.rejected)]),
+    ]
@@ -1,42 +1,64 @@
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
-from fastapi.responses import JSONResponse  # ✅ Correct import
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, UploadFile, File, Form, Header, HTTPException
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse  # ✅ Correct import
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 import pandas as pd
 import io
 import openai
-import magic
-from app.routes.workflow.workflowModels import Workflow
-from app.routes.workflow.workflowSchemas import WorkflowResponse
-from app.utils.db import get_db
+from app.routes.workflow.workflowModels import Workflow, WorkflowJob, WorkflowStep
+from app.routes.workflow.workflowSchemas import WorkflowResponse, WorkflowJobResponse, WorkflowListResponse
+from app.routes.workflow.workflowExecutor import SandboxError, execute_chain, execute_engine, execute_workflow, execute_workflow_chunked, dry_run_script
+from app.routes.workflow.workflowEngines import DEFAULT_ENGINE, ENGINES, Engine, EngineUnavailable, available_engines, get_engine
+from app.routes.workflow.workflowVectorize import VECTORIZE_SCRIPTS, optimize_script
+from app.routes.workflow.workflowSheets import workflow_sheet_names
+from app.routes.workflow.workflowFileTypes import detect_kind
+from app.routes.workflow.workflowLoader import file_kind
+from app.routes.workflow.workflowChunking import ChunkingUnsupported, chain_is_row_local
+from app.routes.workflow.workflowCheckpoints import bytes_hash
+from app.routes.workflow.workflowProjection import chain_input_columns, projected_input_hash
+from app.routes.workflow.workflowSteps import append_step, load_workflow, lock_workflow, store_step_stats
+from app.routes.workflow.workflowStorage import TEMP_DIR, columnar_path, ingest_upload, load_upload, is_large_upload, record_sample_schema
+from app.routes.workflow.workflowUploadStore import UploadTooLarge, store_upload, link_upload, reuse_ingested, remember_ingested, evict_uploads
+from app.routes.workflow.workflowStreaming import OUTPUT_FORMATS, stream_dataframe, stream_csv_file
+from app.routes.workflow.workflowCodeCache import code_cache, make_cache_key
+from app.routes.workflow.workflowJobs import job_events
+from app.routes.workflow.workflowBatch import BATCH_MODES, BATCH_PARALLELISM, save_batch_inputs, remove_batch_inputs, run_batch, stream_batch_results, concat_batch_results
+from app.utils.db import get_async_db
 from dotenv import load_dotenv
-import shutil
 import os
-from app.routes.profile.profileHelperFunctions import get_current_user
+from urllib.parse import quote
+from typing import List, Optional
+import json
+from app.routes.profile.profileHelperFunctions import get_current_user, get_current_user_id
 from app.routes.profile.profileModels import User
 load_dotenv()
 
 # Load API key from environment variable
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-# Initialize OpenAI Client
-client = openai.OpenAI(api_key=OPENAI_API_KEY)
+# Initialize OpenAI Client (async, so waiting on the model doesn't hold a worker thread)
+client = openai.AsyncOpenAI(api_key=OPENAI_API_KEY)
 router = APIRouter()
 
+# Workflows per page of GET /workflow
+WORKFLOW_PAGE_SIZE = int(os.getenv("WORKFLOW_PAGE_SIZE", "50"))
+WORKFLOW_PAGE_MAX = int(os.getenv("WORKFLOW_PAGE_MAX", "500"))
 
-def generate_pandas_code(headers, preview_rows, prompt):
-    """Generates Pandas code using GPT-4o mini."""
-    client = openai.OpenAI()  # Initialize OpenAI client
 
-    system_prompt = (
-        "You are a Python assistant that generates valid Pandas code only in simple text format(just the code, no markdown, no nothing). "
-        "The dataset is already stored in a DataFrame named `df`. Do not redefine `df`. "
-        "Ensure the output is always a DataFrame named `result_df`, even if filtering only one column. "
-        "Your response must be only the valid Pandas code."
-    )
+async def generate_pandas_code(headers, preview_rows, prompt, sheet_names=(), engine="pandas"):
+    """Generates the code of a step for the workflow's engine (Pandas by default) using GPT-4o mini."""
+
+    system_prompt = ENGINES[engine].system_prompt
 
     user_message = f"The dataset has columns: {headers}. First few rows:\n{preview_rows}\n\n{prompt}"
+    if sheet_names:
+        user_message = (
+            f"`df` is the first sheet of a workbook. The workbook's sheets are also available as DataFrames "
+            f"in the dict `sheets`, keyed by name: {list(sheet_names)}.\n{user_message}"
+        )
 
-    response = client.chat.completions.create(
+    response = await client.chat.completions.create(
         model="gpt-4o-mini",
         messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_message}],
         temperature=0.3
@@ -49,127 +71,319 @@ def generate_pandas_code(headers, preview_rows, prompt):
 
 
 
-ALLOWED_FILE_TYPES = {
-    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",  # .xlsx
-    "application/vnd.ms-excel"  # .xls
-}
+# Blocking helpers below run in the threadpool so pandas work never stalls the event loop,
+# generated scripts themselves run in the sandbox processes (workflowExecutor)
+
+def save_and_ingest_upload(digest: str, file_name: str, workflow_id: int) -> str:
+    """Links the stored upload into temp/ and converts it to its columnar copy. Returns where the data lives."""
+    file_path = link_upload(digest, workflow_id, file_name)
+
+    try:
+        if reuse_ingested(digest, workflow_id, file_name):
+            pass  # Same content was uploaded before, its columnar copy is shared
+        elif is_large_upload(workflow_id, file_name):
+            # Loading it whole could exhaust memory; chunked applies read the raw CSV directly
+            record_sample_schema(workflow_id, file_name)
+        else:
+            ingest_upload(workflow_id, file_name)
+            remember_ingested(digest, workflow_id)
+    except Exception:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+
+    if os.path.exists(columnar_path(workflow_id)):
+        return columnar_path(workflow_id)
+    return file_path
+
+
+def upload_kind(source, file_name: str) -> str:
+    """File type check shared by every upload endpoint: "csv" or "excel", 400 for anything else."""
+    kind = detect_kind(source, file_name)
+    if kind is None:
+        raise HTTPException(status_code=400, detail=f"Unsupported file format: {file_name}")
+    return kind
+
+
+def load_uploaded_frame(contents: bytes, file_name: str, workflow_id: int, columns=None) -> pd.DataFrame:
+    """Sniffs the file type of an upload and parses it (only columns, if given) with the workflow's recorded dtypes."""
+    return load_upload(io.BytesIO(contents), upload_kind(contents, file_name), workflow_id, columns)
+
+
+def workflow_engine(workflow: Workflow) -> Engine:
+    """Engine of a workflow, 400 if its package isn't installed on this server."""
+    try:
+        return get_engine(workflow.engine)
+    except EngineUnavailable as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def to_csv_string(df: pd.DataFrame) -> str:
+    return df.to_csv(index=False)
+
+
+def read_and_remove(path: str) -> str:
+    try:
+        with open(path) as f:
+            return f.read()
+    finally:
+        os.remove(path)
+
+
+@router.get("", response_model=WorkflowListResponse)
+async def list_workflows(
+    cursor: Optional[int] = None,
+    limit: int = WORKFLOW_PAGE_SIZE,
+    include_step_count: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    The user's workflows, newest first, without their scripts. Pages are keyset based: pass the
+    next_cursor of a page as cursor to get the following one (stable while workflows are added).
+    """
+    user_id = await get_current_user_id(current_user, db)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Invalid user authentication")
+    limit = max(1, min(limit, WORKFLOW_PAGE_MAX))
+
+    columns = [Workflow.id, Workflow.file_name, Workflow.engine]
+    if include_step_count:
+        # Counted per row of the page from the (workflow_id, position) index
+        columns.append(
+            select(func.count()).where(WorkflowStep.workflow_id == Workflow.id).scalar_subquery().label("step_count")
+        )
+    # Walks ix_workflows_created_by_id backwards, one extra row tells whether there's a next page
+    query = select(*columns).where(Workflow.created_by == user_id).order_by(Workflow.id.desc()).limit(limit + 1)
+    if cursor is not None:
+        query = query.where(Workflow.id < cursor)
+
+    rows = (await db.execute(query)).mappings().all()
+    page = [dict(row) for row in rows[:limit]]
+    return {"workflows": page, "next_cursor": page[-1]["id"] if len(rows) > limit else None}
+
 
 @router.post("/start-workflow")
-def start_workflow(
+async def start_workflow(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    engine: str = DEFAULT_ENGINE,
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user),  # Make sure it's a dict
 ):
-    if file.content_type not in ALLOWED_FILE_TYPES:
-        raise HTTPException(status_code=400, detail=f"Unsupported file type: {file.content_type}")
-
-    os.makedirs("temp", exist_ok=True)
-    print(current_user)
-    user = db.query(User).filter(User.email == current_user["sub"]).first()
-    # Extract user ID correctly
-    user_id = user.id  # Use .get() to avoid KeyError
-    print(user_id)
+    try:
+        get_engine(engine)
+    except EngineUnavailable as e:
+        raise HTTPException(status_code=400, detail=f"{e} (available: {', '.join(available_engines())})")
+
+    # The client's content_type isn't trusted, the bytes are sniffed like in process-file
+    kind = await run_in_threadpool(upload_kind, file.file, file.filename)
+    if kind != file_kind(file.filename):
+        # Stored uploads are parsed according to their extension
+        raise HTTPException(status_code=400, detail=f"File content doesn't match its extension: {file.filename}")
+
+    os.makedirs(TEMP_DIR, exist_ok=True)
+    # Extract user ID correctly (embedded in the token, cached lookup for older tokens)
+    user_id = await get_current_user_id(current_user, db)
     if not user_id:
         raise HTTPException(status_code=401, detail="Invalid user authentication")
 
-    workflow = Workflow(file_name=file.filename, pandas_scripts=[], created_by=user_id)
+    # Streamed to the content-addressed store while hashing, a file uploaded before isn't stored again
+    try:
+        digest = await store_upload(file)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    workflow = Workflow(file_name=file.filename, engine=engine, upload_hash=digest, created_by=user_id)
     db.add(workflow)
-    db.commit()
-    db.refresh(workflow)
+    await db.commit()
+    await db.refresh(workflow)
 
-    file_path = os.path.join("temp", f"{workflow.id}_{file.filename}")
+    # Parse the upload once and keep a columnar copy for every later apply
+    try:
+        file_path = await run_in_threadpool(save_and_ingest_upload, digest, file.filename, workflow.id)
+    except Exception as e:
+        await db.delete(workflow)
+        await db.commit()
+        raise HTTPException(status_code=400, detail=f"Could not read uploaded file: {str(e)}")
 
-    with open(file_path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
+    # Unreferenced content beyond the store budget and files of deleted workflows (throttled), after the response
+    background_tasks.add_task(evict_uploads)
 
     return {"message": "Workflow started", "workflow_id": workflow.id, "file_path": file_path}
 
 
 
 @router.post("/process-file")
-def process_file(
+async def process_file(
     workflow_id: int,
     prompt: str = Form(...),
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    output_format: str = "json",
+    dry_run: bool = True,
+    accept_encoding: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    workflow = db.query(Workflow).filter(Workflow.id == workflow_id).first()
+    if output_format not in OUTPUT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported output format: {output_format}")
+
+    workflow = await load_workflow(db, workflow_id)
     if not workflow:
         raise HTTPException(status_code=404, detail="Workflow not found")
+    engine = workflow_engine(workflow)
+
+    contents = await file.read()
 
-    contents = file.file.read()
+    # The existing steps only need these columns of the upload (None: all of them)
+    input_columns = None if engine.lazy else workflow.input_columns
 
-    # Detect file type
-    mime = magic.Magic(mime=True)
-    file_type = mime.from_buffer(contents[:2048])  # Check first 2KB
+    # Steps are chained: checkpoints of earlier steps are keyed by the hash of this upload
+    input_hash = projected_input_hash(await run_in_threadpool(bytes_hash, contents), input_columns)
+    df = await run_in_threadpool(load_uploaded_frame, contents, file.filename, workflow.id, input_columns)
 
-    # Load DataFrame
-    if file_type == "text/csv":
-        df = pd.read_csv(io.BytesIO(contents))
-    elif file_type in ALLOWED_FILE_TYPES:
-        df = pd.read_excel(io.BytesIO(contents), engine="openpyxl")
-    else:
-        raise HTTPException(status_code=400, detail="Unsupported file format")
+    # Only the parsed frame is needed from here on, release the raw upload
+    # (the upload stays open, a projected run that fails reads it again in full)
+    del contents
 
     # Debug: Print original DataFrame
     print("Original DataFrame before processing:\n", df.head())
 
     if df.empty:
+        await file.close()
         return JSONResponse(content={"error": "Uploaded file contains no data."}, status_code=400)
 
-    # Extract headers and preview rows
-    headers = list(df.columns)
-    preview_rows = df.head(5).to_dict(orient="records")
+    # The new step works on the output of the existing ones (served from checkpoints when unchanged)
+    previous_scripts = workflow.pandas_scripts
+    steps = []
+    try:
+        try:
+            step_input_df = await execute_chain(workflow.id, input_hash, df, previous_scripts, workflow.file_name, steps, engine.name)
+        except (KeyError, AttributeError) as e:
+            if input_columns is None:
+                raise
+            # input_columns is a static guess; a step read a column it left out, so load them all
+            print(f"Projected run of workflow {workflow.id} failed, loading every column: {e!r}")
+            await file.seek(0)
+            contents = await file.read()
+            input_hash = await run_in_threadpool(bytes_hash, contents)
+            df = await run_in_threadpool(load_uploaded_frame, contents, file.filename, workflow.id, None)
+            del contents
+            steps = []
+            step_input_df = await execute_chain(workflow.id, input_hash, df, previous_scripts, workflow.file_name, steps, engine.name)
+    except Exception as e:
+        return JSONResponse(content={"error": f"Execution error in a previous step: {str(e)}"}, status_code=400)
+    finally:
+        await file.close()
 
-    # Generate Pandas code using AI
-    generated_code = generate_pandas_code(headers, preview_rows, prompt)
+    # Extract headers and preview rows
+    headers = list(step_input_df.columns)
+    preview_df = step_input_df.head(5)
+    preview_rows = preview_df.to_dict(orient="records")
+    dtypes = step_input_df.dtypes
+    del step_input_df  # Only its schema and preview are needed for code generation
+
+    # Generate Pandas code using AI, unless the same prompt already ran on the same schema
+    # Only pandas scripts get the other sheets of a workbook
+    sheet_names = () if engine.lazy else await run_in_threadpool(workflow_sheet_names, workflow.id, workflow.file_name)
+    cache_key = make_cache_key(headers, dtypes, prompt, sheet_names, engine.name)
+    generated_code = await run_in_threadpool(code_cache.get, cache_key)
+    cached = generated_code is not None
+    if not cached:
+        generated_code = await generate_pandas_code(headers, preview_rows, prompt, sheet_names, engine.name)
 
     # Debug: Print generated Pandas code
     print(f"Generated Pandas Code:\n{generated_code}")
 
-    # Ensure pandas_scripts is initialized
-    if workflow.pandas_scripts is None:
-        workflow.pandas_scripts = []
-
-    # Save generated code to workflow
-    workflow.pandas_scripts.append(generated_code)
-    db.add(workflow)
-    db.commit()
-    db.refresh(workflow)
-
-    # Prepare execution environment
-    exec_globals = {"df": df.copy(), "pd": pd}
-    exec_globals["result_df"] = df.copy()  # Ensure result_df exists
+    # Fail fast, before the script is saved or run on the whole file
+    report = engine.validate(generated_code, headers)
+    if not report.ok:
+        return JSONResponse(
+            content={"error": "Generated code failed validation.", "problems": report.errors, "generated_code": generated_code},
+            status_code=400,
+        )
+    if dry_run:
+        try:
+            if engine.lazy:
+                await execute_engine(engine.name, [generated_code], preview_df)
+            else:
+                await dry_run_script(workflow.id, generated_code, preview_df, workflow.file_name)
+        except Exception as e:
+            return JSONResponse(
+                content={"error": f"Generated code failed on the preview rows: {str(e)}", "generated_code": generated_code},
+                status_code=400,
+            )
+
+    # Row-wise lambdas/loops are swapped for a vectorized version when one gives the same output
+    optimization = None
+    if report.warnings and VECTORIZE_SCRIPTS and not cached and not engine.lazy:
+        generated_code, optimization = await optimize_script(
+            workflow.id, generated_code, preview_df, workflow.file_name,
+            lambda hint: generate_pandas_code(headers, preview_rows, f"{prompt}\n\n{hint}", sheet_names),
+        )
+        if optimization:
+            report = engine.validate(generated_code, headers)
+
+    if not cached:
+        # Only code that passed validation is cached (in its optimized form)
+        await run_in_threadpool(code_cache.set, cache_key, generated_code)
+
+    # Save generated code to workflow (one new workflow_steps row); the step was made for the output of
+    # previous_scripts, if another request appended a step meanwhile it belongs after that one's output
+    if await lock_workflow(db, workflow.id) != len(previous_scripts):
+        await db.rollback()
+        return JSONResponse(
+            content={"error": "Another step was added to the workflow meanwhile, send the prompt again."},
+            status_code=409,
+        )
+    append_step(workflow, generated_code)
+    # Lazy engines prune columns in their own query plans
+    workflow.input_columns = None if engine.lazy else chain_input_columns(workflow.pandas_scripts)
+    await db.commit()
 
-    # Execute generated Pandas code
     try:
-        exec(generated_code, exec_globals)
+        # Runs in a sandbox process with CPU and memory limits, only the new step executes
+        result_df = await execute_chain(
+            workflow.id, input_hash, df, previous_scripts + [generated_code], workflow.file_name, steps, engine.name
+        )
     except Exception as e:
         return JSONResponse(content={"error": f"Execution error: {str(e)}"}, status_code=400)
 
-    # Extract 'result_df' safely
-    result_df = exec_globals.get("result_df")
+    # Timing / memory of the steps that actually ran (checkpointed ones are skipped)
+    await store_step_stats(db, workflow, steps)
 
     if result_df is None:
         return JSONResponse(content={"error": "Generated code did not produce a valid DataFrame."}, status_code=400)
 
-    # Ensure result_df is a DataFrame
-    if isinstance(result_df, pd.Series):
-        result_df = result_df.to_frame()
-
     # Debug: Print processed DataFrame
     print("Processed DataFrame after execution:\n", result_df)
 
     if result_df.empty:
         return JSONResponse(content={"error": "Processed DataFrame is empty."}, status_code=400)
 
+    # Stream the result in row chunks instead of building one big string
+    if output_format != "json":
+        return stream_dataframe(
+            result_df,
+            output_format,
+            accept_encoding,
+            headers={
+                "X-Generated-Code": quote(generated_code),
+                "X-Script-Warnings": quote(json.dumps(report.warnings)),
+                "X-Script-Optimization": quote(json.dumps({k: v for k, v in (optimization or {}).items() if k != "original_code"})),
+                "X-Step-Stats": quote(json.dumps(steps)),
+            },
+        )
+
     # Convert DataFrame to CSV
-    csv_string = result_df.to_csv(index=False)
+    csv_string = await run_in_threadpool(to_csv_string, result_df)
 
     # Return response
     return JSONResponse(
         content={
             "generated_code": generated_code,
+            "warnings": report.warnings,
+            "optimization": optimization,
+            "steps": steps,
             "csv_output": csv_string
         }
     )
@@ -178,19 +392,148 @@ def process_file(
 
 
 
+@router.get("/sheets")
+async def get_workflow_sheets(workflow_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Sheet names of the workflow's workbook, read without parsing any sheet."""
+    workflow = await db.get(Workflow, workflow_id)
+    if not workflow:
+        raise HTTPException(status_code=404, detail="Workflow not found")
+    return {"sheets": await run_in_threadpool(workflow_sheet_names, workflow.id, workflow.file_name)}
+
+
+@router.get("/code-cache-stats")
+async def code_cache_stats():
+    return await run_in_threadpool(code_cache.stats)
+
+
 @router.post("/apply-workflow")
-def apply_workflow(workflow_id: int, db: Session = Depends(get_db)):
-    workflow = db.query(Workflow).filter(Workflow.id == workflow_id).first()
+async def apply_workflow(
+    workflow_id: int,
+    output_format: str = "json",
+    chunked: bool = False,
+    accept_encoding: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Replays a workflow on its upload. With chunked=true, workflows made only of row-local steps
+    (filters, column derivations) run chunk by chunk with bounded memory; others load the whole file.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported output format: {output_format}")
+
+    workflow = await load_workflow(db, workflow_id)
     if not workflow:
         raise HTTPException(status_code=404, detail="Workflow not found")
+    engine = workflow_engine(workflow)
+
+    scripts = workflow.pandas_scripts
+    if chunked and not engine.lazy and chain_is_row_local(scripts):
+        steps = []
+        try:
+            output_path = await execute_workflow_chunked(workflow.id, workflow.file_name, scripts, steps, workflow.input_columns)
+        except ChunkingUnsupported as e:
+            print(f"Chunked run not possible, loading the whole file: {e}")
+        except SandboxError:
+            raise  # Over the job limits, a full load would only do worse
+        except Exception as e:
+            # A step that isn't row-local after all (the check is static); the full run decides
+            print(f"Chunked run failed, loading the whole file: {e}")
+        else:
+            await store_step_stats(db, workflow, steps)
+            if output_format != "json":
+                return stream_csv_file(output_path, output_format, accept_encoding, headers={
+                    "X-Execution-Mode": "chunked",
+                    "X-Step-Stats": quote(json.dumps(steps)),
+                })
+            output_csv = await run_in_threadpool(read_and_remove, output_path)
+            return {"message": "Workflow applied.", "steps": steps, "output": output_csv}
+
+    steps = []
+    df_result = await execute_workflow(workflow.id, workflow.file_name, scripts, steps, engine.name, workflow.input_columns)
+    await store_step_stats(db, workflow, steps)
+
+    if output_format != "json":
+        return stream_dataframe(df_result, output_format, accept_encoding, headers={
+            "X-Execution-Mode": "fused" if engine.lazy else "full",
+            "X-Step-Stats": quote(json.dumps(steps)),
+        })
+
+    output_csv = await run_in_threadpool(to_csv_string, df_result)
+    return {"message": "Workflow applied.", "steps": steps, "output": output_csv}
+
+
+@router.post("/apply-workflow-batch")
+async def apply_workflow_batch(
+    workflow_id: int,
+    files: List[UploadFile] = File(...),
+    mode: str = "stream",
+    parallelism: int = BATCH_PARALLELISM,
+    accept_encoding: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Applies a workflow to many files (CSV/Excel, or .zip archives of them) in parallel.
+    mode=stream returns NDJSON with one line per file as it finishes; mode=concat returns a single CSV
+    with a source_file column and the failed files in the X-Batch-Failures header.
+    """
+    if mode not in BATCH_MODES:
+        raise HTTPException(status_code=400, detail=f"Unsupported batch mode: {mode}")
+
+    workflow = await load_workflow(db, workflow_id)
+    if not workflow:
+        raise HTTPException(status_code=404, detail="Workflow not found")
+
+    directory, inputs, skipped = await run_in_threadpool(save_batch_inputs, files)
+    if not inputs:
+        remove_batch_inputs(directory)
+        raise HTTPException(status_code=400, detail="No CSV or Excel files in the upload")
+
+    results = run_batch(workflow.id, workflow.pandas_scripts, inputs, parallelism, workflow_engine(workflow).name)
+
+    if mode == "stream":
+        return StreamingResponse(stream_batch_results(results, skipped, directory), media_type="application/x-ndjson")
+
+    df_result, failures = await concat_batch_results(results, skipped, directory)
+    if df_result is None:
+        return JSONResponse(status_code=400, content={"error": "Every file failed", "failures": failures})
+    return stream_dataframe(df_result, "csv", accept_encoding, headers={"X-Batch-Failures": quote(json.dumps(failures))})
+
+
+@router.post("/apply-workflow-async", response_model=WorkflowJobResponse)
+async def apply_workflow_async(workflow_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Queues an apply-workflow run and returns right away; poll /jobs/{id} or subscribe to /jobs/{id}/events."""
+    workflow = await db.get(Workflow, workflow_id)
+    if not workflow:
+        raise HTTPException(status_code=404, detail="Workflow not found")
+
+    job = WorkflowJob(workflow_id=workflow.id, status="queued", attempts=0)
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    return job
+
+
+@router.get("/jobs/{job_id}", response_model=WorkflowJobResponse)
+async def get_job(job_id: int, db: AsyncSession = Depends(get_async_db)):
+    job = await db.get(WorkflowJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/jobs/{job_id}/events")
+async def get_job_events(job_id: int):
+    return StreamingResponse(job_events(job_id), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
-    with open(f"temp/{workflow_id}_{workflow.file_name}", "rb") as f:
-        df = pd.read_csv(f)
 
-    exec_globals = {"pd": pd, "df": df}
-    for code in workflow.pandas_scripts:
-        exec(code, exec_globals)
+@router.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: int, db: AsyncSession = Depends(get_async_db)):
+    job = await db.get(WorkflowJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status == "failed":
+        raise HTTPException(status_code=400, detail=f"Job failed: {job.error}")
+    if job.status != "succeeded" or not job.result_path or not os.path.exists(job.result_path):
+        raise HTTPException(status_code=409, detail=f"Job result not available (status: {job.status})")
 
-    df_result = exec_globals["df"]
-    output_csv = df_result.to_csv(index=False)
-    return {"message": "Workflow applied.", "output": output_csv}
+    return FileResponse(job.result_path, media_type="text/csv", filename=f"workflow_{job.workflow_id}_job_{job.id}.csv")
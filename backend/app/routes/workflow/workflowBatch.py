@@ -0,0 +1,145 @@
+import asyncio
+import json
+import os
+import shutil
+import uuid
+import zipfile
+import pandas as pd
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from app.routes.workflow.workflowExecutor import SANDBOX_WORKERS, execute_file
+from app.routes.workflow.workflowFileTypes import detect_kind
+from app.routes.workflow.workflowProfiling import record_steps
+from app.routes.workflow.workflowStorage import TEMP_DIR
+
+# Files of one batch processed at the same time (also capped by the sandbox pool size)
+BATCH_PARALLELISM = int(os.getenv("BATCH_PARALLELISM", str(max(SANDBOX_WORKERS, 1))))
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "1000"))
+
+BATCH_DIR = os.path.join(TEMP_DIR, "batch")
+BATCH_MODES = {"stream", "concat"}
+
+
+def _unique_path(directory: str, name: str) -> str:
+    # Archives often contain the same file name in several folders
+    path = os.path.join(directory, name)
+    stem, extension = os.path.splitext(name)
+    counter = 1
+    while os.path.exists(path):
+        path = os.path.join(directory, f"{stem}_{counter}{extension}")
+        counter += 1
+    return path
+
+
+def save_batch_inputs(files: list[UploadFile]):
+    """
+    Writes the uploaded files (and the spreadsheets inside uploaded .zip archives) to a batch directory.
+    Returns (directory, [(name, kind, path)], [(name, error)] for skipped files).
+    """
+    directory = os.path.join(BATCH_DIR, uuid.uuid4().hex)
+    os.makedirs(directory, exist_ok=True)
+    inputs, skipped = [], []
+
+    def add(name: str, source) -> None:
+        if len(inputs) >= BATCH_MAX_FILES:
+            skipped.append((name, f"Batch is limited to {BATCH_MAX_FILES} files"))
+            return
+        path = _unique_path(directory, os.path.basename(name))
+        with open(path, "wb") as f:
+            shutil.copyfileobj(source, f)
+        with open(path, "rb") as f:
+            kind = detect_kind(f, name)
+        if kind is None:
+            os.remove(path)
+            skipped.append((name, "Unsupported file type"))
+            return
+        inputs.append((name, kind, path))
+
+    for file in files:
+        if file.filename.lower().endswith(".zip"):
+            try:
+                with zipfile.ZipFile(file.file) as archive:
+                    for member in archive.infolist():
+                        if member.is_dir() or os.path.basename(member.filename).startswith("."):
+                            continue
+                        with archive.open(member) as source:
+                            add(member.filename, source)
+            except zipfile.BadZipFile:
+                skipped.append((file.filename, "Invalid zip archive"))
+        else:
+            add(file.filename, file.file)
+
+    return directory, inputs, skipped
+
+
+def remove_batch_inputs(directory: str) -> None:
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+async def run_batch(workflow_id: int, scripts: list[str], inputs, parallelism: int, engine: str = "pandas"):
+    """
+    Runs the scripts over every input in the sandbox pool, yielding
+    (position in inputs, name, DataFrame or None, error) as files finish.
+    """
+    semaphore = asyncio.Semaphore(max(1, parallelism))
+
+    async def run_one(position: int, name: str, kind: str, path: str):
+        async with semaphore:
+            steps = []
+            try:
+                return position, name, await execute_file(workflow_id, scripts, path, kind, steps, engine), None
+            except Exception as e:
+                # One bad file doesn't abort the batch
+                return position, name, None, str(e)
+            finally:
+                record_steps(workflow_id, steps)
+
+    tasks = [asyncio.create_task(run_one(position, *item)) for position, item in enumerate(inputs)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def _result_line(name: str, df, error) -> bytes:
+    if error is not None:
+        record = {"file": name, "status": "failed", "error": error}
+    else:
+        record = {"file": name, "status": "succeeded", "rows": len(df), "csv": df.to_csv(index=False)}
+    return (json.dumps(record) + "\n").encode("utf-8")
+
+
+async def stream_batch_results(results, skipped, directory: str):
+    """NDJSON stream with one line per file, in completion order."""
+    try:
+        for name, error in skipped:
+            yield _result_line(name, None, error)
+        async for _, name, df, error in results:
+            yield await run_in_threadpool(_result_line, name, df, error)
+    finally:
+        remove_batch_inputs(directory)
+
+
+async def concat_batch_results(results, skipped, directory: str):
+    """
+    Waits for every file and stacks the outputs in upload order, with a source_file column.
+    Returns (DataFrame or None, failures).
+    """
+    frames = []
+    failures = [{"file": name, "error": error} for name, error in skipped]
+    try:
+        async for position, name, df, error in results:
+            if error is not None:
+                failures.append({"file": name, "error": error})
+            else:
+                frames.append((position, df.assign(source_file=name)))
+    finally:
+        remove_batch_inputs(directory)
+
+    if not frames:
+        return None, failures
+    frames.sort(key=lambda item: item[0])
+    combined = await run_in_threadpool(pd.concat, [df for _, df in frames], ignore_index=True)
+    return combined, failures
@@ -0,0 +1,93 @@
+import hashlib
+import os
+import shutil
+import pandas as pd
+from app.routes.workflow.workflowCompiler import script_hash
+from app.routes.workflow.workflowStorage import TEMP_DIR, read_columnar, write_columnar
+
+CHECKPOINT_DIR = os.path.join(TEMP_DIR, "checkpoints")
+# Distinct inputs (uploads) per workflow whose checkpoints are kept on disk
+CHECKPOINT_INPUTS_PER_WORKFLOW = int(os.getenv("CHECKPOINT_INPUTS_PER_WORKFLOW", "2"))
+
+
+def bytes_hash(contents: bytes) -> str:
+    """Input hash of an in-memory upload."""
+    return hashlib.sha256(contents).hexdigest()
+
+
+def file_hash(path: str) -> str:
+    """Cheap input hash of a stored file (path, size and mtime), avoids reading it back."""
+    stat = os.stat(path)
+    return hashlib.sha256(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8")).hexdigest()
+
+
+def chain_keys(input_hash: str, scripts: list[str]) -> list[str]:
+    """Key of the output of every step: each one covers the input and all scripts up to that step."""
+    keys = []
+    key = input_hash
+    for code in scripts:
+        key = hashlib.sha256(f"{key}:{script_hash(code)}".encode("utf-8")).hexdigest()
+        keys.append(key)
+    return keys
+
+
+def _input_dir(workflow_id: int, input_hash: str) -> str:
+    return os.path.join(CHECKPOINT_DIR, str(workflow_id), input_hash[:32])
+
+
+def checkpoint_path(workflow_id: int, input_hash: str, step: int, key: str) -> str:
+    return os.path.join(_input_dir(workflow_id, input_hash), f"{step}_{key[:32]}.arrow")
+
+
+def latest_checkpoint(workflow_id: int, input_hash: str, scripts: list[str]):
+    """Returns (number of steps covered, path) of the furthest checkpoint of the chain, or (0, None)."""
+    keys = chain_keys(input_hash, scripts)
+    for step in range(len(keys), 0, -1):
+        path = checkpoint_path(workflow_id, input_hash, step, keys[step - 1])
+        if os.path.exists(path):
+            os.utime(_input_dir(workflow_id, input_hash))  # Marks the input as recently used
+            return step, path
+    return 0, None
+
+
+def load_checkpoint(path: str) -> pd.DataFrame:
+    return read_columnar(path)
+
+
+def save_checkpoint(workflow_id: int, input_hash: str, step: int, key: str, df: pd.DataFrame):
+    """
+    Materializes the output of a step, replacing checkpoints of older versions of that step and its successors.
+    Returns the checkpoint path, or None if the frame can't be stored as Arrow.
+    """
+    directory = _input_dir(workflow_id, input_hash)
+    is_new_input = not os.path.isdir(directory)
+    os.makedirs(directory, exist_ok=True)
+
+    path = checkpoint_path(workflow_id, input_hash, step, key)
+    for name in os.listdir(directory):
+        # A step was rewritten: everything at or after it belongs to the old chain
+        if name.endswith(".arrow") and int(name.split("_", 1)[0]) >= step and os.path.join(directory, name) != path:
+            os.remove(os.path.join(directory, name))
+
+    stored = write_columnar(df, path)
+
+    if is_new_input:
+        _prune_inputs(workflow_id)
+
+    return path if stored else None
+
+
+def _prune_inputs(workflow_id: int) -> None:
+    """Keeps the checkpoints of only the most recently used inputs of a workflow."""
+    workflow_dir = os.path.join(CHECKPOINT_DIR, str(workflow_id))
+    inputs = []
+    for name in os.listdir(workflow_dir):
+        try:
+            inputs.append((os.path.getmtime(os.path.join(workflow_dir, name)), os.path.join(workflow_dir, name)))
+        except FileNotFoundError:  # Pruned concurrently by another worker
+            continue
+
+    inputs.sort(reverse=True)
+    for _, directory in inputs[CHECKPOINT_INPUTS_PER_WORKFLOW:]:
+        shutil.rmtree(directory, ignore_errors=True)
+
@@ -0,0 +1,268 @@
+import ast
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from app.routes.workflow.workflowLoader import STRING_DTYPE, file_kind, project_schema, projected_columns
+from app.routes.workflow.workflowStorage import columnar_path, load_schema, raw_upload_path
+
+# Rows per chunk in out-of-core mode
+CHUNK_ROWS = int(os.getenv("CHUNK_ROWS", "100000"))
+
+# Methods that compute every output row from the matching input row only
+ROW_LOCAL_METHODS = {
+    # Values and types
+    "astype", "fillna", "replace", "isin", "isna", "notna", "isnull", "notnull", "between", "clip", "round",
+    "abs", "where", "mask", "map", "combine_first", "copy", "to_frame",
+    "add", "sub", "mul", "div", "truediv", "floordiv", "mod", "pow", "eq", "ne", "lt", "le", "gt", "ge",
+    # Columns
+    "assign", "rename", "drop", "filter", "select_dtypes", "insert", "pop", "dropna", "query",
+    # Only row-local on a single column or with axis=1, see _check_call
+    "apply",
+}
+# Element-wise methods of the .str / .dt / .cat accessors (some mean something else on a frame, e.g. count)
+ACCESSORS = {"str", "dt", "cat"}
+ACCESSOR_METHODS = {
+    "strip", "lstrip", "rstrip", "lower", "upper", "title", "capitalize", "casefold", "swapcase", "contains",
+    "startswith", "endswith", "split", "rsplit", "len", "slice", "cat", "zfill", "pad", "center", "ljust", "rjust",
+    "extract", "get", "join", "match", "fullmatch", "findall", "count", "find", "replace", "strftime",
+    "normalize", "floor", "ceil", "round", "tz_localize", "tz_convert", "day_name", "month_name",
+    "add_categories", "rename_categories", "remove_unused_categories", "as_ordered", "as_unordered",
+}
+PANDAS_FUNCTIONS = {"to_datetime", "to_numeric", "to_timedelta", "isna", "notna", "isnull", "notnull", "Timestamp", "Timedelta"}
+PANDAS_CONSTANTS = {"NA", "NaT"}
+LAMBDA_BUILTINS = {"str", "int", "float", "bool", "len", "abs", "round", "min", "max", "sum", "isinstance"}
+# Attributes that depend on the position of a row in the whole frame or on the frame as a whole
+# (values / array / to_numpy drop the index, so rows can be picked by position, e.g. .values[0])
+GLOBAL_ATTRIBUTES = {"iloc", "iat", "index", "shape", "size", "T", "empty", "axes", "ndim", "is_unique",
+                     "is_monotonic_increasing", "is_monotonic_decreasing", "hasnans", "nbytes",
+                     "values", "array", "to_numpy", "at"}
+
+ALLOWED_NODES = (
+    ast.Module, ast.Assign, ast.AugAssign, ast.Expr, ast.Name, ast.Constant, ast.Attribute, ast.Subscript,
+    ast.Call, ast.keyword, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare, ast.IfExp, ast.List, ast.Tuple,
+    ast.Dict, ast.Set, ast.Lambda, ast.arguments, ast.arg, ast.Slice, ast.JoinedStr, ast.FormattedValue,
+    ast.expr_context, ast.operator, ast.unaryop, ast.boolop, ast.cmpop,
+)
+
+
+class ChunkingUnsupported(Exception):
+    """The workflow can't run chunk by chunk, it has to be loaded in full."""
+
+
+class _NotRowLocal(Exception):
+    pass
+
+
+def _root_name(node):
+    while isinstance(node, (ast.Attribute, ast.Subscript, ast.Call)):
+        node = node.func if isinstance(node, ast.Call) else node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+
+def _is_column(node) -> bool:
+    """df["col"] / df.col, i.e. a Series, where apply and map work element by element."""
+    if isinstance(node, ast.Subscript):
+        return isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, str)
+    return isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name)
+
+
+def _is_labels(node, strings: bool = True) -> bool:
+    """A constant or a list of constants, i.e. row labels when indexing rows (strings=False: only non-string ones)."""
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        return bool(node.elts) and all(_is_labels(elt, strings) for elt in node.elts)
+    return isinstance(node, ast.Constant) and (strings or not isinstance(node.value, str))
+
+
+def _keyword(node: ast.Call, name: str):
+    for keyword in node.keywords:
+        if keyword.arg == name:
+            return keyword.value
+    return None
+
+
+def _is_constant_collection(node) -> bool:
+    return isinstance(node, (ast.List, ast.Tuple, ast.Set)) and all(isinstance(elt, ast.Constant) for elt in node.elts)
+
+
+def _is_columns_axis(node) -> bool:
+    return isinstance(node, ast.Constant) and node.value in (1, "columns")
+
+
+class _RowLocalChecker(ast.NodeVisitor):
+    """Conservative check: anything it doesn't recognize makes the script not row-local."""
+
+    def __init__(self):
+        self.names = {"df", "result_df", "pd"}
+        self.lambda_args = []
+
+    def generic_visit(self, node):
+        if not isinstance(node, ALLOWED_NODES):
+            raise _NotRowLocal(f"{type(node).__name__} is not supported")
+        super().generic_visit(node)
+
+    def visit_Assign(self, node):
+        self.visit(node.value)
+        for target in node.targets:
+            self.visit(target)
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Store):
+            self.names.add(node.id)
+        elif node.id in self.names or any(node.id in args for args in self.lambda_args):
+            return
+        elif not (self.lambda_args and node.id in LAMBDA_BUILTINS):
+            raise _NotRowLocal(f"Unknown name {node.id}")
+
+    def visit_Lambda(self, node):
+        self.lambda_args.append({arg.arg for arg in node.args.args})
+        try:
+            self.visit(node.body)
+        finally:
+            self.lambda_args.pop()
+
+    def visit_Attribute(self, node):
+        if node.attr in GLOBAL_ATTRIBUTES and not self._in_lambda_value(node.value):
+            raise _NotRowLocal(f".{node.attr} depends on the whole frame")
+        if isinstance(node.value, ast.Name) and node.value.id == "pd":
+            if node.attr not in PANDAS_CONSTANTS | PANDAS_FUNCTIONS:
+                raise _NotRowLocal(f"pd.{node.attr} is not row-local")
+            return
+        self.visit(node.value)
+
+    def visit_Subscript(self, node):
+        accessor = isinstance(node.value, ast.Attribute) and node.value.attr == "str"
+        slices = node.slice.elts if isinstance(node.slice, ast.Tuple) else [node.slice]
+        for item in slices:
+            # Row slices are positional; ":" and string slicing are fine
+            if isinstance(item, ast.Slice) and not accessor and (item.lower or item.upper or item.step):
+                raise _NotRowLocal("Positional row slice")
+        # Rows picked by label exist in one chunk only: df.loc[0, "a"], df.loc[[0, 1]], df["a"][0]
+        # (column names are strings, so a number in plain [] can only be a row label)
+        if not (accessor or self._in_lambda_value(node.value)):
+            if isinstance(node.value, ast.Attribute) and node.value.attr == "loc":
+                if _is_labels(slices[0]):
+                    raise _NotRowLocal("Row lookup by label")
+            elif _is_labels(node.slice, strings=False):
+                raise _NotRowLocal("Row lookup by label")
+        self.generic_visit(node)
+
+    def visit_Call(self, node):
+        self._check_call(node)
+        self.generic_visit(node)
+
+    def _in_lambda_value(self, node) -> bool:
+        name = _root_name(node)
+        return bool(self.lambda_args) and any(name in args for args in self.lambda_args)
+
+    def _check_call(self, node: ast.Call) -> None:
+        func = node.func
+        if isinstance(func, ast.Name):
+            if self.lambda_args and func.id in LAMBDA_BUILTINS:
+                return
+            raise _NotRowLocal(f"{func.id}() is not row-local")
+        if not isinstance(func, ast.Attribute):
+            raise _NotRowLocal("Unsupported call")
+        if isinstance(func.value, ast.Constant) or self._in_lambda_value(func.value):
+            return  # "...".format(...) or methods of the value a lambda gets
+        if isinstance(func.value, ast.Name) and func.value.id == "pd":
+            return  # Checked by visit_Attribute
+
+        method = func.attr
+        if isinstance(func.value, ast.Attribute) and func.value.attr in ACCESSORS:
+            if method not in ACCESSOR_METHODS:
+                raise _NotRowLocal(f".{func.value.attr}.{method}() is not row-local")
+            if method == "cat" and func.value.attr == "str" and not (node.args or _keyword(node, "others") is not None):
+                raise _NotRowLocal(".str.cat() without others joins the whole column")
+            return
+        if method not in ROW_LOCAL_METHODS:
+            raise _NotRowLocal(f".{method}() is not row-local")
+        if method == "isin" and not (len(node.args) == 1 and not node.keywords and _is_constant_collection(node.args[0])):
+            # Membership in another column would only be checked against the rows of the same chunk
+            raise _NotRowLocal(".isin() of anything but a literal list")
+        axis = _keyword(node, "axis")
+        if method == "apply" and not (_is_column(func.value) or _is_columns_axis(axis)):
+            raise _NotRowLocal(".apply() over columns sees the whole column")
+        if method == "dropna" and _is_columns_axis(axis):
+            raise _NotRowLocal(".dropna(axis=1) looks at whole columns")
+        if method == "drop" and not (_keyword(node, "columns") is not None or _is_columns_axis(axis)):
+            raise _NotRowLocal(".drop() of rows by label")
+        if method == "fillna" and _keyword(node, "method") is not None:
+            raise _NotRowLocal(".fillna(method=...) carries values between rows")
+        if method == "query":
+            if not (node.args and isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str)):
+                raise _NotRowLocal("Dynamic query expression")
+            if "@" in node.args[0].value:
+                raise _NotRowLocal("Query refers to local variables")
+            self._check_query(node.args[0].value)
+
+    def _check_query(self, expression: str) -> None:
+        try:
+            tree = ast.parse(expression, mode="eval")
+        except SyntaxError:
+            raise _NotRowLocal("Unparsable query expression")
+        for child in ast.walk(tree):
+            # Column names are free names in a query, calls are what could aggregate
+            if isinstance(child, ast.Call):
+                raise _NotRowLocal("Query calls a function")
+            if isinstance(child, ast.Attribute) and child.attr in GLOBAL_ATTRIBUTES:
+                raise _NotRowLocal(f".{child.attr} depends on the whole frame")
+            if not isinstance(child, ALLOWED_NODES + (ast.Expression,)):
+                raise _NotRowLocal(f"{type(child).__name__} in query")
+
+
+def is_row_local(code: str) -> bool:
+    """
+    True if the script only filters rows and derives columns row by row, so running it on each
+    chunk of the input and stacking the outputs gives the same result as running it on the whole input.
+    """
+    try:
+        _RowLocalChecker().visit(ast.parse(code))
+    except (_NotRowLocal, SyntaxError) as e:
+        print(f"Script is not row-local: {e}")
+        return False
+    return True
+
+
+def chain_is_row_local(scripts: list[str]) -> bool:
+    return all(is_row_local(code) for code in scripts)
+
+
+def iter_columnar_chunks(path: str, chunk_rows: int = CHUNK_ROWS, columns=None):
+    """Yields an Arrow IPC file (only the given columns) as DataFrames of chunk_rows rows; the file stays memory-mapped."""
+    table = feather.read_table(path, memory_map=True)
+    keep = projected_columns(columns, table.column_names)
+    if keep is not None:
+        table = table.select(keep)
+    string_dtype = pd.StringDtype("pyarrow")
+    for start in range(0, max(table.num_rows, 1), chunk_rows):
+        chunk = table.slice(start, chunk_rows).to_pandas(types_mapper={pa.string(): string_dtype, pa.large_string(): string_dtype}.get)
+        chunk.index = pd.RangeIndex(start, start + len(chunk))
+        yield chunk
+
+
+def iter_csv_chunks(path: str, schema: dict = None, chunk_rows: int = CHUNK_ROWS, columns=None):
+    """Yields a CSV file (only the given columns) as DataFrames of chunk_rows rows, cast with the recorded schema if there is one."""
+    dtype, dates, usecols = None, None, None
+    if columns is not None:
+        usecols = projected_columns(columns, list(pd.read_csv(path, nrows=0).columns))
+    if schema:
+        if usecols is not None:
+            schema = project_schema(schema, usecols)
+        dtype = {col: "category" for col in schema["categoricals"]}
+        dtype.update({col: STRING_DTYPE for col in schema["strings"]})
+        dates = schema["dates"] or None
+    # The Arrow engine can't read in chunks, the C parser can
+    with pd.read_csv(path, chunksize=chunk_rows, dtype=dtype, parse_dates=dates, usecols=usecols) as reader:
+        yield from reader
+
+
+
+def iter_workflow_chunks(workflow_id: int, file_name: str, chunk_rows: int = CHUNK_ROWS, columns=None):
+    """Chunks of the stored upload of a workflow (columnar copy, or the raw CSV of large uploads)."""
+    path = columnar_path(workflow_id)
+    if os.path.exists(path):
+        return iter_columnar_chunks(path, chunk_rows, columns)
+    if file_kind(file_name) == "csv":
+        return iter_csv_chunks(raw_upload_path(workflow_id, file_name), load_schema(workflow_id), chunk_rows, columns)
+    raise ChunkingUnsupported("Excel files are only read in full")
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from cachetools import TTLCache
+from app.utils.metrics import register_collector
+
+# Cache configuration
+CODE_CACHE_BACKEND = os.getenv("CODE_CACHE_BACKEND", "memory")  # "memory" or "sqlite"
+CODE_CACHE_PATH = os.getenv("CODE_CACHE_PATH", os.path.join("temp", "code_cache.sqlite3"))
+CODE_CACHE_SIZE = int(os.getenv("CODE_CACHE_SIZE", "2048"))
+CODE_CACHE_TTL = int(os.getenv("CODE_CACHE_TTL", str(7 * 24 * 3600)))  # Seconds
+
+
+def make_cache_key(headers, dtypes, prompt: str, sheet_names=(), engine: str = "pandas") -> str:
+    """Key for generated code: normalized column names, their dtypes, the other sheets, the engine and the prompt text."""
+    payload = {
+        "headers": [str(h).strip() for h in headers],
+        "dtypes": [str(t) for t in dtypes],
+        "prompt": " ".join(prompt.split()),
+    }
+    if sheet_names:
+        payload["sheets"] = list(sheet_names)
+    if engine != "pandas":
+        payload["engine"] = engine  # pandas keys stay the same as before engines existed
+    return hashlib.sha256(json.dumps(payload).encode("utf-8")).hexdigest()
+
+
+class MemoryCodeCache:
+    """In-process LRU cache with a TTL, shared by the threads of one worker."""
+
+    def __init__(self, maxsize: int, ttl: int):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            return self._cache.get(key)
+
+    def set(self, key: str, code: str) -> None:
+        with self._lock:
+            self._cache[key] = code
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._cache)
+
+
+class SQLiteCodeCache:
+    """On-disk cache shared by every worker on the node, with TTL expiry and LRU eviction."""
+
+    def __init__(self, path: str, maxsize: int, ttl: int):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS code_cache ("
+                "key TEXT PRIMARY KEY, code TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_code_cache_last_used ON code_cache (last_used)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:  # Commits on success, rolls back on error
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT code, created_at FROM code_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] + self.ttl < now:
+                conn.execute("DELETE FROM code_cache WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE code_cache SET last_used = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key: str, code: str) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO code_cache (key, code, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, code, now, now),
+            )
+            conn.execute("DELETE FROM code_cache WHERE created_at < ?", (now - self.ttl,))
+            conn.execute(
+                "DELETE FROM code_cache WHERE key IN ("
+                "SELECT key FROM code_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.maxsize,),
+            )
+
+    def size(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM code_cache").fetchone()[0]
+
+
+class CodeGenerationCache:
+    """Front for a cache backend that counts hits and misses."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        code = self.backend.get(key)
+        with self._lock:
+            if code is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return code
+
+    def set(self, key: str, code: str) -> None:
+        self.backend.set(key, code)
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "backend": type(self.backend).__name__,
+            "size": self.backend.size(),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+        }
+
+
+def create_code_cache() -> CodeGenerationCache:
+    """Builds the cache configured through CODE_CACHE_BACKEND."""
+    if CODE_CACHE_BACKEND == "sqlite":
+        return CodeGenerationCache(SQLiteCodeCache(CODE_CACHE_PATH, CODE_CACHE_SIZE, CODE_CACHE_TTL))
+    if CODE_CACHE_BACKEND == "memory":
+        return CodeGenerationCache(MemoryCodeCache(CODE_CACHE_SIZE, CODE_CACHE_TTL))
+    raise ValueError(f"Unknown CODE_CACHE_BACKEND: {CODE_CACHE_BACKEND}")
+
+
+code_cache = create_code_cache()
+
+
+@register_collector
+def code_cache_metrics():
+    stats = code_cache.stats()
+    labels = {"backend": stats["backend"]}
+    return [
+        ("code_cache_hits_total", "counter", "Generated code served from the cache.", [(labels, stats["hits"])]),
+        ("code_cache_misses_total", "counter", "Generated code requested from the model.", [(labels, stats["misses"])]),
+        ("code_cache_entries", "gauge", "Entries currently cached.", [(labels, stats["size"])]),
+    ]
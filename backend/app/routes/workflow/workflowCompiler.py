@@ -0,0 +1,42 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from types import CodeType
+
+# Max number of compiled scripts kept in memory (LRU). Scripts run in the sandbox workers, so every
+# worker process has a cache of its own of up to this size
+COMPILED_SCRIPT_CACHE_SIZE = max(1, int(os.getenv("COMPILED_SCRIPT_CACHE_SIZE", "256")))
+
+# (workflow_id, script_hash) -> compiled code object. Nothing is ever invalidated: a changed script
+# has another hash, so it misses, and the entry of the old one ages out of the LRU
+_compiled_scripts: "OrderedDict[tuple[int, str], CodeType]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def script_hash(code: str) -> str:
+    """Stable hash of a stored pandas script."""
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+def compile_script(workflow_id: int, code: str) -> CodeType:
+    """Returns the compiled code object for a script, compiling it only on a cache miss."""
+    key = (workflow_id, script_hash(code))
+
+    with _lock:
+        compiled = _compiled_scripts.get(key)
+        if compiled is not None:
+            _compiled_scripts.move_to_end(key)
+            return compiled
+
+    # Compile outside the lock, a duplicate compile on a race is harmless
+    compiled = compile(code, f"<workflow {workflow_id} step {key[1][:12]}>", "exec")
+
+    with _lock:
+        _compiled_scripts[key] = compiled
+        _compiled_scripts.move_to_end(key)
+        while len(_compiled_scripts) > COMPILED_SCRIPT_CACHE_SIZE:
+            _compiled_scripts.popitem(last=False)
+
+    return compiled
+
@@ -0,0 +1,182 @@
+import importlib.util
+import os
+import re
+from abc import ABC, abstractmethod
+import pandas as pd
+import pyarrow.dataset as ds
+from app.routes.workflow.workflowLoader import read_frame
+from app.routes.workflow.workflowValidation import ValidationReport, validate_script, validate_sql
+
+# Jobs run in parallel in the sandbox workers (same setting as workflowExecutor.SANDBOX_WORKERS),
+# so by default a lazy engine gets its share of the cores, not all of them (pandas only ever uses one)
+_SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", str(min(4, os.cpu_count() or 1))))
+ENGINE_THREADS = int(os.getenv("ENGINE_THREADS", str(max(1, (os.cpu_count() or 1) // max(1, _SANDBOX_WORKERS)))))
+DEFAULT_ENGINE = os.getenv("DEFAULT_ENGINE", "pandas")
+
+# Polars sizes its thread pool when it's first imported
+os.environ.setdefault("POLARS_MAX_THREADS", str(ENGINE_THREADS))
+
+
+class EngineUnavailable(Exception):
+    """The engine of a workflow isn't known or its package isn't installed."""
+
+
+class Engine(ABC):
+    """
+    How the saved scripts of a workflow are written and run. pandas runs them step by step
+    (workflowExecutor, with checkpoints, chunking and profiling per step); the lazy engines fuse
+    the whole chain into one query plan and only materialize its final output.
+    """
+    name = ""
+    package = None  # Optional dependency the engine needs
+    lazy = True
+    system_prompt = ""
+
+    def available(self) -> bool:
+        return self.package is None or importlib.util.find_spec(self.package) is not None
+
+    def validate(self, code: str, headers: list) -> ValidationReport:
+        return validate_script(code, headers)
+
+    @abstractmethod
+    def run(self, scripts: list[str], source, kind: str = None) -> pd.DataFrame:
+        """Runs the chain on source (a DataFrame, or the path of a CSV/Excel/Arrow file) and returns the output."""
+
+
+class PandasEngine(Engine):
+    name = "pandas"
+    lazy = False
+    system_prompt = (
+        "You are a Python assistant that generates valid Pandas code only in simple text format(just the code, no markdown, no nothing). "
+        "The dataset is already stored in a DataFrame named `df`. Do not redefine `df`. "
+        "Ensure the output is always a DataFrame named `result_df`, even if filtering only one column. "
+        "Your response must be only the valid Pandas code."
+    )
+
+    def run(self, scripts, source, kind=None):
+        """
+        Plain step by step run of the chain. Saved workflows go through workflowExecutor instead,
+        which adds checkpoints, chunking and per-step profiling around the same steps.
+        """
+        # workflowExecutor imports this module
+        from app.routes.workflow.workflowExecutor import run_generated_script
+        from app.routes.workflow.workflowStorage import read_columnar
+
+        if isinstance(source, pd.DataFrame):
+            df = source
+        elif source.endswith(".arrow"):
+            df = read_columnar(source)
+        else:
+            df, _ = read_frame(source, kind)
+        for step, code in enumerate(scripts, start=1):
+            df = run_generated_script(0, code, df)
+            if df is None:
+                raise ValueError(f"Step {step} did not produce a valid DataFrame.")
+        return df
+
+
+class PolarsEngine(Engine):
+    name = "polars"
+    package = "polars"
+    system_prompt = (
+        "You are a Python assistant that generates valid Polars code only in simple text format (just the code, no markdown). "
+        "The dataset is a polars LazyFrame named `lf`, polars is imported as `pl`. Do not call collect(), do not read or write files. "
+        "Use only lazy expressions (filter, with_columns, select, group_by(...).agg(...), join, sort) and assign the "
+        "resulting LazyFrame to `result_lf`. Your response must be only the valid Polars code."
+    )
+
+    def _scan(self, pl, source, kind):
+        if isinstance(source, pd.DataFrame):
+            return pl.from_pandas(source).lazy()
+        if source.endswith(".arrow"):
+            return pl.scan_ipc(source, memory_map=True)
+        if kind == "csv":
+            return pl.scan_csv(source)
+        # Workbooks can't be scanned, the first sheet is parsed up front
+        df, _ = read_frame(source, kind)
+        return pl.from_pandas(df).lazy()
+
+    def run(self, scripts, source, kind=None):
+        import polars as pl
+
+        lf = self._scan(pl, source, kind)
+        # Scripts only add nodes to the plan, nothing is read before collect()
+        for step, code in enumerate(scripts, start=1):
+            exec_globals = {"lf": lf, "pl": pl}
+            exec(code, exec_globals)
+            lf = exec_globals.get("result_lf")
+            if not isinstance(lf, pl.LazyFrame):
+                raise ValueError(f"Step {step} did not produce a LazyFrame named result_lf.")
+        # One optimized plan for the whole chain: predicates and projections reach the scan
+        return lf.collect().to_pandas()
+
+
+class DuckDBEngine(Engine):
+    name = "duckdb"
+    package = "duckdb"
+    system_prompt = (
+        "You are a SQL assistant that generates one valid DuckDB SELECT statement only in simple text format "
+        "(just the SQL, no markdown, no semicolon). The dataset is the table `input`. "
+        "Do not read files, create tables or change settings. Your response must be only the SQL query."
+    )
+
+    def validate(self, code, headers):
+        return validate_sql(code)
+
+    def _source(self, source, kind):
+        if isinstance(source, pd.DataFrame):
+            return source
+        if source.endswith(".arrow"):
+            return ds.dataset(source, format="ipc")
+        if kind == "csv":
+            return ds.dataset(source, format="csv")
+        df, _ = read_frame(source, kind)
+        return df
+
+    def run(self, scripts, source, kind=None):
+        import duckdb
+
+        con = duckdb.connect()
+        try:
+            con.execute(f"SET threads TO {ENGINE_THREADS}")
+            # Scanned through Arrow so DuckDB itself never needs file access
+            con.register("source", self._source(source, kind))
+            con.execute("SET enable_external_access = false")
+            con.execute("SET lock_configuration = true")
+
+            # Every step reads the previous one as `input`; the nested query is planned as a whole
+            query = "SELECT * FROM source"
+            for code in scripts:
+                query = f"WITH input AS ({query}) {nest_step(code)}"
+            return con.execute(query).df()
+        finally:
+            con.close()
+
+
+def nest_step(code: str) -> str:
+    """A DuckDB step as the body of `WITH input AS (...) <body>`; steps with CTEs of their own become a subquery."""
+    sql = code.strip().rstrip(";").strip()
+    if re.match(r"with\b", sql, re.IGNORECASE):
+        return f"SELECT * FROM ({sql}) AS step"
+    return sql  # Kept as is, so a final ORDER BY still orders the output
+
+
+ENGINES = {engine.name: engine for engine in (PandasEngine(), PolarsEngine(), DuckDBEngine())}
+
+
+def get_engine(name: str) -> Engine:
+    engine = ENGINES.get(name or DEFAULT_ENGINE)
+    if engine is None:
+        raise EngineUnavailable(f"Unknown engine: {name}")
+    if not engine.available():
+        raise EngineUnavailable(f"Engine {name} needs the {engine.package} package")
+    return engine
+
+
+def available_engines() -> list[str]:
+    return [name for name, engine in ENGINES.items() if engine.available()]
+
+
+def run_engine_chain(engine_name: str, scripts: list[str], source, kind: str = None) -> pd.DataFrame:
+    """Runs a saved chain with a lazy engine; kind ("csv"/"excel") tells how to read a raw file at source."""
+    return get_engine(engine_name).run(scripts, source, kind)
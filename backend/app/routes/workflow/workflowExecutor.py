@@ -0,0 +1,503 @@
+import asyncio
+import multiprocessing
+import os
+import resource
+import signal
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+import pandas as pd
+from fastapi.concurrency import run_in_threadpool
+from app.routes.workflow.workflowCompiler import compile_script
+from app.routes.workflow.workflowChunking import ChunkingUnsupported, iter_workflow_chunks
+from app.routes.workflow.workflowEngines import run_engine_chain
+from app.routes.workflow.workflowCheckpoints import chain_keys, file_hash, latest_checkpoint, load_checkpoint, save_checkpoint
+from app.routes.workflow.workflowLoader import file_kind, read_frame
+from app.routes.workflow.workflowProjection import projected_input_hash
+from app.routes.workflow.workflowProfiling import combine_chunk_stats, profile_step
+from app.routes.workflow.workflowSheets import file_sheets, workflow_sheets
+from app.routes.workflow.workflowStorage import TEMP_DIR, load_schema, load_workflow_frame, read_columnar, stored_input_path, write_columnar
+
+# Number of sandbox processes, 0 runs scripts in the API process (threadpool) instead
+SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Per-job limits, 0 disables a limit
+SANDBOX_CPU_SECONDS = int(os.getenv("SANDBOX_CPU_SECONDS", "120"))
+SANDBOX_MEMORY_MB = int(os.getenv("SANDBOX_MEMORY_MB", "4096"))  # Address space of the worker
+
+# Scripts get a lazy (Copy-on-Write) copy of their input instead of an eager deep copy
+COPY_ON_WRITE = os.getenv("PANDAS_COPY_ON_WRITE", "1") == "1"
+if COPY_ON_WRITE:
+    pd.set_option("mode.copy_on_write", True)
+
+# DataFrames cross the process boundary as Arrow files on tmpfs
+SHARED_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+# Outputs of chunked runs can be larger than memory, so they go to disk rather than tmpfs
+CHUNKED_OUTPUT_DIR = os.path.join(TEMP_DIR, "chunked")
+
+_executor = None
+
+
+class SandboxError(Exception):
+    """A job was stopped by the sandbox (limit exceeded or worker died)."""
+
+
+# Script execution (runs inside the sandbox processes, or in-process when disabled)
+
+def run_generated_script(workflow_id: int, generated_code: str, df: pd.DataFrame, sheets=None):
+    """
+    Executes one step against df and returns its result_df (None if it produced nothing).
+    A script that only modifies df in place yields the modified df.
+    Other sheets of an Excel upload are available to the script as sheets["name"], parsed on first use.
+    """
+    # Prepare execution environment; with Copy-on-Write the shallow copy only duplicates
+    # the columns the script actually modifies, and the caller's df is never touched
+    exec_globals = {"df": df.copy(deep=not COPY_ON_WRITE), "pd": pd, "sheets": sheets if sheets is not None else {}}
+    exec_globals["result_df"] = exec_globals["df"]  # Ensure result_df exists
+
+    # Execute generated Pandas code
+    exec(compile_script(workflow_id, generated_code), exec_globals)
+
+    # Extract 'result_df' safely
+    result_df = exec_globals.get("result_df")
+
+    # Ensure result_df is a DataFrame
+    if isinstance(result_df, pd.Series):
+        result_df = result_df.to_frame()
+
+    return result_df
+
+
+def _run_steps(workflow_id: int, scripts: list[str], df: pd.DataFrame, sheets, first_step: int, profile):
+    """Generator running scripts in order on df, yielding (step number, output); each step is profiled into profile."""
+    for offset, code in enumerate(scripts):
+        step = first_step + offset
+        df, stats = profile_step(step, lambda frame: run_generated_script(workflow_id, code, frame, sheets), df)
+        if df is None:
+            raise ValueError(f"Step {step} did not produce a valid DataFrame.")
+        if profile is not None:
+            profile.append(stats)
+        yield step, df
+
+
+def run_chain(workflow_id: int, input_hash: str, scripts: list[str], load_input, sheets=None, profile: list = None):
+    """
+    Runs the scripts one after another, each on the output of the previous one.
+    Resumes from the furthest checkpoint of the chain and checkpoints every step it runs, so adding
+    a step only executes that step. load_input is only called when no checkpoint applies.
+    Stats of every executed step are appended to profile.
+    Returns (output DataFrame, checkpoint path of the output or None).
+    """
+    keys = chain_keys(input_hash, scripts)
+    start, path = latest_checkpoint(workflow_id, input_hash, scripts)
+    df = load_checkpoint(path) if path else load_input()
+
+    for step, df in _run_steps(workflow_id, scripts[start:], df, sheets, start + 1, profile):
+        path = save_checkpoint(workflow_id, input_hash, step, keys[step - 1], df)
+
+    return df, path
+
+
+def run_workflow_scripts(workflow_id: int, file_name: str, scripts: list[str], profile: list = None, input_columns=None):
+    """
+    Replays the saved scripts of a workflow on its stored upload, loading only input_columns if given
+    (see workflowProjection). Returns (output, checkpoint path or None).
+    """
+    input_hash = projected_input_hash(file_hash(stored_input_path(workflow_id, file_name)), input_columns)
+    return run_chain(
+        workflow_id, input_hash, scripts, lambda: load_workflow_frame(workflow_id, file_name, input_columns),
+        workflow_sheets(workflow_id, file_name), profile,
+    )
+
+
+def run_file_scripts(workflow_id: int, scripts: list[str], path: str, kind: str, profile: list = None) -> pd.DataFrame:
+    """
+    Runs the saved scripts of a workflow on another file (batch apply). Uses the workflow's recorded
+    schema when the file fits it; no checkpoints, every file is a one-off input.
+    """
+    df, _ = read_frame(path, kind, load_schema(workflow_id))
+    for _, df in _run_steps(workflow_id, scripts, df, file_sheets(path, kind), 1, profile):
+        pass
+    return df
+
+
+def run_engine_scripts(engine: str, scripts: list[str], source, kind: str = None, profile: list = None) -> pd.DataFrame:
+    """
+    Runs a chain with a lazy engine (polars, duckdb) as one fused plan on source (a DataFrame or a file path).
+    Steps have no separate runs to measure, the plan is profiled as one entry on the last step.
+    """
+    df_input = source if isinstance(source, pd.DataFrame) else None
+    df_result, stats = profile_step(len(scripts), lambda _: run_engine_chain(engine, scripts, source, kind), df_input)
+    if profile is not None:
+        profile.append({**stats, "fused_steps": len(scripts)})
+    return df_result
+
+
+def run_workflow_chunked(
+    workflow_id: int, file_name: str, scripts: list[str], output_path: str, profile: list = None, input_columns=None
+) -> int:
+    """
+    Out-of-core replay for row-local scripts: runs the whole chain on one chunk of the upload at a time
+    and appends each output to a CSV file, so memory stays bounded by the chunk size.
+    Stats of every step summed over the chunks are appended to profile. Returns the number of output rows.
+    """
+    rows, columns = 0, None
+    totals = [None] * len(scripts)
+    try:
+        with open(output_path, "w", newline="") as f:
+            for chunk in iter_workflow_chunks(workflow_id, file_name, columns=input_columns):
+                chunk_stats = []
+                for _, chunk in _run_steps(workflow_id, scripts, chunk, None, 1, chunk_stats):
+                    pass
+                for stats in chunk_stats:
+                    totals[stats["step"] - 1] = combine_chunk_stats(totals[stats["step"] - 1], stats)
+
+                if columns is None:
+                    columns = list(chunk.columns)
+                elif list(chunk.columns) != columns:
+                    raise ChunkingUnsupported("Chunks produced different columns")
+                chunk.to_csv(f, index=False, header=(f.tell() == 0))
+                rows += len(chunk)
+    except Exception:
+        os.remove(output_path)
+        raise
+    if profile is not None:
+        profile.extend(stats for stats in totals if stats is not None)
+    return rows
+
+
+def run_dry_run(workflow_id: int, code: str, preview: pd.DataFrame, file_name: str = None) -> list:
+    """Runs a script on preview rows and returns its output columns."""
+    sheets = workflow_sheets(workflow_id, file_name) if file_name else None
+    df_result = run_generated_script(workflow_id, code, preview, sheets)
+    if df_result is None:
+        raise ValueError("The script did not produce a valid DataFrame.")
+    return list(df_result.columns)
+
+
+def _same_output(left, right) -> bool:
+    if left is None or right is None:
+        return left is right
+    try:
+        pd.testing.assert_frame_equal(left, right, check_dtype=False, check_index_type=False, check_column_type=False)
+    except AssertionError:
+        return False
+    return True
+
+
+def run_benchmark(workflow_id: int, original: str, candidate: str, sample: pd.DataFrame, file_name: str = None):
+    """Times two versions of a step on the same frame. Returns (original seconds, candidate seconds, same output)."""
+    sheets = workflow_sheets(workflow_id, file_name) if file_name else None
+    timings, outputs = [], []
+    for code in (original, candidate):
+        started = time.perf_counter()
+        outputs.append(run_generated_script(workflow_id, code, sample, sheets))
+        timings.append(time.perf_counter() - started)
+    return timings[0], timings[1], _same_output(*outputs)
+
+
+# Worker side
+
+def _raise_cpu_limit(signum, frame):
+    raise SandboxError(f"CPU time limit of {SANDBOX_CPU_SECONDS}s exceeded")
+
+
+def _warm_worker():
+    """Initializer of every sandbox process: pandas is already imported, just hook the CPU limit signal."""
+    signal.signal(signal.SIGXCPU, _raise_cpu_limit)
+
+
+def _ping():
+    return os.getpid()
+
+
+def _cap(limit: int, hard: int) -> int:
+    return limit if hard == resource.RLIM_INFINITY else min(limit, hard)
+
+
+@contextmanager
+def _job_limits():
+    """Applies the per-job CPU time and memory soft limits, restoring the previous ones afterwards."""
+    cpu_limits = resource.getrlimit(resource.RLIMIT_CPU)
+    memory_limits = resource.getrlimit(resource.RLIMIT_AS)
+
+    if SANDBOX_CPU_SECONDS > 0:
+        # RLIMIT_CPU counts the whole life of the process, so offset it by what was used so far
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        used = int(usage.ru_utime + usage.ru_stime)
+        resource.setrlimit(resource.RLIMIT_CPU, (_cap(used + SANDBOX_CPU_SECONDS, cpu_limits[1]), cpu_limits[1]))
+    if SANDBOX_MEMORY_MB > 0:
+        limit = SANDBOX_MEMORY_MB * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (_cap(limit, memory_limits[1]), memory_limits[1]))
+
+    try:
+        yield
+    except MemoryError:
+        raise SandboxError(f"Memory limit of {SANDBOX_MEMORY_MB} MB exceeded")
+    finally:
+        resource.setrlimit(resource.RLIMIT_CPU, cpu_limits)
+        resource.setrlimit(resource.RLIMIT_AS, memory_limits)
+
+
+def _export_frame(df: pd.DataFrame):
+    """Hands a DataFrame to the other side as an Arrow file in shared memory, or pickled as a fallback."""
+    path = os.path.join(SHARED_DIR, f"sandbox-{uuid.uuid4().hex}.arrow")
+    if write_columnar(df, path):
+        return ("arrow", path)
+    return ("pickle", df)
+
+
+def _import_frame(handle) -> pd.DataFrame:
+    kind, value = handle
+    if kind == "pickle":
+        return value
+    if kind == "checkpoint":
+        return load_checkpoint(value)  # Owned by the checkpoint store, not removed
+    try:
+        return read_columnar(value)
+    finally:
+        os.remove(value)
+
+
+def _discard_frame(handle) -> None:
+    kind, value = handle
+    if kind == "arrow" and os.path.exists(value):
+        os.remove(value)
+
+
+def _result_handle(df: pd.DataFrame, checkpoint):
+    # The output is already on disk as a checkpoint, hand that over instead of writing it again
+    return ("checkpoint", checkpoint) if checkpoint else _export_frame(df)
+
+
+def _chain_job(workflow_id: int, input_hash: str, scripts: list[str], frame, file_name: str = None):
+    def load_input():
+        if frame is None:
+            raise SandboxError("Checkpoint disappeared while the job was queued")
+        return _import_frame(frame)
+
+    with _job_limits():
+        sheets = workflow_sheets(workflow_id, file_name) if file_name else None
+        steps = []
+        df_result, checkpoint = run_chain(workflow_id, input_hash, scripts, load_input, sheets, steps)
+    return _result_handle(df_result, checkpoint), steps
+
+
+def _workflow_job(workflow_id: int, file_name: str, scripts: list[str], input_columns=None):
+    with _job_limits():
+        steps = []
+        df_result, checkpoint = run_workflow_scripts(workflow_id, file_name, scripts, steps, input_columns)
+    return _result_handle(df_result, checkpoint), steps
+
+
+def _file_job(workflow_id: int, scripts: list[str], path: str, kind: str):
+    with _job_limits():
+        steps = []
+        df_result = run_file_scripts(workflow_id, scripts, path, kind, steps)
+    return _export_frame(df_result), steps
+
+
+def _engine_job(engine: str, scripts: list[str], source, kind: str = None):
+    with _job_limits():
+        if isinstance(source, tuple):
+            source = _import_frame(source)
+        steps = []
+        df_result = run_engine_scripts(engine, scripts, source, kind, steps)
+    return _export_frame(df_result), steps
+
+
+def _dry_run_job(workflow_id: int, code: str, preview: pd.DataFrame, file_name: str = None):
+    with _job_limits():
+        return run_dry_run(workflow_id, code, preview, file_name)
+
+
+def _benchmark_job(workflow_id: int, original: str, candidate: str, sample: pd.DataFrame, file_name: str = None):
+    with _job_limits():
+        return run_benchmark(workflow_id, original, candidate, sample, file_name)
+
+
+def _chunked_job(workflow_id: int, file_name: str, scripts: list[str], output_path: str, input_columns=None):
+    with _job_limits():
+        steps = []
+        run_workflow_chunked(workflow_id, file_name, scripts, output_path, steps, input_columns)
+    return steps
+
+
+# API side
+
+def _create_executor() -> ProcessPoolExecutor:
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        # Forking a threaded server is unsafe; the fork server preloads pandas once for every worker
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["pandas", "pyarrow", __name__])
+    else:
+        context = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=SANDBOX_WORKERS, mp_context=context, initializer=_warm_worker)
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = _create_executor()
+    return _executor
+
+
+def start_executor() -> None:
+    """Starts every sandbox process up front so the first requests don't pay for it."""
+    if SANDBOX_WORKERS <= 0:
+        return
+    executor = get_executor()
+    for future in [executor.submit(_ping) for _ in range(SANDBOX_WORKERS)]:
+        future.result()
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def _submit(fn, *args):
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(get_executor(), fn, *args)
+    except BrokenProcessPool:
+        # A worker was killed (e.g. by the OOM killer); start a fresh pool for the next jobs
+        shutdown_executor()
+        raise SandboxError("Sandbox worker died while running the script")
+
+
+async def execute_engine(engine: str, scripts: list[str], source, kind: str = None, profile: list = None) -> pd.DataFrame:
+    """Runs a chain with a lazy engine in the sandbox. source is a DataFrame or the path of a file of the given kind."""
+    if SANDBOX_WORKERS <= 0:
+        return await run_in_threadpool(run_engine_scripts, engine, scripts, source, kind, profile)
+
+    frame = await run_in_threadpool(_export_frame, source) if isinstance(source, pd.DataFrame) else source
+    try:
+        result, steps = await _submit(_engine_job, engine, scripts, frame, kind)
+    finally:
+        if isinstance(frame, tuple):
+            _discard_frame(frame)
+
+    if profile is not None:
+        profile.extend(steps)
+    return await run_in_threadpool(_import_frame, result)
+
+
+async def execute_chain(
+    workflow_id: int, input_hash: str, df: pd.DataFrame, scripts: list[str], file_name: str = None, profile: list = None,
+    engine: str = "pandas",
+) -> pd.DataFrame:
+    """
+    Runs scripts as a chain on df (identified by input_hash) in the sandbox, reusing step checkpoints.
+    With file_name, scripts can read the other sheets of the workflow's workbook.
+    Stats of the steps that actually ran are appended to profile.
+    Lazy engines run the whole chain as one plan every time, without checkpoints.
+    """
+    if not scripts:
+        return df
+    if engine != "pandas":
+        return await execute_engine(engine, scripts, df, profile=profile)
+
+    if SANDBOX_WORKERS <= 0:
+        sheets = workflow_sheets(workflow_id, file_name) if file_name else None
+        df_result, _ = await run_in_threadpool(run_chain, workflow_id, input_hash, scripts, lambda: df, sheets, profile)
+        return df_result
+
+    # The input only has to cross over when no checkpoint of the chain exists yet
+    start, _ = await run_in_threadpool(latest_checkpoint, workflow_id, input_hash, scripts)
+    frame = None if start else await run_in_threadpool(_export_frame, df)
+    try:
+        result, steps = await _submit(_chain_job, workflow_id, input_hash, scripts, frame, file_name)
+    finally:
+        if frame is not None:
+            _discard_frame(frame)
+
+    if profile is not None:
+        profile.extend(steps)
+    return await run_in_threadpool(_import_frame, result)
+
+
+async def execute_workflow(
+    workflow_id: int, file_name: str, scripts: list[str], profile: list = None, engine: str = "pandas", input_columns=None
+) -> pd.DataFrame:
+    """Replays the saved scripts of a workflow on its upload in the sandbox, loading only input_columns if given."""
+    if engine != "pandas":
+        # Lazy engines scan the stored file themselves, only the columns and rows the plan needs are read
+        return await execute_engine(engine, scripts, stored_input_path(workflow_id, file_name), file_kind(file_name), profile)
+    try:
+        return await _execute_workflow_scripts(workflow_id, file_name, scripts, profile, input_columns)
+    except (KeyError, AttributeError) as e:
+        if input_columns is None:
+            raise
+        # input_columns is a static guess; a step read a column it left out, so load them all
+        print(f"Projected run of workflow {workflow_id} failed, loading every column: {e!r}")
+        if profile is not None:
+            profile.clear()
+        return await _execute_workflow_scripts(workflow_id, file_name, scripts, profile)
+
+
+async def _execute_workflow_scripts(workflow_id: int, file_name: str, scripts: list[str], profile: list = None, input_columns=None):
+    if SANDBOX_WORKERS <= 0:
+        df_result, _ = await run_in_threadpool(run_workflow_scripts, workflow_id, file_name, scripts, profile, input_columns)
+        return df_result
+
+    result, steps = await _submit(_workflow_job, workflow_id, file_name, scripts, input_columns)
+    if profile is not None:
+        profile.extend(steps)
+    return await run_in_threadpool(_import_frame, result)
+
+
+async def execute_workflow_chunked(
+    workflow_id: int, file_name: str, scripts: list[str], profile: list = None, input_columns=None
+) -> str:
+    """
+    Replays row-local scripts chunk by chunk in the sandbox. Returns the path of the CSV output,
+    which the caller removes. Raises ChunkingUnsupported if the workflow has to be loaded in full.
+    """
+    os.makedirs(CHUNKED_OUTPUT_DIR, exist_ok=True)
+    output_path = os.path.join(CHUNKED_OUTPUT_DIR, f"{uuid.uuid4().hex}.csv")
+
+    if SANDBOX_WORKERS <= 0:
+        await run_in_threadpool(run_workflow_chunked, workflow_id, file_name, scripts, output_path, profile, input_columns)
+    else:
+        steps = await _submit(_chunked_job, workflow_id, file_name, scripts, output_path, input_columns)
+        if profile is not None:
+            profile.extend(steps)
+    return output_path
+
+
+async def execute_file(
+    workflow_id: int, scripts: list[str], path: str, kind: str, profile: list = None, engine: str = "pandas"
+) -> pd.DataFrame:
+    """Runs the saved scripts of a workflow on the file at path in the sandbox."""
+    if engine != "pandas":
+        return await execute_engine(engine, scripts, path, kind, profile)
+    if SANDBOX_WORKERS <= 0:
+        return await run_in_threadpool(run_file_scripts, workflow_id, scripts, path, kind, profile)
+
+    result, steps = await _submit(_file_job, workflow_id, scripts, path, kind)
+    if profile is not None:
+        profile.extend(steps)
+    return await run_in_threadpool(_import_frame, result)
+
+
+async def dry_run_script(workflow_id: int, code: str, preview: pd.DataFrame, file_name: str = None) -> list:
+    """
+    Runs a new script on a few preview rows in the sandbox before it's saved, so broken code fails in
+    milliseconds instead of after a full run. Returns the output columns, raises whatever the script raised.
+    """
+    if SANDBOX_WORKERS <= 0:
+        # No _job_limits here, they would apply to the API process itself
+        return await run_in_threadpool(run_dry_run, workflow_id, code, preview, file_name)
+    return await _submit(_dry_run_job, workflow_id, code, preview, file_name)
+
+
+async def benchmark_scripts(workflow_id: int, original: str, candidate: str, sample: pd.DataFrame, file_name: str = None):
+    """Runs run_benchmark in the sandbox (the sample is small enough to pickle)."""
+    if SANDBOX_WORKERS <= 0:
+        return await run_in_threadpool(run_benchmark, workflow_id, original, candidate, sample, file_name)
+    return await _submit(_benchmark_job, workflow_id, original, candidate, sample, file_name)
@@ -0,0 +1,75 @@
+import io
+import os
+import threading
+import zipfile
+import magic
+
+# Bytes looked at when sniffing a file
+SNIFF_BYTES = 2048
+
+ZIP_SIGNATURE = b"PK\x03\x04"  # .xlsx (OOXML is a zip archive)
+OLE_SIGNATURE = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"  # .xls (OLE2 compound document)
+
+EXCEL_MIME_TYPES = {
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",  # .xlsx
+    "application/vnd.ms-excel",  # .xls
+}
+CSV_MIME_TYPES = {"text/csv", "application/csv"}
+
+# libmagic handles load the magic database when created and aren't safe to share between threads,
+# so every thread keeps its own
+_local = threading.local()
+
+
+def _magic() -> magic.Magic:
+    handle = getattr(_local, "magic", None)
+    if handle is None:
+        handle = _local.magic = magic.Magic(mime=True)
+    return handle
+
+
+def _extension(file_name: str) -> str:
+    return os.path.splitext(file_name or "")[1].lower()
+
+
+def _has_workbook(source) -> bool:
+    try:
+        with zipfile.ZipFile(source) as archive:
+            return "xl/workbook.xml" in archive.namelist()
+    except zipfile.BadZipFile:
+        return False
+
+
+def detect_kind(source, file_name: str = ""):
+    """
+    Works out whether an upload (bytes or seekable file object) is a CSV or an Excel workbook.
+    Signatures and the extension settle common files; libmagic is only asked about the rest.
+    Returns "csv", "excel" or None for anything else.
+    """
+    is_buffer = isinstance(source, (bytes, bytearray, memoryview))
+    if is_buffer:
+        head = bytes(source[:SNIFF_BYTES])
+    else:
+        position = source.tell()
+        head = source.read(SNIFF_BYTES)
+        source.seek(position)
+    extension = _extension(file_name)
+
+    if head.startswith(ZIP_SIGNATURE):
+        # A zip is only a workbook if it has one (not a .docx or an archive of CSVs)
+        try:
+            return "excel" if _has_workbook(io.BytesIO(source) if is_buffer else source) else None
+        finally:
+            if not is_buffer:
+                source.seek(position)
+    if head.startswith(OLE_SIGNATURE) and extension == ".xls":
+        return "excel"
+    if extension == ".csv" and b"\x00" not in head:
+        return "csv"
+
+    mime_type = _magic().from_buffer(head)
+    if mime_type in EXCEL_MIME_TYPES:
+        return "excel"
+    if mime_type in CSV_MIME_TYPES:
+        return "csv"
+    return None
@@ -0,0 +1,178 @@
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, or_, and_
+from app.routes.workflow.workflowModels import Workflow, WorkflowJob
+from app.routes.workflow.workflowExecutor import execute_workflow
+from app.routes.workflow.workflowSteps import load_workflow, store_step_stats
+from app.routes.workflow.workflowStorage import TEMP_DIR
+from app.utils.db import AsyncSessionLocal
+
+# Number of jobs run concurrently by each API process
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# How often idle workers look for new jobs
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+# A job still "running" after this long is assumed to be orphaned (its process died) and is picked up again
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "3600"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+JOB_RESULTS_DIR = os.path.join(TEMP_DIR, "jobs")
+FINISHED_STATUSES = {"succeeded", "failed"}
+
+_worker_tasks: list[asyncio.Task] = []
+
+
+def job_result_path(job_id: int) -> str:
+    return os.path.join(JOB_RESULTS_DIR, f"{job_id}.csv")
+
+
+def job_to_dict(job: WorkflowJob) -> dict:
+    return {
+        "id": job.id,
+        "workflow_id": job.workflow_id,
+        "status": job.status,
+        "attempts": job.attempts,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+async def claim_job():
+    """Atomically takes the oldest queued (or orphaned) job. SKIP LOCKED lets many workers poll the same table."""
+    now = datetime.now(timezone.utc)
+    stale_before = now - timedelta(seconds=JOB_STALE_SECONDS)
+
+    async with AsyncSessionLocal() as db:
+        job = (await db.execute(
+            select(WorkflowJob)
+            .where(or_(
+                WorkflowJob.status == "queued",
+                and_(WorkflowJob.status == "running", WorkflowJob.started_at < stale_before),
+            ))
+            .order_by(WorkflowJob.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )).scalars().first()
+
+        if job is None:
+            return None
+
+        if job.attempts >= JOB_MAX_ATTEMPTS:
+            job.status = "failed"
+            job.error = job.error or "Job was abandoned too many times"
+            job.finished_at = now
+            await db.commit()
+            return None
+
+        job.status = "running"
+        job.attempts += 1
+        job.started_at = now
+        await db.commit()
+        return job.id
+
+
+async def finish_job(job_id: int, result_path: str = None, error: str = None) -> None:
+    async with AsyncSessionLocal() as db:
+        job = await db.get(WorkflowJob, job_id)
+        if job is None:
+            return  # Deleted with its workflow
+        job.status = "failed" if error else "succeeded"
+        job.result_path = result_path
+        job.error = error
+        job.finished_at = datetime.now(timezone.utc)
+        await db.commit()
+
+
+def write_job_result(df, job_id: int) -> str:
+    os.makedirs(JOB_RESULTS_DIR, exist_ok=True)
+    path = job_result_path(job_id)
+    tmp_path = f"{path}.tmp"
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+async def run_job(job_id: int) -> None:
+    async with AsyncSessionLocal() as db:
+        job = await db.get(WorkflowJob, job_id)
+        workflow = await load_workflow(db, job.workflow_id) if job else None
+        if workflow is None:
+            # Deleted after the job was queued, retrying won't bring it back
+            print(f"Job {job_id} failed: workflow not found")
+            await finish_job(job_id, error="workflow not found")
+            return
+        workflow_id, file_name, scripts = workflow.id, workflow.file_name, workflow.pandas_scripts
+        engine, input_columns = workflow.engine, workflow.input_columns
+
+    steps = []
+    try:
+        df_result = await execute_workflow(workflow_id, file_name, scripts, steps, engine, input_columns)
+        result_path = await run_in_threadpool(write_job_result, df_result, job_id)
+    except Exception as e:
+        print(f"Job {job_id} failed: {e}")
+        await finish_job(job_id, error=str(e))
+        return
+
+    async with AsyncSessionLocal() as db:
+        workflow = await db.get(Workflow, workflow_id)
+        if workflow:
+            await store_step_stats(db, workflow, steps)
+
+    await finish_job(job_id, result_path=result_path)
+
+
+async def job_worker() -> None:
+    """Loop of one job worker: claim, run, repeat; sleep while the queue is empty."""
+    while True:
+        try:
+            job_id = await claim_job()
+        except Exception as e:
+            print(f"Could not claim a job: {e}")
+            job_id = None
+
+        if job_id is None:
+            await asyncio.sleep(JOB_POLL_SECONDS)
+            continue
+
+        try:
+            await run_job(job_id)
+        except Exception as e:
+            print(f"Job {job_id} crashed: {e}")
+
+
+def start_job_workers() -> None:
+    for _ in range(JOB_WORKERS):
+        _worker_tasks.append(asyncio.create_task(job_worker()))
+
+
+async def stop_job_workers() -> None:
+    for task in _worker_tasks:
+        task.cancel()
+    await asyncio.gather(*_worker_tasks, return_exceptions=True)
+    _worker_tasks.clear()
+
+
+async def job_events(job_id: int):
+    """Server-sent events with the job state, emitted on every change until the job finishes."""
+    last = None
+    while True:
+        async with AsyncSessionLocal() as db:
+            job = await db.get(WorkflowJob, job_id)
+            state = job_to_dict(job) if job else None
+
+        if state is None:
+            yield "event: error\ndata: {\"error\": \"Job not found\"}\n\n"
+            return
+
+        if state != last:
+            yield f"event: status\ndata: {json.dumps(state)}\n\n"
+            last = state
+
+        if state["status"] in FINISHED_STATUSES:
+            return
+
+        await asyncio.sleep(JOB_POLL_SECONDS)
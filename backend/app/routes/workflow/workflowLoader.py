@@ -0,0 +1,187 @@
+import importlib.util
+import os
+import zipfile
+from xml.etree import ElementTree
+import pandas as pd
+import pyarrow as pa
+
+# Object columns with at most this share of distinct values (and enough rows) become categoricals
+CATEGORY_MAX_RATIO = float(os.getenv("LOADER_CATEGORY_MAX_RATIO", "0.05"))
+CATEGORY_MIN_ROWS = int(os.getenv("LOADER_CATEGORY_MIN_ROWS", "1000"))
+# Rows looked at when deciding whether a text column holds dates
+DATE_SAMPLE_ROWS = 1000
+
+STRING_DTYPE = "string[pyarrow]"
+# calamine (Rust) parses sheets several times faster than openpyxl, used when python-calamine is installed
+EXCEL_ENGINE = os.getenv("EXCEL_ENGINE") or ("calamine" if importlib.util.find_spec("python_calamine") else "openpyxl")
+
+
+class SchemaMismatch(Exception):
+    """The file doesn't have the columns of the recorded schema."""
+
+
+def file_kind(file_name: str) -> str:
+    return "csv" if file_name.lower().endswith(".csv") else "excel"
+
+
+def _rewind(source) -> None:
+    if hasattr(source, "seek"):
+        source.seek(0)
+
+
+def read_excel_sheet(source, sheet=None, usecols=None) -> pd.DataFrame:
+    """Parses a single sheet (the first one by default); the other sheets of the workbook are never read."""
+    return pd.read_excel(source, sheet_name=0 if sheet is None else sheet, engine=EXCEL_ENGINE, usecols=usecols)
+
+
+def list_sheets(source) -> list[str]:
+    """Sheet names of a workbook; for .xlsx read from xl/workbook.xml without parsing any sheet."""
+    try:
+        with zipfile.ZipFile(source) as archive:
+            root = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+        return [element.get("name") for element in root.iter() if element.tag.endswith("}sheet")]
+    except (zipfile.BadZipFile, KeyError, ElementTree.ParseError):
+        pass  # Not an OOXML workbook (.xls)
+    finally:
+        _rewind(source)
+
+    try:
+        with pd.ExcelFile(source) as workbook:
+            return workbook.sheet_names
+    except Exception as e:
+        print(f"Could not list the sheets of the workbook: {e}")
+        return []
+    finally:
+        _rewind(source)
+
+
+def _read_plain(source, kind: str, sheet=None) -> pd.DataFrame:
+    if kind == "excel":
+        return read_excel_sheet(source, sheet)
+    try:
+        return pd.read_csv(source, engine="pyarrow")
+    except (pa.ArrowInvalid, ValueError) as e:
+        # Files the Arrow reader rejects (ragged rows, odd quoting) still load with the C parser
+        print(f"pyarrow CSV engine failed, falling back to the C parser: {e}")
+        _rewind(source)
+        return pd.read_csv(source)
+
+
+def _looks_like_dates(values: pd.Series, kind: str) -> bool:
+    if kind in ("date", "datetime", "datetime64"):
+        return True
+    if kind != "string":
+        return False
+    try:
+        # Cheap rejection on a sample, then the whole column must parse
+        pd.to_datetime(values.head(DATE_SAMPLE_ROWS), format="ISO8601")
+        pd.to_datetime(values, format="ISO8601")
+    except (ValueError, TypeError, OverflowError):
+        return False
+    return True
+
+
+def infer_schema(df: pd.DataFrame) -> dict:
+    """
+    Works out memory-friendly dtypes for the text columns of a freshly parsed frame:
+    ISO dates, low-cardinality categoricals and Arrow-backed strings.
+    """
+    schema = {"columns": [[col, str(dtype)] for col, dtype in df.dtypes.items()], "dates": [], "categoricals": [], "strings": []}
+
+    for col in df.columns:
+        series = df[col]
+        if series.dtype != object:
+            continue
+        values = series.dropna()
+        if values.empty:
+            continue
+
+        kind = pd.api.types.infer_dtype(values, skipna=True)
+        if _looks_like_dates(values, kind):
+            schema["dates"].append(col)
+        elif kind == "string":
+            if len(values) >= CATEGORY_MIN_ROWS and values.nunique() <= len(values) * CATEGORY_MAX_RATIO:
+                schema["categoricals"].append(col)
+            else:
+                schema["strings"].append(col)
+        # Mixed-type columns stay object
+
+    return schema
+
+
+def apply_schema(df: pd.DataFrame, schema: dict) -> pd.DataFrame:
+    """Casts a frame to the dtypes recorded in its schema."""
+    if [col for col, _ in schema["columns"]] != list(df.columns):
+        raise SchemaMismatch("Columns differ from the recorded schema")
+
+    casts = {col: "category" for col in schema["categoricals"] if df[col].dtype != "category"}
+    casts.update({col: STRING_DTYPE for col in schema["strings"] if df[col].dtype != STRING_DTYPE})
+    if casts:
+        df = df.astype(casts)
+    for col in schema["dates"]:
+        if not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col], format="ISO8601")
+    return df
+
+
+def projected_columns(columns, available) -> list:
+    """
+    Which of the available columns (in file order) to load for a projection, or None to load them all.
+    The projection is only trusted if the file has every column it names; otherwise (or when it's empty,
+    which would lose the row count) the analysis went wrong somewhere and the whole file is loaded.
+    """
+    if columns is None:
+        return None
+    names = set(available)
+    missing = [col for col in columns if col not in names]
+    if not columns or missing:
+        print(f"Projection doesn't fit the file (missing {missing[:5]}), loading every column")
+        return None
+    wanted = set(columns)
+    return [col for col in available if col in wanted]
+
+
+def project_schema(schema: dict, columns) -> dict:
+    """The part of a schema covering the given columns (names the schema doesn't have are ignored)."""
+    wanted = set(columns)
+    projected = {key: [col for col in values if col in wanted] for key, values in schema.items() if key != "columns"}
+    projected["columns"] = [[col, dtype] for col, dtype in schema["columns"] if col in wanted]
+    return projected
+
+
+def _read_with_schema(source, kind: str, schema: dict, sheet=None, columns=None) -> pd.DataFrame:
+    # Only the columns the workflow reads are parsed at all
+    usecols = projected_columns(columns, [col for col, _ in schema["columns"]])
+    if usecols is not None:
+        schema = project_schema(schema, usecols)
+    if kind == "csv":
+        # Known dtypes go straight to the Arrow reader, no type inference for those columns
+        dtype = {col: "category" for col in schema["categoricals"]}
+        dtype.update({col: STRING_DTYPE for col in schema["strings"]})
+        df = pd.read_csv(source, engine="pyarrow", dtype=dtype, parse_dates=schema["dates"] or None, usecols=usecols)
+    else:
+        df = read_excel_sheet(source, sheet, usecols)
+    return apply_schema(df, schema)
+
+
+def read_frame(source, kind: str, schema: dict = None, sheet=None, columns=None):
+    """
+    Parses a CSV or Excel file (path or file-like object), for Excel only the given sheet (default: first).
+    With a recorded schema the file is read with those dtypes; otherwise (or if the file no longer
+    matches it) dtypes are inferred. With columns, only those are kept (see projected_columns).
+    Returns (DataFrame, schema used), the schema always covers the whole file.
+    """
+    if schema:
+        try:
+            return _read_with_schema(source, kind, schema, sheet, columns), schema
+        except (SchemaMismatch, pa.ArrowInvalid, ValueError, TypeError, KeyError) as e:
+            print(f"Recorded schema doesn't fit the file, inferring again: {e}")
+            _rewind(source)
+
+    df = _read_plain(source, kind, sheet)
+    schema = infer_schema(df)
+    df = apply_schema(df, schema)
+    keep = projected_columns(columns, list(df.columns))
+    if keep is not None:
+        df = df[keep]
+    return df, schema
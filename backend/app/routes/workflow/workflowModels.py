@@ -1,8 +1,9 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
-from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Index, func, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy.ext.mutable import MutableList  # Import MutableList
 from sqlalchemy.orm import relationship
+from datetime import datetime
+from typing import Optional
 from app.utils.db import Base
 
 class Workflow(Base):
@@ -10,12 +11,82 @@ class Workflow(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     file_name: Mapped[str] = mapped_column(String, nullable=False)
-    pandas_scripts: Mapped[list[str]] = mapped_column(
-        MutableList.as_mutable(ARRAY(String)), default=list
-    )  # Use MutableList for tracking changes
+    # SHA-256 of the upload in the content-addressed store (workflowUploadStore), counted as a reference to it
+    upload_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, index=True)
+    # How the scripts are written and run: pandas (step by step) or a lazy engine (polars, duckdb), see workflowEngines
+    engine: Mapped[str] = mapped_column(String, nullable=False, default="pandas", server_default="pandas")
+    # Columns of the upload the scripts read (see workflowProjection), None when they need all of them
+    # (JSON keeps numeric Excel headers as numbers)
+    input_columns: Mapped[Optional[list]] = mapped_column(JSONB, nullable=True)
 
     # Foreign Key linking to User table
     created_by: Mapped[int] = mapped_column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
 
     # Relationship with User (optional, useful for ORM queries)
     user = relationship("User", back_populates="workflows")
+
+    # Scripts in order. Never loaded implicitly (a lookup shouldn't drag hundreds of steps along),
+    # see workflowSteps.load_workflow; the database removes them with the workflow
+    steps = relationship(
+        "WorkflowStep", back_populates="workflow", order_by="WorkflowStep.position",
+        cascade="all, delete-orphan", passive_deletes=True, lazy="raise",
+    )
+
+    @property
+    def pandas_scripts(self) -> list[str]:
+        """Code of every step, in order (needs the steps loaded with their code)."""
+        return [step.code for step in self.steps]
+
+    @property
+    def step_stats(self) -> list:
+        """Profile of the latest run of every step, by position (None for steps that never ran)."""
+        return [step.stats for step in self.steps]
+
+    __table_args__ = (
+        # Listings page through a user's workflows by id (keyset), the FK lookups use its prefix
+        Index("ix_workflows_created_by_id", "created_by", "id"),
+    )
+
+
+class WorkflowStep(Base):
+    """One saved script of a workflow. Appending a step inserts a row, the others aren't rewritten."""
+    __tablename__ = "workflow_steps"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    workflow_id: Mapped[int] = mapped_column(Integer, ForeignKey("workflows.id", ondelete="CASCADE"), nullable=False)
+    position: Mapped[int] = mapped_column(Integer, nullable=False)  # 1-based, the step number of profiles and checkpoints
+    # Step bodies are only read when the scripts run
+    code: Mapped[str] = mapped_column(Text, nullable=False, deferred=True, deferred_raiseload=True)
+    # SHA-256 of the code (workflowCompiler.script_hash)
+    code_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    # Profile of the latest run (wall/CPU time, peak RSS delta, shapes), see workflowProfiling
+    stats: Mapped[Optional[dict]] = mapped_column(JSONB, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    workflow = relationship("Workflow", back_populates="steps")
+
+    __table_args__ = (
+        # Steps of a workflow in order; also keeps two concurrent appends from taking the same position
+        Index("ix_workflow_steps_workflow_id_position", "workflow_id", "position", unique=True),
+    )
+
+
+class WorkflowJob(Base):
+    """A queued apply-workflow run, picked up by the job workers with SELECT ... FOR UPDATE SKIP LOCKED."""
+    __tablename__ = "workflow_jobs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    workflow_id: Mapped[int] = mapped_column(Integer, ForeignKey("workflows.id", ondelete="CASCADE"), nullable=False, index=True)
+    status: Mapped[str] = mapped_column(String, nullable=False, default="queued")  # queued, running, succeeded, failed
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    result_path: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # Workers only ever scan for claimable jobs
+        Index("ix_workflow_jobs_claimable", "status", "id", postgresql_where=text("status IN ('queued', 'running')")),
+    )
@@ -0,0 +1,123 @@
+import os
+import resource
+import threading
+import time
+from collections import OrderedDict
+from app.utils.metrics import register_collector
+
+# How often the resident set size is sampled while a step runs
+PROFILE_RSS_INTERVAL = float(os.getenv("PROFILE_RSS_INTERVAL_MS", "10")) / 1000
+# (workflow, step) series kept for /metrics, least recently updated dropped first
+PROFILE_METRICS_MAX_SERIES = int(os.getenv("PROFILE_METRICS_MAX_SERIES", "500"))
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# (workflow_id, step) -> {"runs", "wall_seconds", "cpu_seconds", "peak_rss_delta_bytes", "rows_out"}
+_series: "OrderedDict[tuple[int, int], dict]" = OrderedDict()
+_series_lock = threading.Lock()
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes (peak so far where /proc isn't available)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class _RssSampler(threading.Thread):
+    """Polls the RSS while a step runs; ru_maxrss alone is the lifetime peak of a long-lived worker."""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.start_rss = self.peak_rss = current_rss()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(PROFILE_RSS_INTERVAL):
+            self.peak_rss = max(self.peak_rss, current_rss())
+
+    def stop(self) -> int:
+        self._stop_event.set()
+        self.join()
+        self.peak_rss = max(self.peak_rss, current_rss())
+        return self.peak_rss - self.start_rss
+
+
+def _shape(df):
+    return (len(df), len(df.columns)) if df is not None else (0, 0)
+
+
+def profile_step(step: int, run, df):
+    """
+    Runs one step (run(df) -> output) and measures it.
+    Returns (output, {step, wall_seconds, cpu_seconds, peak_rss_delta_bytes, rows/cols in and out}).
+    """
+    rows_in, cols_in = _shape(df)
+    sampler = _RssSampler()
+    sampler.start()
+    wall_started, cpu_started = time.perf_counter(), time.process_time()
+    try:
+        output = run(df)
+    finally:
+        wall_seconds, cpu_seconds = time.perf_counter() - wall_started, time.process_time() - cpu_started
+        peak_rss_delta = sampler.stop()
+
+    rows_out, cols_out = _shape(output)
+    return output, {
+        "step": step,
+        "wall_seconds": round(wall_seconds, 6),
+        "cpu_seconds": round(cpu_seconds, 6),
+        "peak_rss_delta_bytes": max(peak_rss_delta, 0),
+        "rows_in": rows_in,
+        "cols_in": cols_in,
+        "rows_out": rows_out,
+        "cols_out": cols_out,
+    }
+
+
+def combine_chunk_stats(total: dict, chunk: dict) -> dict:
+    """Adds the stats of a step on one chunk to its totals over the whole file (chunked runs)."""
+    if total is None:
+        return dict(chunk)
+    for key in ("wall_seconds", "cpu_seconds"):
+        total[key] = round(total[key] + chunk[key], 6)
+    for key in ("rows_in", "rows_out"):
+        total[key] += chunk[key]
+    total["peak_rss_delta_bytes"] = max(total["peak_rss_delta_bytes"], chunk["peak_rss_delta_bytes"])
+    return total
+
+
+def record_steps(workflow_id: int, steps: list[dict]) -> None:
+    """Adds step runs to the per-step metrics."""
+    with _series_lock:
+        for stats in steps:
+            key = (workflow_id, stats["step"])
+            series = _series.pop(key, None) or {"runs": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0, "peak_rss_delta_bytes": 0, "rows_out": 0}
+            series["runs"] += 1
+            series["wall_seconds"] += stats["wall_seconds"]
+            series["cpu_seconds"] += stats["cpu_seconds"]
+            series["peak_rss_delta_bytes"] = stats["peak_rss_delta_bytes"]
+            series["rows_out"] = stats["rows_out"]
+            _series[key] = series
+        while len(_series) > PROFILE_METRICS_MAX_SERIES:
+            _series.popitem(last=False)
+
+
+@register_collector
+def step_metrics():
+    with _series_lock:
+        series = [({"workflow_id": workflow_id, "step": step}, values) for (workflow_id, step), values in _series.items()]
+    return [
+        ("workflow_step_runs_total", "counter", "Executions of a saved workflow step.",
+         [(labels, values["runs"]) for labels, values in series]),
+        ("workflow_step_wall_seconds_total", "counter", "Wall time spent in a workflow step.",
+         [(labels, round(values["wall_seconds"], 6)) for labels, values in series]),
+        ("workflow_step_cpu_seconds_total", "counter", "CPU time spent in a workflow step.",
+         [(labels, round(values["cpu_seconds"], 6)) for labels, values in series]),
+        ("workflow_step_peak_rss_delta_bytes", "gauge", "RSS growth during the last run of a workflow step.",
+         [(labels, values["peak_rss_delta_bytes"]) for labels, values in series]),
+        ("workflow_step_output_rows", "gauge", "Rows produced by the last run of a workflow step.",
+         [(labels, values["rows_out"]) for labels, values in series]),
+    ]
@@ -0,0 +1,331 @@
+import ast
+import hashlib
+import json
+import re
+from keyword import iskeyword
+import numpy as np
+import pandas as pd
+from pandas.api.typing import DataFrameGroupBy, ExponentialMovingWindow, Expanding, Resampler, Rolling, SeriesGroupBy
+from pandas.core.indexes.accessors import PeriodProperties, TimedeltaProperties
+
+# Frame methods whose output columns don't depend on the columns a script never names: they work column by
+# column, or only read the columns given in their arguments (which are string constants of the script)
+PROJECTION_SAFE_METHODS = {
+    "head", "tail", "copy", "sample", "reset_index", "set_index", "sort_values", "sort_index", "nlargest", "nsmallest",
+    "groupby", "pivot_table", "merge", "join", "assign", "rename", "drop", "astype", "fillna", "replace", "round",
+    "abs", "clip", "where", "mask", "sum", "mean", "median", "min", "max", "count", "nunique", "std", "var",
+    "query", "eval", "dropna", "drop_duplicates",
+}
+# Row filters over every column unless given a subset
+SUBSET_METHODS = {"dropna", "drop_duplicates"}
+# Without explicit keys these join on whatever columns both sides have
+JOIN_KEYWORDS = {"on", "left_on", "right_on", "left_index", "right_index"}
+# Groupby methods that hand every group to a function as a whole frame
+GROUP_FRAME_METHODS = {"apply", "filter", "pipe"}
+# Reducers whose first positional argument is the axis: df.sum(1) sums across the columns of each row
+REDUCER_METHODS = {"sum", "mean", "median", "min", "max", "count", "nunique", "std", "var", "apply"}
+# Methods whose string arguments are function names ("sum", "mean", ...), not columns
+AGG_METHODS = {"agg", "aggregate", "transform"}
+# Methods whose string arguments are values, not columns (in a {column: value} dict only the values)
+VALUE_METHODS = {
+    "isin", "fillna", "replace", "astype", "map", "eq", "ne", "lt", "le", "gt", "ge", "between", "where", "mask",
+    "clip", "format", "to_datetime", "to_numeric", "to_timedelta", "Timestamp",
+}
+# Keywords whose values name columns, any other keyword takes a value (how="left", format="%Y", ...)
+COLUMN_KEYWORDS = {
+    "on", "left_on", "right_on", "by", "subset", "columns", "column", "key", "values", "index", "id_vars", "value_vars", "level",
+}
+ACCESSORS = {"str", "dt", "cat"}
+QUOTED = re.compile(r"'[^']*'|\"[^\"]*\"")
+# Slices of df[...] that select rows (boolean masks, row ranges), not columns
+MASK_NODES = (ast.Compare, ast.BoolOp, ast.UnaryOp, ast.Slice, ast.Subscript, ast.Attribute)
+MASK_OPERATORS = (ast.BitAnd, ast.BitOr, ast.BitXor)
+IDENTIFIER = re.compile(r"`([^`]+)`|\b([A-Za-z_]\w*)\b")
+# Attributes of what a frame turns into along a chain (Series, groupby, accessors, ...); any other attribute
+# in a chain is a column: df.groupby("dept").salary
+CHAIN_ATTRIBUTES = {
+    name
+    for cls in (
+        pd.DataFrame, pd.Series, pd.Index, pd.DatetimeIndex, DataFrameGroupBy, SeriesGroupBy, Rolling, Expanding,
+        ExponentialMovingWindow, Resampler, pd.Series.str, pd.Series.dt, pd.Series.cat, pd.Series.plot,
+        TimedeltaProperties, PeriodProperties, np.ndarray,
+    )
+    for name in dir(cls)
+}
+
+
+class _Opaque(Exception):
+    """The script uses df in a way that may read any column (df.columns, df.iloc[:, 0], df.apply(axis=1), ...)."""
+
+
+def _constant_names(node) -> bool:
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return all(isinstance(elt, ast.Constant) for elt in node.elts)
+    return isinstance(node, ast.Constant)
+
+
+def _frame_root(node):
+    """Root name of a method / selection chain, and whether a single column was selected along the way."""
+    single = False
+    while isinstance(node, (ast.Attribute, ast.Subscript, ast.Call)):
+        if isinstance(node, ast.Subscript) and isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, str):
+            single = True
+        node = node.func if isinstance(node, ast.Call) else node.value
+    return (node.id if isinstance(node, ast.Name) else None), single
+
+
+class _ColumnReads(ast.NodeVisitor):
+    """
+    Over-approximates the columns of df a script reads: every string constant, attributes used as
+    columns (df.amount) and names in query()/eval() strings. Raises _Opaque on any use of a frame
+    that may depend on columns the script doesn't name.
+    """
+
+    def __init__(self, tree, created=()):
+        self.reads = set()
+        self.frames = {"df", "result_df"}  # Names holding df or a frame derived from it, column for column
+        self.values = set()  # Names holding masks / column lists, fine as a selection of df
+        self.parents = {child: parent for parent in ast.walk(tree) for child in ast.iter_child_nodes(parent)}
+        # Columns the chain has assigned in full before (df["x"] = ...), reading them needs nothing from the upload
+        self.created = set(created)
+        self.literals = set()  # String constants used as values (comparisons, agg functions, fill values, ...)
+        self.top_level = set(tree.body)
+
+    def visit_Constant(self, node):
+        if isinstance(node.value, str) and node not in self.literals and node.value not in self.created:
+            self.reads.add(node.value)
+
+    def _literals(self, *nodes):
+        for node in nodes:
+            for elt in node.elts if isinstance(node, (ast.List, ast.Tuple, ast.Set)) else [node]:
+                if isinstance(elt, ast.Constant):
+                    self.literals.add(elt)
+
+    def visit_Compare(self, node):
+        self._literals(node.left, *node.comparators)
+        self.generic_visit(node)
+
+    def visit_BinOp(self, node):
+        # df["name"] + "_x" is a value; a list or a name on either side may be a column list (["a"] + ["b"])
+        for operand, other in ((node.left, node.right), (node.right, node.left)):
+            if isinstance(operand, ast.Constant) and _frame_root(other)[0] in self.frames and not isinstance(other, ast.Name):
+                self._literals(operand)
+        self.generic_visit(node)
+
+    def visit_JoinedStr(self, node):
+        self._literals(*node.values)
+        self.generic_visit(node)
+
+    def _mark_literals(self, call):
+        name = call.func.attr
+        accessor = isinstance(call.func.value, ast.Attribute) and call.func.value.attr in ACCESSORS
+        for keyword in call.keywords:
+            if name in AGG_METHODS and isinstance(keyword.value, ast.Tuple) and len(keyword.value.elts) == 2:
+                self._literals(keyword.value.elts[1])  # total=("amount", "sum")
+            elif name in AGG_METHODS or keyword.arg not in COLUMN_KEYWORDS:
+                self._literals(keyword.value)
+        if name in ("query", "eval"):
+            self._literals(*call.args[:1])  # Its names are read in _check_attribute
+        if name in AGG_METHODS or name in VALUE_METHODS or accessor:
+            for arg in call.args:
+                if isinstance(arg, ast.Dict):
+                    self._literals(*arg.values, *(arg.keys if name == "map" else ()))
+                else:
+                    self._literals(arg)
+
+    def visit_Assign(self, node):
+        self.visit(node.value)
+        root, single = _frame_root(node.value)
+        for target in node.targets:
+            column = _assigned_column(target, self.frames)
+            if column is not None and node in self.top_level:
+                self.created.add(column)  # A new (or fully replaced) column, not read from the upload
+                continue
+            self.visit(target)
+            if isinstance(target, ast.Name):
+                if root in self.frames and not single:
+                    self.frames.add(target.id)
+                else:
+                    self.values.add(target.id)
+
+    def visit_Call(self, node):
+        if isinstance(node.func, ast.Attribute):
+            self._mark_literals(node)
+        self.generic_visit(node)
+        if isinstance(node.func, ast.Attribute) and node.func.attr in GROUP_FRAME_METHODS:
+            root, single = _frame_root(node.func.value)
+            if root in self.frames and not single:
+                raise _Opaque(f"groupby {node.func.attr}")
+
+    def _check_join(self, call):
+        if call.func.attr == "merge" and not JOIN_KEYWORDS & {keyword.arg for keyword in call.keywords}:
+            raise _Opaque("merge on common columns")
+
+    def visit_Name(self, node):
+        if node.id in self.frames and isinstance(node.ctx, ast.Load):
+            self._check_frame_use(node, self.parents.get(node))
+
+    def visit_Attribute(self, node):
+        # Attributes right on a frame name are checked in _check_attribute, these are further down a chain
+        if not isinstance(node.value, ast.Name) and node.attr not in CHAIN_ATTRIBUTES:
+            root, _ = _frame_root(node.value)
+            if root in self.frames:
+                self.reads.add(node.attr)
+        self.generic_visit(node)
+
+    def _add_numeric_names(self, node):
+        # Numbers are only column names when used as one (Excel headers like 2024)
+        for elt in node.elts if isinstance(node, (ast.List, ast.Tuple)) else [node]:
+            if isinstance(elt.value, int) and not isinstance(elt.value, bool):
+                self.reads.add(elt.value)
+
+    def _check_slice(self, node):
+        if _constant_names(node):
+            self._add_numeric_names(node)
+            return
+        if isinstance(node, MASK_NODES):
+            return
+        if isinstance(node, ast.Name) and node.id in self.values:
+            return
+        if isinstance(node, ast.BinOp) and isinstance(node.op, MASK_OPERATORS):
+            return
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            return  # df[df["a"].isin(...)], df[df["a"].str.contains(...)]
+        raise _Opaque("computed column selection")
+
+    def _check_frame_use(self, node, parent):
+        if isinstance(parent, ast.Subscript) and parent.value is node:
+            self._check_slice(parent.slice)
+        elif isinstance(parent, ast.Attribute) and parent.value is node:
+            self._check_attribute(parent, self.parents.get(parent))
+        elif isinstance(parent, ast.Assign) and parent.value is node:
+            pass  # Alias, tracked in visit_Assign
+        elif isinstance(parent, ast.Call) and isinstance(parent.func, ast.Name) and parent.func.id == "len":
+            pass
+        elif isinstance(parent, ast.Call) and isinstance(parent.func, ast.Attribute) and parent.func.attr in ("merge", "join"):
+            self._check_join(parent)  # Other side of a join
+        else:
+            raise _Opaque("frame used as a whole")
+
+    def _check_attribute(self, attribute, parent):
+        name = attribute.attr
+        if name in ("loc", "iloc"):
+            if not isinstance(parent, ast.Subscript):
+                raise _Opaque(name)
+            if isinstance(parent.slice, ast.Tuple):
+                columns = parent.slice.elts[1] if len(parent.slice.elts) == 2 else None
+                if name == "iloc" or columns is None or not (_constant_names(columns) or (
+                        isinstance(columns, ast.Slice) and columns.lower is None and columns.upper is None)):
+                    raise _Opaque(f"{name} column selection")
+                if not isinstance(columns, ast.Slice):
+                    self._add_numeric_names(columns)
+            return
+        if not hasattr(pd.DataFrame, name):
+            if isinstance(attribute.ctx, ast.Load):
+                self.reads.add(name)  # df.amount
+            return
+        if name not in PROJECTION_SAFE_METHODS or not (isinstance(parent, ast.Call) and parent.func is attribute):
+            raise _Opaque(name)
+
+        keywords = {keyword.arg: keyword.value for keyword in parent.keywords}
+        axis = keywords.get("axis")
+        if axis is None and name in REDUCER_METHODS and parent.args:
+            axis = parent.args[0]
+        if name != "drop" and axis is not None and not (isinstance(axis, ast.Constant) and axis.value in (0, "index")):
+            raise _Opaque(f"{name} across columns")
+        if name in SUBSET_METHODS and "subset" not in keywords and not parent.args:
+            raise _Opaque(f"{name} without subset")
+        if name == "rename":
+            mapper = keywords.get("columns", keywords.get("mapper", parent.args[0] if parent.args else None))
+            if mapper is not None and not isinstance(mapper, ast.Dict):
+                raise _Opaque("rename with a function")
+        if name == "merge":
+            self._check_join(parent)
+        if name in ("query", "eval"):
+            if not (parent.args and isinstance(parent.args[0], ast.Constant) and isinstance(parent.args[0].value, str)):
+                raise _Opaque(name)
+            for quoted, bare in IDENTIFIER.findall(QUOTED.sub("", parent.args[0].value)):
+                if quoted or not iskeyword(bare):
+                    self.reads.add(quoted or bare)
+
+
+def _assigned_column(target, frames: set):
+    """"x" for df["x"] = ..., None for any other assignment target."""
+    if isinstance(target, ast.Subscript) and isinstance(target.value, ast.Name) and target.value.id in frames \
+            and isinstance(target.slice, ast.Constant) and isinstance(target.slice.value, str):
+        return target.slice.value
+    return None
+
+
+def _limits_columns(node, frames: set) -> bool:
+    """Whether a result_df expression only keeps the columns it names (df[["a", "b"]], groupby(...).agg({...}), ...)."""
+    root, single = _frame_root(node)
+    if single or root not in frames:
+        return True  # A single column, or a frame built from scratch (pd.DataFrame({...}))
+    grouped = False
+    while isinstance(node, (ast.Attribute, ast.Subscript, ast.Call)):
+        if isinstance(node, ast.Subscript):
+            if isinstance(node.slice, (ast.List, ast.Tuple)) and _constant_names(node.slice):
+                return True
+            if isinstance(node.value, ast.Attribute) and node.value.attr == "loc" and isinstance(node.slice, ast.Tuple) \
+                    and len(node.slice.elts) == 2 and isinstance(node.slice.elts[1], (ast.List, ast.Tuple)):
+                return True
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            attr = node.func.attr
+            if attr in ("agg", "aggregate") and (node.keywords or (node.args and isinstance(node.args[0], ast.Dict))):
+                grouped = True
+            elif attr == "size":
+                grouped = True
+            elif attr == "pivot_table" and any(keyword.arg == "values" for keyword in node.keywords):
+                return True
+            elif attr == "groupby" and grouped:
+                return True
+        node = node.func if isinstance(node, ast.Call) else node.value
+    return False
+
+
+def script_columns(code: str, created=()):
+    """
+    (columns the script may read, whether its result only keeps columns it names, columns it creates)
+    for a pandas step, or None when the step may depend on every column of its input.
+    created are the columns earlier steps created, they aren't reads of the upload.
+    """
+    try:
+        tree = ast.parse(code)
+        visitor = _ColumnReads(tree, created)
+        visitor.visit(tree)
+    except (SyntaxError, _Opaque):
+        return None
+
+    # Only the last top-level assignment counts, a conditional one may not run
+    assignments = [statement for statement in tree.body if isinstance(statement, ast.Assign)
+                   and any(isinstance(target, ast.Name) and target.id == "result_df" for target in statement.targets)]
+    nested = any(isinstance(node, ast.Name) and node.id == "result_df" and isinstance(node.ctx, ast.Store)
+                 for statement in tree.body if not isinstance(statement, ast.Assign) for node in ast.walk(statement))
+    projects = bool(assignments) and not nested and _limits_columns(assignments[-1].value, visitor.frames)
+    return visitor.reads, projects, visitor.created
+
+
+def chain_input_columns(scripts: list[str]):
+    """
+    Columns of the upload a chain of pandas steps needs, or None if it needs all of them: only once
+    a step keeps nothing but the columns it names can the others be left out of the load.
+    Loaders only apply the result if the upload has every one of these columns (see projected_columns).
+    """
+    reads, created = set(), set()
+    for code in scripts:
+        analysis = script_columns(code, created)
+        if analysis is None:
+            return None
+        step_reads, projects, created = analysis
+        reads |= step_reads
+        if projects:
+            return sorted(reads, key=str)
+    return None
+
+
+def projected_input_hash(input_hash: str, columns) -> str:
+    """Checkpoints of a projected load are kept apart from those of the full file."""
+    if columns is None:
+        return input_hash
+    return hashlib.sha256(f"{input_hash}:{json.dumps(sorted(map(str, columns)))}".encode("utf-8")).hexdigest()
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from typing import List, Optional
+from datetime import datetime
 
 class WorkflowCreate(BaseModel):
     file_name: str
@@ -8,6 +9,33 @@ class WorkflowResponse(BaseModel):
     id: int
     file_name: str
     pandas_scripts: List[str]
+    engine: str = "pandas"
+    input_columns: Optional[list] = None
+    step_stats: Optional[List[Optional[dict]]] = None
+
+    class Config:
+        orm_mode = True
+
+class WorkflowSummary(BaseModel):
+    """A workflow in listings, without its scripts."""
+    id: int
+    file_name: str
+    engine: str = "pandas"
+    step_count: Optional[int] = None
+
+class WorkflowListResponse(BaseModel):
+    workflows: List[WorkflowSummary]
+    next_cursor: Optional[int] = None  # Pass as cursor for the next page, None on the last one
+
+class WorkflowJobResponse(BaseModel):
+    id: int
+    workflow_id: int
+    status: str
+    attempts: int
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
 
     class Config:
         orm_mode = True
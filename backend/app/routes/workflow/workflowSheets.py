@@ -0,0 +1,74 @@
+import hashlib
+import os
+from collections.abc import Mapping
+import pandas as pd
+from app.routes.workflow.workflowLoader import file_kind, list_sheets, read_frame
+from app.routes.workflow.workflowStorage import TEMP_DIR, raw_upload_path, read_columnar, write_columnar
+
+# Parsed sheets of every workflow's workbook, one Arrow file per sheet
+SHEET_CACHE_DIR = os.path.join(TEMP_DIR, "sheets")
+
+
+def sheet_cache_path(cache_dir: str, name: str) -> str:
+    # Sheet names can hold any character, the file name is a hash of it
+    return os.path.join(cache_dir, f"{hashlib.sha256(name.encode('utf-8')).hexdigest()[:32]}.arrow")
+
+
+class WorkbookSheets(Mapping):
+    """
+    The sheets of a workbook by name, as exposed to scripts (`sheets["Orders"]`).
+    A sheet is parsed the first time a script reads it, and kept as Arrow in cache_dir (if given)
+    so later runs only memory-map it.
+    """
+
+    def __init__(self, path: str, cache_dir: str = None):
+        self.path = path
+        self.cache_dir = cache_dir
+        self._names = None
+        self._frames = {}
+
+    def _sheet_names(self) -> list[str]:
+        if self._names is None:
+            self._names = list_sheets(self.path)
+        return self._names
+
+    def __getitem__(self, name: str) -> pd.DataFrame:
+        if name not in self._sheet_names():
+            raise KeyError(f"No sheet named {name!r}, the workbook has: {', '.join(self._sheet_names())}")
+        if name in self._frames:
+            return self._frames[name]
+
+        cached = sheet_cache_path(self.cache_dir, name) if self.cache_dir else None
+        if cached and os.path.exists(cached):
+            df = read_columnar(cached, arrow_strings=True)
+        else:
+            df, _ = read_frame(self.path, "excel", sheet=name)
+            if cached:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                write_columnar(df, cached)
+
+        self._frames[name] = df
+        return df
+
+    def __iter__(self):
+        return iter(self._sheet_names())
+
+    def __len__(self) -> int:
+        return len(self._sheet_names())
+
+
+def file_sheets(path: str, kind: str):
+    """Sheets of a one-off file (batch apply), not cached."""
+    return WorkbookSheets(path) if kind == "excel" else {}
+
+
+def workflow_sheets(workflow_id: int, file_name: str):
+    """Sheets of the workbook a workflow was started with (empty for CSV or single-sheet uploads)."""
+    path = raw_upload_path(workflow_id, file_name)
+    if file_kind(file_name) != "excel" or not os.path.exists(path):
+        return {}
+    return WorkbookSheets(path, os.path.join(SHEET_CACHE_DIR, str(workflow_id)))
+
+
+def workflow_sheet_names(workflow_id: int, file_name: str) -> list[str]:
+    return list(workflow_sheets(workflow_id, file_name))
@@ -0,0 +1,46 @@
+from sqlalchemy import func, select
+from sqlalchemy.orm import selectinload
+from app.routes.workflow.workflowCompiler import script_hash
+from app.routes.workflow.workflowModels import Workflow, WorkflowStep
+from app.routes.workflow.workflowProfiling import record_steps
+
+
+async def load_workflow(db, workflow_id: int, with_code: bool = True):
+    """
+    A workflow with its steps in order (one extra query). Without with_code the step bodies stay
+    unloaded, enough for positions, hashes and stats. None if the workflow doesn't exist.
+    """
+    steps = selectinload(Workflow.steps)
+    if with_code:
+        steps = steps.undefer(WorkflowStep.code)
+    # populate_existing: the workflow may already be in the session without its steps
+    return await db.get(Workflow, workflow_id, options=[steps], populate_existing=True)
+
+
+async def lock_workflow(db, workflow_id: int) -> int:
+    """
+    Locks the workflow row until the transaction ends, so concurrent appends take turns.
+    Returns the number of steps it has now (another request may have added one since it was loaded).
+    """
+    await db.execute(select(Workflow.id).where(Workflow.id == workflow_id).with_for_update())
+    return await db.scalar(select(func.count()).select_from(WorkflowStep).where(WorkflowStep.workflow_id == workflow_id))
+
+
+def append_step(workflow: Workflow, code: str) -> WorkflowStep:
+    """Adds a script after the last step of a loaded workflow; flushing inserts just that row."""
+    step = WorkflowStep(position=len(workflow.steps) + 1, code=code, code_hash=script_hash(code))
+    workflow.steps.append(step)
+    return step
+
+
+async def store_step_stats(db, workflow: Workflow, steps: list[dict]) -> None:
+    """Records step runs in the metrics and on the rows of the steps that ran (the others keep their stats)."""
+    record_steps(workflow.id, steps)
+    if steps:
+        by_position = {stats["step"]: stats for stats in steps}
+        result = await db.execute(
+            select(WorkflowStep).where(WorkflowStep.workflow_id == workflow.id, WorkflowStep.position.in_(by_position))
+        )
+        for step in result.scalars():
+            step.stats = by_position[step.position]
+        await db.commit()
@@ -0,0 +1,135 @@
+import json
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from app.routes.workflow.workflowLoader import file_kind, infer_schema, list_sheets, projected_columns, read_frame
+
+TEMP_DIR = "temp"
+
+# CSV uploads above this size stay raw (parsed chunk by chunk) instead of being loaded to build the columnar copy
+LARGE_UPLOAD_MB = int(os.getenv("LARGE_UPLOAD_MB", "256"))
+# Rows used to infer the schema of a large upload
+SCHEMA_SAMPLE_ROWS = int(os.getenv("SCHEMA_SAMPLE_ROWS", "100000"))
+
+
+def raw_upload_path(workflow_id: int, file_name: str) -> str:
+    """Where the original upload of a workflow is kept."""
+    return os.path.join(TEMP_DIR, f"{workflow_id}_{file_name}")
+
+
+def columnar_path(workflow_id: int) -> str:
+    """Where the parsed upload of a workflow is kept (Arrow IPC / Feather v2)."""
+    return os.path.join(TEMP_DIR, f"{workflow_id}.arrow")
+
+
+def schema_path(workflow_id: int) -> str:
+    """Where the dtypes inferred on the first load of a workflow's data are recorded."""
+    return os.path.join(TEMP_DIR, f"{workflow_id}.schema.json")
+
+
+def load_schema(workflow_id: int):
+    try:
+        with open(schema_path(workflow_id)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def save_schema(workflow_id: int, schema: dict) -> None:
+    tmp_path = f"{schema_path(workflow_id)}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(schema, f)
+    os.replace(tmp_path, schema_path(workflow_id))
+
+
+def load_upload(source, kind: str, workflow_id: int, columns=None) -> pd.DataFrame:
+    """Parses an upload with the workflow's recorded schema, recording one on the first load. columns limits what's kept."""
+    recorded = load_schema(workflow_id)
+    df, schema = read_frame(source, kind, recorded, columns=columns)
+    if recorded is None:
+        save_schema(workflow_id, schema)
+    return df
+
+
+def write_columnar(df: pd.DataFrame, path: str) -> bool:
+    """
+    Writes a DataFrame as uncompressed Arrow IPC so it can be memory-mapped later.
+    Returns False if the frame can't be represented in Arrow (e.g. mixed-type object columns).
+    """
+    tmp_path = f"{path}.tmp"
+    try:
+        feather.write_feather(df, tmp_path, compression="uncompressed")
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, ValueError) as e:
+        print(f"Could not write Arrow file {path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+    os.replace(tmp_path, path)  # Atomic, readers never see a half-written file
+    return True
+
+
+def read_columnar(path: str, arrow_strings: bool = False, columns=None) -> pd.DataFrame:
+    """
+    Loads an Arrow IPC file through a memory map, skipping any CSV/XLSX parsing.
+    With arrow_strings, text columns stay Arrow-backed (string[pyarrow]) instead of becoming objects.
+    With columns, only those are converted (see projected_columns); the others are never paged in.
+    """
+    table = feather.read_table(path, memory_map=True)
+    keep = projected_columns(columns, table.column_names)
+    if keep is not None:
+        table = table.select(keep)
+    if arrow_strings:
+        string_dtype = pd.StringDtype("pyarrow")
+        return table.to_pandas(types_mapper={pa.string(): string_dtype, pa.large_string(): string_dtype}.get)
+    return table.to_pandas()
+
+
+def ingest_upload(workflow_id: int, file_name: str) -> pd.DataFrame:
+    """
+    Parses the raw upload of a workflow once and stores it in columnar form.
+    The raw file is removed once the columnar copy exists, unless it's a workbook whose other
+    sheets scripts may still read (the columnar copy only holds the first sheet).
+    """
+    raw_path = raw_upload_path(workflow_id, file_name)
+    kind = file_kind(file_name)
+    df = load_upload(raw_path, kind, workflow_id)
+
+    if write_columnar(df, columnar_path(workflow_id)) and (kind != "excel" or len(list_sheets(raw_path)) <= 1):
+        os.remove(raw_path)
+
+    return df
+
+
+def is_large_upload(workflow_id: int, file_name: str) -> bool:
+    path = raw_upload_path(workflow_id, file_name)
+    return file_kind(file_name) == "csv" and os.path.getsize(path) > LARGE_UPLOAD_MB * 1024 * 1024
+
+
+def record_sample_schema(workflow_id: int, file_name: str) -> None:
+    """Records the schema of a large CSV upload from its first rows, without parsing the whole file."""
+    sample = pd.read_csv(raw_upload_path(workflow_id, file_name), nrows=SCHEMA_SAMPLE_ROWS)
+    save_schema(workflow_id, infer_schema(sample))
+
+
+def stored_input_path(workflow_id: int, file_name: str) -> str:
+    """The file currently holding the upload of a workflow (columnar copy if there is one)."""
+    path = columnar_path(workflow_id)
+    if os.path.exists(path):
+        return path
+    return raw_upload_path(workflow_id, file_name)
+
+
+def load_workflow_frame(workflow_id: int, file_name: str, columns=None) -> pd.DataFrame:
+    """Loads the upload of a workflow (only the given columns), preferring the columnar copy over re-parsing the raw file."""
+    path = columnar_path(workflow_id)
+    if os.path.exists(path):
+        return read_columnar(path, arrow_strings=True, columns=columns)
+
+    # Workflows started before ingestion existed only have the raw file
+    df = ingest_upload(workflow_id, file_name)
+    keep = projected_columns(columns, list(df.columns))
+    if keep is not None:
+        df = df[keep]
+    return df
@@ -0,0 +1,83 @@
+import os
+import zlib
+import pandas as pd
+from fastapi.responses import StreamingResponse
+
+# Rows serialized per chunk when streaming a result
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "50000"))
+
+OUTPUT_FORMATS = {"json", "csv", "ndjson"}
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def iter_csv_chunks(df: pd.DataFrame, chunk_rows: int = STREAM_CHUNK_ROWS):
+    """Yields the DataFrame as CSV, one block of rows at a time (header only in the first block)."""
+    if df.empty:
+        yield df.to_csv(index=False).encode("utf-8")
+        return
+
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        yield chunk.to_csv(index=False, header=(start == 0)).encode("utf-8")
+
+
+def iter_ndjson_chunks(df: pd.DataFrame, chunk_rows: int = STREAM_CHUNK_ROWS):
+    """Yields the DataFrame as newline-delimited JSON records, one block of rows at a time."""
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows].to_json(orient="records", lines=True, date_format="iso")
+        if not chunk.endswith("\n"):
+            chunk += "\n"
+        yield chunk.encode("utf-8")
+
+
+def gzip_chunks(chunks):
+    """Gzip-compresses a stream of byte chunks without buffering the whole body."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_csv_file(path: str, output_format: str, block_size: int = 1024 * 1024):
+    """Yields a CSV file from disk as CSV blocks or NDJSON records, removing the file once it's sent."""
+    try:
+        if output_format == "ndjson":
+            with pd.read_csv(path, chunksize=STREAM_CHUNK_ROWS) as reader:
+                for chunk in reader:
+                    yield from iter_ndjson_chunks(chunk)
+        else:
+            with open(path, "rb") as f:
+                while block := f.read(block_size):
+                    yield block
+    finally:
+        os.remove(path)
+
+
+def stream_dataframe(df: pd.DataFrame, output_format: str, accept_encoding: str = "", headers: dict = None):
+    """Builds a StreamingResponse for a result DataFrame in CSV or NDJSON, gzipped if the client accepts it."""
+    if output_format == "ndjson":
+        chunks = iter_ndjson_chunks(df)
+    else:
+        chunks = iter_csv_chunks(df)
+    return _streaming_response(chunks, output_format, accept_encoding, headers)
+
+
+def stream_csv_file(path: str, output_format: str, accept_encoding: str = "", headers: dict = None):
+    """Same as stream_dataframe for a result already written to a CSV file (chunked runs)."""
+    return _streaming_response(iter_csv_file(path, output_format), output_format, accept_encoding, headers)
+
+
+def _streaming_response(chunks, output_format: str, accept_encoding: str, headers: dict):
+    headers = dict(headers or {})
+    headers["Vary"] = "Accept-Encoding"
+    if "gzip" in (accept_encoding or "").lower():
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+
+    return StreamingResponse(chunks, media_type=MEDIA_TYPES[output_format], headers=headers)
@@ -0,0 +1,296 @@
+import hashlib
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+import aiofiles
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from app.routes.workflow.workflowCheckpoints import CHECKPOINT_DIR
+from app.routes.workflow.workflowLoader import file_kind, list_sheets
+from app.routes.workflow.workflowModels import Workflow
+from app.routes.workflow.workflowSheets import SHEET_CACHE_DIR
+from app.routes.workflow.workflowStorage import TEMP_DIR, columnar_path, raw_upload_path, schema_path
+from app.utils.db import AsyncSessionLocal
+from app.utils.metrics import register_collector
+
+# Uploads by content: <sha256> holds the bytes, <sha256>.arrow / .schema.json what ingesting them produced.
+# Workflow files (temp/{id}_{name}, temp/{id}.arrow) are hard links into it, so equal uploads share the disk space.
+UPLOAD_STORE_DIR = os.path.join(TEMP_DIR, "uploads")
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "1024"))
+# Content no workflow uses anymore is kept for later duplicates until the store outgrows this, least recently used first
+UPLOAD_STORE_MAX_MB = int(os.getenv("UPLOAD_STORE_MAX_MB", "10240"))
+# Eviction (and the sweep of files of deleted workflows) runs at most this often
+UPLOAD_EVICT_INTERVAL_SECONDS = int(os.getenv("UPLOAD_EVICT_INTERVAL_SECONDS", "300"))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# Room for the multipart framing (boundaries, part headers, form fields) around an upload in a request body
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+# Values per IN (...) of the eviction queries
+EVICT_QUERY_BATCH = 1000
+
+DERIVED_SUFFIXES = (".arrow", ".schema.json")
+# temp/{id}.arrow, temp/{id}.schema.json: only ever written by ingestion
+DERIVED_FILE = re.compile(r"^(\d+)\.(?:arrow|schema\.json)$")
+# temp/{id}_{name}: also the name of files the store didn't write (sample workbooks, uploads from before it)
+RAW_FILE = re.compile(r"^(\d+)_.+$")
+
+_stats = {"uploads": 0, "deduplicated": 0, "bytes_deduplicated": 0, "evicted": 0, "bytes_evicted": 0, "orphans_removed": 0}
+_stats_lock = threading.Lock()
+_last_eviction = 0.0
+
+
+class UploadTooLarge(Exception):
+    """The upload is above MAX_UPLOAD_MB."""
+
+
+def request_too_large(content_length) -> bool:
+    """Whether a request body announced with this Content-Length can't hold an upload within MAX_UPLOAD_MB."""
+    try:
+        return int(content_length) > MAX_UPLOAD_MB * 1024 * 1024 + MULTIPART_OVERHEAD_BYTES
+    except (TypeError, ValueError):
+        return False  # Chunked or missing, store_upload still stops at the limit
+
+
+def blob_path(digest: str) -> str:
+    return os.path.join(UPLOAD_STORE_DIR, digest[:2], digest)
+
+
+def _count(**increments) -> None:
+    with _stats_lock:
+        for key, value in increments.items():
+            _stats[key] += value
+
+
+async def store_upload(file: UploadFile) -> str:
+    """
+    Streams an upload into the store while hashing it and returns its SHA-256.
+    Content that's already stored isn't kept twice; it just becomes the most recently used.
+    """
+    limit = MAX_UPLOAD_MB * 1024 * 1024
+    if file.size is not None and file.size > limit:
+        raise UploadTooLarge(f"Uploads are limited to {MAX_UPLOAD_MB} MB")
+
+    os.makedirs(UPLOAD_STORE_DIR, exist_ok=True)
+    tmp_path = os.path.join(UPLOAD_STORE_DIR, f"incoming-{uuid.uuid4().hex}")
+    digest, size = hashlib.sha256(), 0
+    await file.seek(0)
+    try:
+        async with aiofiles.open(tmp_path, "wb") as f:
+            while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+                size += len(chunk)
+                if size > limit:
+                    raise UploadTooLarge(f"Uploads are limited to {MAX_UPLOAD_MB} MB")
+                digest.update(chunk)
+                await f.write(chunk)
+
+        path = blob_path(digest.hexdigest())
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            os.utime(path)
+            _count(uploads=1, deduplicated=1, bytes_deduplicated=size)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+            _count(uploads=1)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return digest.hexdigest()
+
+
+def _link(source: str, path: str) -> None:
+    """Makes path a hard link to source (a copy across file systems), replacing whatever was there."""
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def link_upload(digest: str, workflow_id: int, file_name: str) -> str:
+    """Puts stored content at the raw upload path of a workflow."""
+    path = raw_upload_path(workflow_id, file_name)
+    _link(blob_path(digest), path)
+    return path
+
+
+def reuse_ingested(digest: str, workflow_id: int, file_name: str) -> bool:
+    """
+    Gives a workflow the columnar copy and schema already made from the same content, so a duplicate
+    upload isn't parsed again. Returns False if the content was never ingested.
+    """
+    blob = blob_path(digest)
+    if not all(os.path.exists(blob + suffix) for suffix in DERIVED_SUFFIXES):
+        return False
+    _link(blob + ".arrow", columnar_path(workflow_id))
+    shutil.copyfile(blob + ".schema.json", schema_path(workflow_id))
+    os.utime(blob)
+
+    # Same rule as ingest_upload: workbooks with other sheets keep their raw file
+    raw_path = raw_upload_path(workflow_id, file_name)
+    if file_kind(file_name) != "excel" or len(list_sheets(raw_path)) <= 1:
+        os.remove(raw_path)
+    return True
+
+
+def remember_ingested(digest: str, workflow_id: int) -> None:
+    """Keeps what ingesting an upload produced next to its content, for later duplicates."""
+    blob = blob_path(digest)
+    if os.path.exists(columnar_path(workflow_id)) and os.path.exists(schema_path(workflow_id)) and os.path.exists(blob):
+        _link(columnar_path(workflow_id), blob + ".arrow")
+        shutil.copyfile(schema_path(workflow_id), blob + ".schema.json")
+
+
+def _store_entries() -> list:
+    """(last use, digest, total bytes) of every stored upload."""
+    entries = []
+    if not os.path.isdir(UPLOAD_STORE_DIR):
+        return entries
+    for prefix in os.scandir(UPLOAD_STORE_DIR):
+        if not prefix.is_dir():
+            continue
+        sizes, used = {}, {}
+        for entry in os.scandir(prefix.path):
+            digest = entry.name.split(".", 1)[0]
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            sizes[digest] = sizes.get(digest, 0) + stat.st_size
+            if entry.name == digest:
+                used[digest] = stat.st_mtime
+        entries += [(used.get(digest, 0.0), digest, size) for digest, size in sizes.items()]
+    return entries
+
+
+def eviction_candidates() -> tuple:
+    """
+    (total bytes of the store, uploads that may be evicted least recently used first), the latter empty
+    while the store fits in UPLOAD_STORE_MAX_MB. Whether a workflow still references them is up to the caller.
+    """
+    entries = sorted(_store_entries())
+    total = sum(size for _, _, size in entries)
+    if total <= UPLOAD_STORE_MAX_MB * 1024 * 1024:
+        return total, []
+    # Recently stored / deduplicated content may belong to a workflow that isn't committed yet
+    recent = time.time() - UPLOAD_EVICT_INTERVAL_SECONDS
+    return total, [(digest, size) for used, digest, size in entries if used <= recent]
+
+
+def evict_store(total: int, candidates: list, referenced: set) -> int:
+    """
+    Removes candidates (see eviction_candidates) until the store fits in UPLOAD_STORE_MAX_MB. Content a
+    workflow still references is never evicted. Returns the bytes freed.
+    """
+    budget = UPLOAD_STORE_MAX_MB * 1024 * 1024
+    freed = 0
+    for digest, size in candidates:
+        if total - freed <= budget:
+            break
+        if digest in referenced:
+            continue
+        blob = blob_path(digest)
+        for path in (blob, *(blob + suffix for suffix in DERIVED_SUFFIXES)):
+            if os.path.exists(path):
+                os.remove(path)
+        freed += size
+        _count(evicted=1, bytes_evicted=size)
+    return freed
+
+
+def workflow_files() -> dict:
+    """
+    Workflow id -> its files in temp/ and its sheet cache / checkpoint directories. Raw uploads only count
+    while they're hard links into the store, other {id}_{name} files weren't written by it and stay.
+    """
+    files = {}
+    if os.path.isdir(TEMP_DIR):
+        for entry in os.scandir(TEMP_DIR):
+            if not entry.is_file():
+                continue
+            match = DERIVED_FILE.match(entry.name)
+            if not match and (raw := RAW_FILE.match(entry.name)) and entry.stat().st_nlink > 1:
+                match = raw
+            if match:
+                files.setdefault(int(match.group(1)), []).append(entry.path)
+    for directory in (CHECKPOINT_DIR, SHEET_CACHE_DIR):
+        if not os.path.isdir(directory):
+            continue
+        for entry in os.scandir(directory):
+            if entry.name.isdigit() and entry.is_dir():
+                files.setdefault(int(entry.name), []).append(entry.path)
+    return files
+
+
+def sweep_orphans(files: dict, existing: set) -> int:
+    """Removes the files (see workflow_files) of workflows that aren't in existing. Returns how many went."""
+    removed = 0
+    for workflow_id, paths in files.items():
+        if workflow_id in existing:
+            continue
+        for path in paths:
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.exists(path):
+                os.remove(path)
+            removed += 1
+    _count(orphans_removed=removed)
+    return removed
+
+
+async def _present(db, column, values) -> set:
+    """The values column has in the workflows table, looked up in batches (upload_hash and id are indexed)."""
+    values, found = list(values), set()
+    for start in range(0, len(values), EVICT_QUERY_BATCH):
+        batch = values[start:start + EVICT_QUERY_BATCH]
+        found.update((await db.execute(select(column).where(column.in_(batch)).distinct())).scalars().all())
+    return found
+
+
+async def evict_uploads(force: bool = False) -> None:
+    """
+    Eviction and the orphan sweep, throttled to UPLOAD_EVICT_INTERVAL_SECONDS. Runs after the response
+    (background task) in a session of its own; only the hashes and ids found on disk are looked up.
+    """
+    global _last_eviction
+    if not force and time.monotonic() - _last_eviction < UPLOAD_EVICT_INTERVAL_SECONDS:
+        return
+    _last_eviction = time.monotonic()
+
+    try:
+        async with AsyncSessionLocal() as db:
+            # Sweep first: raw uploads of deleted workflows are only recognized while their blob is there
+            # (a workflow's row is committed before any of its files are written)
+            files = await run_in_threadpool(workflow_files)
+            existing = await _present(db, Workflow.id, files)
+            removed = await run_in_threadpool(sweep_orphans, files, existing)
+
+            total, candidates = await run_in_threadpool(eviction_candidates)
+            referenced = await _present(db, Workflow.upload_hash, [digest for digest, _ in candidates])
+            freed = await run_in_threadpool(evict_store, total, candidates, referenced)
+    except Exception as e:
+        print(f"Upload store eviction failed: {e}")
+        return
+    if freed or removed:
+        print(f"Upload store: evicted {freed} bytes, removed {removed} files of deleted workflows")
+
+
+@register_collector
+def upload_store_metrics():
+    with _stats_lock:
+        stats = dict(_stats)
+    return [
+        ("workflow_uploads_total", "counter", "Uploads written to the upload store.", [({}, stats["uploads"])]),
+        ("workflow_uploads_deduplicated_total", "counter", "Uploads whose content was already stored.", [({}, stats["deduplicated"])]),
+        ("workflow_upload_bytes_deduplicated_total", "counter", "Bytes not stored twice thanks to deduplication.",
+         [({}, stats["bytes_deduplicated"])]),
+        ("workflow_upload_evictions_total", "counter", "Stored uploads evicted to stay within the size budget.", [({}, stats["evicted"])]),
+        ("workflow_upload_bytes_evicted_total", "counter", "Bytes freed by upload store evictions.", [({}, stats["bytes_evicted"])]),
+        ("workflow_orphan_files_removed_total", "counter", "Files and directories of deleted workflows removed.",
+         [({}, stats["orphans_removed"])]),
+    ]
@@ -0,0 +1,283 @@
+import ast
+import difflib
+import importlib
+import re
+import sys
+import types
+from dataclasses import dataclass, field
+
+# Modules generated scripts may import, everything else (os, subprocess, requests, ...) is rejected
+ALLOWED_IMPORTS = {"pandas", "numpy", "math", "re", "datetime", "string", "statistics"}
+# Submodules scripts may reach through those (pd.api.types, np.random, ...); pd.io, pd.core, np.lib,
+# statistics.sys and the like aren't allowed, whether imported or reached by attribute
+ALLOWED_MODULES = ALLOWED_IMPORTS | {
+    "pandas.api", "pandas.api.types", "pandas.arrays", "pandas.errors", "pandas.tseries", "pandas.tseries.offsets",
+    "numpy.random", "numpy.linalg", "numpy.ma", "numpy.char", "numpy.strings", "numpy.fft", "numpy.emath", "numpy.dtypes",
+}
+# Modules the scripts get without importing them
+MODULE_ALIASES = {"pd": "pandas"}
+# Attributes that lead to the system whatever the receiver (pd.io.common.os.system, ...)
+SYSTEM_ATTRIBUTES = {"io", "os", "sys", "subprocess", "shutil", "builtins", "importlib"}
+DISALLOWED_CALLS = {
+    "open", "exec", "eval", "compile", "__import__", "input", "breakpoint", "exit", "quit",
+    "globals", "locals", "vars", "getattr", "setattr", "delattr",
+}
+# DataFrame / Series writers
+IO_METHODS = {
+    "to_csv", "to_excel", "to_parquet", "to_pickle", "to_json", "to_sql", "to_feather", "to_hdf", "to_html",
+    "to_clipboard", "to_stata", "to_orc", "to_xml", "to_latex", "to_markdown", "tofile",
+}
+# numpy file functions (np.load, from numpy import save, ...)
+FILE_FUNCTIONS = {
+    "load", "save", "savez", "savez_compressed", "savetxt", "loadtxt", "genfromtxt", "fromfile", "fromregex", "memmap",
+}
+# DataFrame methods whose string arguments (or by=/subset=/columns=) name existing columns
+COLUMN_ARGUMENT_METHODS = {"groupby", "sort_values", "drop_duplicates", "set_index", "pivot_table", "pivot", "melt"}
+# Same, but only by keyword (the first argument of dropna is the axis)
+COLUMN_KEYWORD_METHODS = {"dropna"}
+COLUMN_KEYWORDS = {"by", "subset", "columns", "index", "values", "id_vars", "value_vars"}
+# df methods that can add or rename columns of df itself (or of whatever they're assigned to)
+COLUMN_CHANGING_METHODS = {"insert", "eval", "assign", "rename", "set_axis", "add_prefix", "add_suffix"}
+
+
+@dataclass
+class ValidationReport:
+    errors: list[str] = field(default_factory=list)  # The script must not be saved or run
+    warnings: list[str] = field(default_factory=list)  # Runs, but slowly (row-wise patterns)
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+def _column_names(node) -> list:
+    """Constant column names in a subscript / argument: "a" or ["a", "b"]."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, (str, int)):
+        return [node.value]
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return [elt.value for elt in node.elts if isinstance(elt, ast.Constant) and isinstance(elt.value, (str, int))]
+    return []
+
+
+def _is_df(node) -> bool:
+    return isinstance(node, ast.Name) and node.id == "df"
+
+
+def _referenced_columns(node) -> list:
+    """Columns of df an expression reads: df["a"], df[["a", "b"]], df.loc[:, "a"], df.groupby("a"), ..."""
+    columns = []
+    for child in ast.walk(node):
+        if isinstance(child, ast.Subscript) and isinstance(child.ctx, ast.Load):
+            if _is_df(child.value):
+                columns += _column_names(child.slice)
+            elif isinstance(child.value, ast.Attribute) and child.value.attr == "loc" and _is_df(child.value.value):
+                if isinstance(child.slice, ast.Tuple) and len(child.slice.elts) == 2:
+                    columns += _column_names(child.slice.elts[1])
+        elif isinstance(child, ast.Call) and isinstance(child.func, ast.Attribute) and _is_df(child.func.value):
+            if child.func.attr in COLUMN_ARGUMENT_METHODS | COLUMN_KEYWORD_METHODS:
+                if child.func.attr in COLUMN_ARGUMENT_METHODS:
+                    for arg in child.args[:1]:
+                        columns += _column_names(arg)
+                for keyword in child.keywords:
+                    if keyword.arg in COLUMN_KEYWORDS:
+                        columns += _column_names(keyword.value)
+    return columns
+
+
+def _changes_columns(statement) -> bool:
+    """Whether a statement may change the columns of df in a way the column check doesn't follow."""
+    for node in ast.walk(statement):
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and _is_df(node.func.value):
+            if node.func.attr in COLUMN_CHANGING_METHODS:
+                return True
+            if any(keyword.arg == "inplace" and not (isinstance(keyword.value, ast.Constant) and keyword.value.value is False)
+                   for keyword in node.keywords):
+                return True
+        elif isinstance(node, ast.Attribute) and isinstance(node.ctx, ast.Store) and _is_df(node.value):
+            return True  # df.columns = [...]
+    return False
+
+
+def _file_access(name: str):
+    """Why a function / method name touches files, or None."""
+    if name in IO_METHODS or name.startswith(("write_", "sink_")):
+        return "writes files, return result_df instead"
+    if name.startswith(("read_", "scan_")):
+        return "reads files, use the given frame"
+    if name in FILE_FUNCTIONS:
+        return "reads or writes files, use the given frame"
+    return None
+
+
+def _module(name: str):
+    """The module object behind an allowed module name, None if it isn't importable here."""
+    if name in sys.modules:
+        return sys.modules[name]
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+def _resolve(node, modules: dict):
+    """The object an attribute chain rooted at a module name (pd.api.types, np.random.default_rng) refers to, or None."""
+    if isinstance(node, ast.Name):
+        return modules.get(node.id)
+    if isinstance(node, ast.Attribute):
+        parent = _resolve(node.value, modules)
+        if isinstance(parent, types.ModuleType) and _is_allowed_module(parent):
+            return getattr(parent, node.attr, None)
+    return None
+
+
+def _is_allowed_module(value) -> bool:
+    return not isinstance(value, types.ModuleType) or value.__name__ in ALLOWED_MODULES
+
+
+def _check_safety(tree: ast.AST, report: ValidationReport) -> None:
+    # Names bound to modules, filled from the imports first so the order of statements doesn't matter
+    modules = {alias: _module(name) for alias, name in MODULE_ALIASES.items()}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.name in ALLOWED_MODULES:
+                    # import numpy.random binds numpy, import numpy.random as r binds the submodule
+                    if alias.asname:
+                        modules[alias.asname] = _module(alias.name)
+                    else:
+                        modules[alias.name.split(".")[0]] = _module(alias.name.split(".")[0])
+        elif isinstance(node, ast.ImportFrom) and node.module in ALLOWED_MODULES and (module := _module(node.module)):
+            for alias in node.names:
+                modules[alias.asname or alias.name] = getattr(module, alias.name, None)
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.name not in ALLOWED_MODULES:
+                    report.errors.append(f"Line {node.lineno}: importing {alias.name} is not allowed")
+        elif isinstance(node, ast.ImportFrom):
+            module = node.module or ""
+            if module not in ALLOWED_MODULES:
+                report.errors.append(f"Line {node.lineno}: importing {module} is not allowed")
+                continue
+            for alias in node.names:
+                if alias.name == "*":
+                    report.errors.append(f"Line {node.lineno}: from {module} import * is not allowed")
+                elif _file_access(alias.name) or alias.name in SYSTEM_ATTRIBUTES or alias.name.startswith("_"):
+                    report.errors.append(f"Line {node.lineno}: importing {alias.name} from {module} is not allowed")
+                elif not _is_allowed_module(modules.get(alias.asname or alias.name)):
+                    report.errors.append(f"Line {node.lineno}: importing {module}.{alias.name} is not allowed")
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in DISALLOWED_CALLS:
+            report.errors.append(f"Line {node.lineno}: {node.func.id}() is not allowed")
+        elif isinstance(node, ast.Attribute):
+            if node.attr.startswith("__"):
+                report.errors.append(f"Line {node.lineno}: access to {node.attr} is not allowed")
+            elif node.attr in SYSTEM_ATTRIBUTES:
+                report.errors.append(f"Line {node.lineno}: access to .{node.attr} is not allowed")
+            elif reason := _file_access(node.attr):
+                report.errors.append(f"Line {node.lineno}: .{node.attr}() {reason}")
+            elif not _is_allowed_module(_resolve(node, modules)):
+                report.errors.append(f"Line {node.lineno}: access to {ast.unparse(node)} is not allowed")
+        elif isinstance(node, ast.Name) and node.id.startswith("__"):
+            report.errors.append(f"Line {node.lineno}: access to {node.id} is not allowed")
+
+
+def _check_row_wise(tree: ast.AST, report: ValidationReport) -> None:
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            if node.func.attr in ("iterrows", "itertuples"):
+                report.warnings.append(f"Line {node.lineno}: .{node.func.attr}() loops over rows in Python")
+            elif node.func.attr == "apply" and any(
+                keyword.arg == "axis" and isinstance(keyword.value, ast.Constant) and keyword.value.value in (1, "columns")
+                for keyword in node.keywords
+            ):
+                report.warnings.append(f"Line {node.lineno}: .apply(axis=1) calls a Python function per row")
+        elif isinstance(node, ast.For) and isinstance(node.iter, ast.Call) and isinstance(node.iter.func, ast.Name):
+            if node.iter.func.id == "range" and any(
+                isinstance(arg, ast.Call) and isinstance(arg.func, ast.Name) and arg.func.id == "len" for arg in node.iter.args
+            ):
+                report.warnings.append(f"Line {node.lineno}: for loop over row positions")
+
+
+def _assigned_columns(statement):
+    """
+    Columns of df a statement (and the blocks nested in it) assigns: df["a"] = ..., df.loc[:, "a"] = ...
+    Returns (columns, opaque); opaque when df is replaced or gets a column whose name isn't a constant.
+    """
+    columns, opaque = set(), False
+    for node in ast.walk(statement):
+        if isinstance(node, ast.Name) and node.id == "df" and isinstance(node.ctx, ast.Store):
+            opaque = True  # df = ..., for df in ..., with ... as df
+        elif isinstance(node, ast.Subscript) and isinstance(node.ctx, ast.Store):
+            if _is_df(node.value):
+                key = node.slice
+            elif isinstance(node.value, ast.Attribute) and node.value.attr == "loc" and _is_df(node.value.value):
+                if not (isinstance(node.slice, ast.Tuple) and len(node.slice.elts) == 2):
+                    continue  # Rows only
+                key = node.slice.elts[1]
+            else:
+                continue
+            names = _column_names(key)
+            if not isinstance(key, ast.Slice) and len(names) != (len(key.elts) if isinstance(key, (ast.List, ast.Tuple)) else 1):
+                opaque = True  # df[name] = ... with a computed name
+            columns.update(names)
+    return columns, opaque
+
+
+def _check_columns(tree: ast.Module, headers: list, report: ValidationReport) -> None:
+    known = set(headers)
+    for statement in tree.body:
+        created, opaque = _assigned_columns(statement)
+        nested = any(isinstance(node, ast.stmt) for node in ast.walk(statement) if node is not statement)
+        if nested:
+            if opaque:
+                return  # df replaced somewhere in a block, the dry run checks the rest
+            known.update(created)  # Order inside a block (a loop) isn't followed, take its columns as known
+        for column in _referenced_columns(statement):
+            if column not in known:
+                close = difflib.get_close_matches(str(column), [str(h) for h in known], n=1)
+                hint = f", did you mean {close[0]!r}?" if close else ""
+                report.errors.append(f"Line {statement.lineno}: unknown column {column!r}{hint}")
+                known.add(column)  # Report each column once
+
+        if opaque or _changes_columns(statement):
+            return  # Columns of df aren't known statically anymore, the dry run checks the rest
+        known.update(created)
+
+
+def validate_script(code: str, headers: list) -> ValidationReport:
+    """
+    Static checks on a generated script before it's saved or run: syntax, imports and I/O,
+    columns of df it reads against the known headers, and row-wise loops (warnings only).
+    """
+    report = ValidationReport()
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        report.errors.append(f"Line {e.lineno}: syntax error: {e.msg}")
+        return report
+
+    _check_safety(tree, report)
+    _check_columns(tree, list(headers), report)
+    _check_row_wise(tree, report)
+    return report
+
+
+# DuckDB steps are a single query on the previous step (`input`); file access is also disabled at run time
+SQL_DISALLOWED = re.compile(
+    r"\b(read_\w+|\w+_scan|glob|copy|attach|detach|install|load|pragma|set|reset|export|import|create|insert|update|delete|drop|alter)\b",
+    re.IGNORECASE,
+)
+
+
+def validate_sql(code: str) -> ValidationReport:
+    """Static checks on a generated DuckDB step: one SELECT (or WITH ... SELECT) statement, no file or catalog access."""
+    report = ValidationReport()
+    sql = code.strip().rstrip(";").strip()
+    if not re.match(r"(select|with)\b", sql, re.IGNORECASE):
+        report.errors.append("The step must be a single SELECT statement")
+    if ";" in re.sub(r"'[^']*'", "''", sql):
+        report.errors.append("The step must be a single statement")
+    for match in SQL_DISALLOWED.finditer(re.sub(r"'[^']*'|\"[^\"]*\"", "''", sql)):
+        report.errors.append(f"{match.group(0)} is not allowed")
+    return report
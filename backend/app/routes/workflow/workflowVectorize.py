@@ -0,0 +1,272 @@
+import ast
+import copy
+import os
+import threading
+import pandas as pd
+from app.routes.workflow.workflowExecutor import benchmark_scripts
+from app.routes.workflow.workflowValidation import validate_script
+from app.utils.metrics import register_collector
+
+VECTORIZE_SCRIPTS = os.getenv("VECTORIZE_SCRIPTS", "1") == "1"
+# Ask the model again (once) when a row-wise script can't be rewritten mechanically
+VECTORIZE_REPROMPT = os.getenv("VECTORIZE_REPROMPT", "1") == "1"
+# Rows of the benchmark frame (preview rows repeated) both versions are timed on
+VECTORIZE_BENCH_ROWS = int(os.getenv("VECTORIZE_BENCH_ROWS", "20000"))
+
+VECTORIZE_HINT = (
+    "Write it with vectorized column operations only: no df.apply(..., axis=1), no iterrows/itertuples "
+    "and no Python loops over rows. Use arithmetic on columns, .str/.dt accessors, .where/.mask, "
+    ".isin and boolean masks instead."
+)
+
+# Python calls on a value and their element-wise pandas equivalents
+CASTS = {"str": "str", "int": "int64", "float": "float64", "bool": "bool"}
+STRING_METHODS = {
+    "lower", "upper", "strip", "lstrip", "rstrip", "title", "capitalize", "casefold", "swapcase",
+    "startswith", "endswith", "replace", "zfill", "split", "isdigit", "isalpha", "isnumeric",
+}
+ARITHMETIC = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+
+_stats = {"attempts": 0, "rewrite": 0, "reprompt": 0, "failed": 0, "seconds_saved": 0.0}
+_stats_lock = threading.Lock()
+
+
+class _Unsupported(Exception):
+    pass
+
+
+def _df_column(name) -> ast.Subscript:
+    return ast.Subscript(value=ast.Name(id="df", ctx=ast.Load()), slice=ast.Constant(value=name), ctx=ast.Load())
+
+
+def _method(value, name: str, args=()) -> ast.Call:
+    return ast.Call(func=ast.Attribute(value=value, attr=name, ctx=ast.Load()), args=list(args), keywords=[])
+
+
+class _ToColumns(ast.NodeTransformer):
+    """
+    Turns the body of a per-row lambda into the same expression on whole columns.
+    Row mode: lambda row: row["a"] + row.b  ->  df["a"] + df["b"]
+    Value mode: lambda x: x * 2 on df["a"]  ->  df["a"] * 2
+    Anything without an obvious column-wise equivalent raises _Unsupported.
+    """
+
+    def __init__(self, arg: str, series: ast.expr = None):
+        self.arg = arg
+        self.series = series
+
+    def _is_arg(self, node) -> bool:
+        return isinstance(node, ast.Name) and node.id == self.arg
+
+    def generic_visit(self, node):
+        if not isinstance(node, (ast.Constant, ast.expr_context, ast.operator, ast.cmpop, ast.List, ast.Tuple, ast.Set)):
+            raise _Unsupported(type(node).__name__)
+        return super().generic_visit(node)
+
+    def visit_Name(self, node):
+        if self._is_arg(node) and self.series is not None:
+            return copy.deepcopy(self.series)
+        if node.id == "pd":
+            return node
+        raise _Unsupported(f"name {node.id}")
+
+    def visit_Subscript(self, node):
+        if self.series is None and self._is_arg(node.value) and isinstance(node.slice, ast.Constant):
+            return _df_column(node.slice.value)
+        raise _Unsupported("subscript")
+
+    def visit_Attribute(self, node):
+        if self.series is None and self._is_arg(node.value):
+            return _df_column(node.attr)
+        raise _Unsupported("attribute")
+
+    def visit_BinOp(self, node):
+        if not isinstance(node.op, ARITHMETIC):
+            raise _Unsupported("operator")
+        return ast.BinOp(left=self.visit(node.left), op=node.op, right=self.visit(node.right))
+
+    def visit_UnaryOp(self, node):
+        operand = self.visit(node.operand)
+        if isinstance(node.op, ast.Not):
+            return ast.UnaryOp(op=ast.Invert(), operand=operand)
+        if isinstance(node.op, (ast.USub, ast.UAdd)):
+            return ast.UnaryOp(op=node.op, operand=operand)
+        raise _Unsupported("unary operator")
+
+    def visit_BoolOp(self, node):
+        op = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+        values = [self.visit(value) for value in node.values]
+        result = values[0]
+        for value in values[1:]:
+            result = ast.BinOp(left=result, op=op, right=value)
+        return result
+
+    def visit_Compare(self, node):
+        if len(node.ops) != 1:
+            raise _Unsupported("chained comparison")
+        left, op, right = self.visit(node.left), node.ops[0], node.comparators[0]
+        if isinstance(op, (ast.In, ast.NotIn)):
+            if not isinstance(right, (ast.List, ast.Tuple, ast.Set)):
+                raise _Unsupported("membership test")
+            isin = _method(left, "isin", [ast.List(elts=[self.visit(elt) for elt in right.elts], ctx=ast.Load())])
+            return isin if isinstance(op, ast.In) else ast.UnaryOp(op=ast.Invert(), operand=isin)
+        if isinstance(op, (ast.Is, ast.IsNot)):
+            raise _Unsupported("identity test")
+        return ast.Compare(left=left, ops=[op], comparators=[self.visit(right)])
+
+    def visit_IfExp(self, node):
+        # a if cond else b  ->  pd.Series(a, index=df.index).where(cond, b)
+        index = ast.keyword(arg="index", value=ast.Attribute(value=ast.Name(id="df", ctx=ast.Load()), attr="index", ctx=ast.Load()))
+        body = ast.Call(func=ast.Attribute(value=ast.Name(id="pd", ctx=ast.Load()), attr="Series", ctx=ast.Load()),
+                        args=[self.visit(node.body)], keywords=[index])
+        return _method(body, "where", [self.visit(node.test), self.visit(node.orelse)])
+
+    def visit_Call(self, node):
+        if node.keywords:
+            raise _Unsupported("keyword arguments")
+        func = node.func
+        if isinstance(func, ast.Name) and len(node.args) == 1:
+            value = self.visit(node.args[0])
+            if func.id in CASTS:
+                return _method(value, "astype", [ast.Constant(value=CASTS[func.id])])
+            if func.id == "abs":
+                return _method(value, "abs")
+            if func.id == "len":
+                return _method(ast.Attribute(value=value, attr="str", ctx=ast.Load()), "len")
+        if isinstance(func, ast.Name) and func.id == "round" and len(node.args) == 2:
+            return _method(self.visit(node.args[0]), "round", [self.visit(node.args[1])])
+        if isinstance(func, ast.Attribute) and func.attr in STRING_METHODS:
+            value = ast.Attribute(value=self.visit(func.value), attr="str", ctx=ast.Load())
+            return _method(value, func.attr, [self.visit(arg) for arg in node.args])
+        raise _Unsupported("call")
+
+
+def _is_df_frame(node) -> bool:
+    """df or df[[...]], where a row-wise apply sees every row of df."""
+    if isinstance(node, ast.Subscript) and isinstance(node.slice, ast.List):
+        node = node.value
+    return isinstance(node, ast.Name) and node.id == "df"
+
+
+def _is_df_column(node) -> bool:
+    return (isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id == "df"
+            and isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, str))
+
+
+class _VectorizeApply(ast.NodeTransformer):
+    def __init__(self):
+        self.rewrites = 0
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        func = node.func
+        if not (isinstance(func, ast.Attribute) and func.attr in ("apply", "map") and len(node.args) == 1
+                and isinstance(node.args[0], ast.Lambda) and len(node.args[0].args.args) == 1):
+            return node
+        lambda_node = node.args[0]
+        arg = lambda_node.args.args[0].arg
+        axis = [keyword.value for keyword in node.keywords if keyword.arg == "axis"]
+
+        try:
+            if func.attr == "apply" and _is_df_frame(func.value) and len(node.keywords) == 1 and axis \
+                    and isinstance(axis[0], ast.Constant) and axis[0].value in (1, "columns"):
+                rewritten = _ToColumns(arg).visit(copy.deepcopy(lambda_node.body))
+            elif not node.keywords and _is_df_column(func.value):
+                rewritten = _ToColumns(arg, func.value).visit(copy.deepcopy(lambda_node.body))
+            else:
+                return node
+        except _Unsupported:
+            return node
+
+        self.rewrites += 1
+        return rewritten
+
+
+def rewrite_row_wise(code: str):
+    """
+    Mechanical rewrite of per-row lambdas (df.apply(lambda row: ..., axis=1), df["a"].apply(lambda x: ...))
+    into column expressions. Returns the new code, or None if nothing could be rewritten.
+    The caller checks the result against the original before using it.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    transformer = _VectorizeApply()
+    tree = ast.fix_missing_locations(transformer.visit(tree))
+    if not transformer.rewrites:
+        return None
+    return ast.unparse(tree)
+
+
+async def optimize_script(workflow_id: int, code: str, preview: pd.DataFrame, file_name: str, regenerate):
+    """
+    Replaces a row-wise script by a vectorized version that gives the same output: first the mechanical
+    rewrite, then (if that isn't possible) a new generation with a vectorization hint, via the async
+    regenerate(hint) callable. Both versions are timed in the sandbox on the preview rows repeated to
+    VECTORIZE_BENCH_ROWS rows. Returns (code to use, record of the speedup or None).
+    """
+    if preview.empty:
+        return code, None
+    sample = preview.sample(n=VECTORIZE_BENCH_ROWS, replace=True, random_state=0).reset_index(drop=True)
+    headers = list(preview.columns)
+
+    async def candidates():
+        yield "rewrite", rewrite_row_wise(code)
+        if VECTORIZE_REPROMPT:
+            yield "reprompt", await regenerate(VECTORIZE_HINT)
+
+    async for method, candidate in candidates():
+        if not candidate or candidate == code:
+            continue
+        report = validate_script(candidate, headers)
+        if not report.ok or report.warnings:
+            print(f"Vectorized candidate ({method}) rejected: {report.errors + report.warnings}")
+            continue
+        try:
+            original_seconds, optimized_seconds, same_output = await benchmark_scripts(workflow_id, code, candidate, sample, file_name)
+        except Exception as e:
+            print(f"Vectorized candidate ({method}) failed: {e}")
+            continue
+        if not same_output or optimized_seconds >= original_seconds:
+            print(f"Vectorized candidate ({method}) rejected: same output {same_output}, {optimized_seconds:.4f}s vs {original_seconds:.4f}s")
+            continue
+
+        record_optimization(method, original_seconds, optimized_seconds)
+        return candidate, {
+            "method": method,
+            "original_code": code,
+            "benchmark_rows": len(sample),
+            "original_seconds": round(original_seconds, 6),
+            "optimized_seconds": round(optimized_seconds, 6),
+            "speedup": round(original_seconds / max(optimized_seconds, 1e-9), 1),
+        }
+
+    record_optimization("failed")
+    return code, None
+
+
+def record_optimization(method: str, original_seconds: float = 0.0, optimized_seconds: float = 0.0) -> None:
+    with _stats_lock:
+        _stats["attempts"] += 1
+        if method == "failed":
+            _stats["failed"] += 1
+        else:
+            _stats[method] += 1
+            _stats["seconds_saved"] += max(original_seconds - optimized_seconds, 0.0)
+
+
+@register_collector
+def vectorize_metrics():
+    with _stats_lock:
+        stats = dict(_stats)
+    return [
+        ("workflow_vectorize_attempts_total", "counter", "Row-wise generated scripts the optimizer looked at.", [({}, stats["attempts"])]),
+        ("workflow_vectorize_optimized_total", "counter", "Row-wise scripts replaced by a vectorized version.", [
+            ({"method": "rewrite"}, stats["rewrite"]),
+            ({"method": "reprompt"}, stats["reprompt"]),
+        ]),
+        ("workflow_vectorize_failed_total", "counter", "Row-wise scripts kept as generated.", [({}, stats["failed"])]),
+        ("workflow_vectorize_benchmark_seconds_saved_total", "counter",
+         "Run time saved on the benchmark frames by the vectorized versions.", [({}, round(stats["seconds_saved"], 6))]),
+    ]
@@ -1,20 +1,113 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy import exc
 import os
+import threading
+import time
 from dotenv import load_dotenv
+from app.utils.metrics import register_collector
 
 # Load environment variables
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# Connection pool settings (per engine, per process)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Seconds before a connection is replaced
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+
+
+def to_async_url(url: str) -> str:
+    """Swaps the sync Postgres driver in a URL for asyncpg."""
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+
+class PoolMetrics:
+    """Counters for connection checkouts from one pool."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0  # Time spent waiting for (or opening) a connection
+        self.max_wait_seconds = 0.0
+        self.checkout_seconds = 0.0  # Whole checkout, including the pre-ping
+        self._lock = threading.Lock()
+
+    def record_wait(self, seconds: float) -> None:
+        with self._lock:
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+
+    def record_checkout(self, seconds: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_seconds += seconds
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+
+POOL_METRICS = {"sync": PoolMetrics(), "async": PoolMetrics()}
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that times how long callers wait for a connection."""
+    metrics_key = "sync"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            POOL_METRICS[self.metrics_key].record_timeout()
+            raise
+        finally:
+            POOL_METRICS[self.metrics_key].record_wait(time.perf_counter() - start)
+
+    def connect(self):
+        start = time.perf_counter()
+        connection = super().connect()
+        POOL_METRICS[self.metrics_key].record_checkout(time.perf_counter() - start)
+        return connection
+
+
+class InstrumentedAsyncQueuePool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    metrics_key = "async"
+
+
+POOL_OPTIONS = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_pre_ping": DB_POOL_PRE_PING,
+}
+
+# Async URL can be set explicitly, otherwise it is derived from DATABASE_URL
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+
 # Create the database engine
-engine = create_engine(DATABASE_URL)
+engine = create_engine(DATABASE_URL, poolclass=InstrumentedQueuePool, **POOL_OPTIONS)
+
+# Async engine used by the request handlers
+async_engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=InstrumentedAsyncQueuePool, **POOL_OPTIONS)
 
 # Create a session
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async sessions keep attributes loaded after commit, lazy refreshes aren't possible under asyncio
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 # Define the base model
 Base = declarative_base()
 
@@ -25,3 +118,29 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Dependency to get an async DB session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+POOL_METRIC_DEFINITIONS = [
+    ("db_pool_size", "gauge", "Configured number of persistent connections.", lambda pool, m: pool.size()),
+    ("db_pool_checked_out", "gauge", "Connections currently in use.", lambda pool, m: pool.checkedout()),
+    ("db_pool_overflow", "gauge", "Connections open beyond pool_size.", lambda pool, m: max(pool.overflow(), 0)),
+    ("db_pool_checkouts_total", "counter", "Connections handed out.", lambda pool, m: m.checkouts),
+    ("db_pool_timeouts_total", "counter", "Checkouts that gave up after pool_timeout.", lambda pool, m: m.timeouts),
+    ("db_pool_wait_seconds_total", "counter", "Time spent waiting for a free connection.", lambda pool, m: m.wait_seconds),
+    ("db_pool_wait_seconds_max", "gauge", "Longest wait for a free connection.", lambda pool, m: m.max_wait_seconds),
+    ("db_pool_checkout_seconds_total", "counter", "Time spent in checkouts, including the pre-ping.", lambda pool, m: m.checkout_seconds),
+]
+
+
+@register_collector
+def pool_metrics():
+    pools = {"sync": engine.pool, "async": async_engine.pool}
+    return [
+        (name, metric_type, help_text, [({"engine": key}, getter(pool, POOL_METRICS[key])) for key, pool in pools.items()])
+        for name, metric_type, help_text, getter in POOL_METRIC_DEFINITIONS
+    ]
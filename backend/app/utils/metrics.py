@@ -0,0 +1,28 @@
+# Minimal Prometheus text-format exposition, served at /metrics.
+# Modules register a collector returning their current samples; nothing is scraped until asked for.
+
+_collectors = []
+
+
+def register_collector(collector):
+    """Registers a callable returning a list of (name, type, help, [(labels dict, value), ...])."""
+    _collectors.append(collector)
+    return collector
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{str(value)}"'.replace("\n", " ") for key, value in labels.items())
+    return "{" + pairs + "}"
+
+
+def render_metrics() -> str:
+    lines = []
+    for collector in _collectors:
+        for name, metric_type, help_text, samples in collector():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
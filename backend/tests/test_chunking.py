@@ -0,0 +1,78 @@
+import pandas as pd
+import pytest
+from app.routes.workflow.workflowChunking import chain_is_row_local, is_row_local
+
+ROW_LOCAL = [
+    'result_df = df[df["amount"] > 100]',
+    'df["total"] = df["price"] * df["qty"]\nresult_df = df',
+    'result_df = df[df["status"].isin(["open", "closed"])]',
+    'result_df = df[df["id"].isin({1, 2, 3})]',
+    'df["name"] = df["name"].str.strip().str.lower()\nresult_df = df',
+    'df["flag"] = df["amount"].apply(lambda x: x > 10)\nresult_df = df',
+    'result_df = df.query("amount > 10 and region == \'EU\'")',
+    'result_df = df.drop(columns=["tmp"])',
+    'df["first"] = df["name"].str.split(" ").str[0]\nresult_df = df',
+    'df["label"] = df["name"].str.cat(df["status"], sep="-")\nresult_df = df',
+    'result_df = df.loc[df["amount"] > 10, ["id", "amount"]]',
+]
+
+NOT_ROW_LOCAL = [
+    # Membership checked against the other rows of the same chunk only
+    'result_df = df[df["id"].isin(df["parent_id"])]',
+    'parents = [1, 2]\nresult_df = df[df["id"].isin(parents)]',
+    # Positional access to the first row of each chunk
+    'df["k"] = df["a"].eq(df["a"].values[0])\nresult_df = df',
+    'df["k"] = df["a"].eq(df["a"].array[0])\nresult_df = df',
+    'df["k"] = df["a"].eq(df["a"].to_numpy()[0])\nresult_df = df',
+    'df["k"] = df["a"] - df["a"].iloc[0]\nresult_df = df',
+    # Rows picked by label are in one chunk only
+    'df["rel"] = df["a"] - df.loc[0, "a"]\nresult_df = df',
+    'df["rel"] = df["a"] - df.at[0, "a"]\nresult_df = df',
+    'df["rel"] = df["a"] - df["a"][0]\nresult_df = df',
+    'result_df = df.loc[[0, 1]]',
+    # Joins the whole column into one string
+    'df["all"] = df["name"].str.cat(sep=",")\nresult_df = df',
+    # Aggregates and row order
+    'df["share"] = df["amount"] / df["amount"].sum()\nresult_df = df',
+    'result_df = df.sort_values("amount")',
+    'result_df = df.head(10)',
+    'result_df = df.groupby("region").sum()',
+    'df["prev"] = df["amount"].shift(1)\nresult_df = df',
+    'result_df = df.drop_duplicates()',
+    'result_df = df.apply(lambda col: col / col.max())',
+    'result_df = df.fillna(method="ffill")',
+    'result_df = df.query("amount > @limit")',
+    'result_df = df.iloc[:100]',
+]
+
+
+@pytest.mark.parametrize("code", ROW_LOCAL)
+def test_row_local(code):
+    assert is_row_local(code)
+
+
+@pytest.mark.parametrize("code", NOT_ROW_LOCAL)
+def test_not_row_local(code):
+    assert not is_row_local(code)
+
+
+@pytest.mark.parametrize("code", ROW_LOCAL)
+def test_row_local_steps_give_the_same_result_on_chunks(code):
+    df = pd.DataFrame({
+        "amount": [5, 50, 150, 500], "price": [1.0, 2.0, 3.0, 4.0], "qty": [1, 2, 3, 4],
+        "status": ["open", "new", "closed", "open"], "id": [1, 2, 3, 4], "name": [" A", "b ", "C", "d"],
+        "region": ["EU", "US", "EU", "EU"], "tmp": [0, 0, 0, 0],
+    })
+
+    def run(frame):
+        scope = {"df": frame.copy(), "pd": pd}
+        exec(code, scope)
+        return scope["result_df"]
+
+    chunked = pd.concat([run(df.iloc[:2]), run(df.iloc[2:])])
+    pd.testing.assert_frame_equal(chunked, run(df))
+
+
+def test_chain_is_row_local_needs_every_step():
+    assert chain_is_row_local(ROW_LOCAL[:2])
+    assert not chain_is_row_local([ROW_LOCAL[0], NOT_ROW_LOCAL[0]])
@@ -0,0 +1,17 @@
+from app.routes.workflow import workflowCompiler
+from app.routes.workflow.workflowCompiler import compile_script
+
+
+def test_compiled_script_is_reused():
+    assert compile_script(1, "result_df = df") is compile_script(1, "result_df = df")
+
+
+def test_changed_script_misses_the_cache():
+    assert compile_script(1, "result_df = df") is not compile_script(1, "result_df = df.head()")
+
+
+def test_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(workflowCompiler, "COMPILED_SCRIPT_CACHE_SIZE", 3)
+    for i in range(10):
+        compile_script(2, f"result_df = df.head({i})")
+    assert len(workflowCompiler._compiled_scripts) == 3
@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+from app.routes.workflow.workflowEngines import Engine, get_engine
+
+DF = pd.DataFrame({"region": ["EU", "US", "EU", "APAC"], "amount": [10, 20, 30, 40]})
+
+
+def test_engine_interface_is_abstract():
+    with pytest.raises(TypeError):
+        Engine()
+
+
+def test_pandas_engine_runs_the_chain_step_by_step():
+    result = get_engine("pandas").run(['result_df = df[df["amount"] > 10]', 'df["double"] = df["amount"] * 2'], DF)
+    assert result["double"].tolist() == [40, 60, 80]
+
+
+def test_pandas_engine_reads_files(tmp_path):
+    path = tmp_path / "input.csv"
+    DF.to_csv(path, index=False)
+    assert len(get_engine("pandas").run(['result_df = df[df["region"] == "EU"]'], str(path), "csv")) == 2
+
+
+@pytest.fixture
+def duckdb_engine():
+    pytest.importorskip("duckdb")
+    return get_engine("duckdb")
+
+
+def test_duckdb_step_with_its_own_cte(duckdb_engine):
+    step = "WITH eu AS (SELECT * FROM input WHERE region = 'EU') SELECT region, SUM(amount) AS total FROM eu GROUP BY region"
+    assert duckdb_engine.validate(step, list(DF.columns)).ok
+    result = duckdb_engine.run([step], DF)
+    assert result.to_dict("records") == [{"region": "EU", "total": 40}]
+
+
+def test_duckdb_chain_of_cte_and_plain_steps(duckdb_engine):
+    steps = [
+        "SELECT * FROM input WHERE amount > 10",
+        "WITH t AS (SELECT *, amount * 2 AS double FROM input) SELECT * FROM t ORDER BY amount DESC",
+        "SELECT region, double FROM input ORDER BY double",
+    ]
+    result = duckdb_engine.run(steps, DF)
+    assert result["double"].tolist() == [40, 60, 80]
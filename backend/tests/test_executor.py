@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+from app.routes.workflow import workflowExecutor
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def in_process(monkeypatch):
+    """SANDBOX_WORKERS=0: jobs run in the API process, where the sandbox limits must not be set."""
+    monkeypatch.setattr(workflowExecutor, "SANDBOX_WORKERS", 0)
+
+    def job_limits():
+        raise AssertionError("_job_limits() applied to the API process")
+
+    monkeypatch.setattr(workflowExecutor, "_job_limits", job_limits)
+
+
+@pytest.mark.anyio
+async def test_dry_run_in_process_skips_job_limits(in_process):
+    preview = pd.DataFrame({"a": [1, 2]})
+    columns = await workflowExecutor.dry_run_script(1, 'df["b"] = df["a"] * 2\nresult_df = df', preview)
+    assert columns == ["a", "b"]
+
+
+@pytest.mark.anyio
+async def test_benchmark_in_process_skips_job_limits(in_process):
+    sample = pd.DataFrame({"a": [1, 2]})
+    original = 'df["b"] = df["a"].apply(lambda x: x * 2)\nresult_df = df'
+    candidate = 'df["b"] = df["a"] * 2\nresult_df = df'
+    *_, same = await workflowExecutor.benchmark_scripts(1, original, candidate, sample)
+    assert same
+
+
+@pytest.mark.anyio
+async def test_projected_run_that_misses_a_column_loads_every_column(monkeypatch):
+    monkeypatch.setattr(workflowExecutor, "SANDBOX_WORKERS", 0)
+    loads = []
+
+    def run_workflow_scripts(workflow_id, file_name, scripts, profile=None, input_columns=None):
+        loads.append(input_columns)
+        profile.append({"step": 1})
+        if input_columns is not None:
+            raise KeyError("b")
+        return pd.DataFrame({"a": [1], "b": [2]}), None
+
+    monkeypatch.setattr(workflowExecutor, "run_workflow_scripts", run_workflow_scripts)
+    steps = []
+    df = await workflowExecutor.execute_workflow(1, "1_x.csv", ["result_df = df"], steps, "pandas", ["a"])
+    assert loads == [["a"], None]
+    assert list(df.columns) == ["a", "b"] and steps == [{"step": 1}]
@@ -0,0 +1,44 @@
+import pytest
+from app.routes.workflow import workflowJobs
+from app.routes.workflow.workflowModels import WorkflowJob
+
+
+class FakeSession:
+    """Stands in for AsyncSessionLocal(): the job exists, its workflow doesn't."""
+
+    def __init__(self, job):
+        self.job = job
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def get(self, model, ident, **kwargs):
+        return self.job if model is WorkflowJob and ident == self.job.id else None
+
+    async def commit(self):
+        pass
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.mark.anyio
+async def test_job_of_deleted_workflow_fails_right_away(monkeypatch):
+    job = WorkflowJob(id=7, workflow_id=3, status="running", attempts=1)
+    monkeypatch.setattr(workflowJobs, "AsyncSessionLocal", lambda: FakeSession(job))
+
+    async def execute_workflow(*args, **kwargs):
+        raise AssertionError("a job without workflow must not run")
+
+    monkeypatch.setattr(workflowJobs, "execute_workflow", execute_workflow)
+
+    await workflowJobs.run_job(job.id)
+
+    assert job.status == "failed"
+    assert job.error == "workflow not found"
+    assert job.finished_at is not None
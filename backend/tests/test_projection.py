@@ -0,0 +1,72 @@
+import pandas as pd
+import pytest
+from app.routes.workflow.workflowLoader import projected_columns, read_frame
+from app.routes.workflow.workflowProjection import chain_input_columns
+
+DF = pd.DataFrame({
+    "region": ["EU", "US", "EU", "APAC"],
+    "amount": [10.0, 20.0, 30.0, 40.0],
+    "qty": [1, 2, 3, 4],
+    "status": ["open", "closed", "open", "open"],
+    "notes": ["a", "b", "c", "d"],
+})
+
+
+def run_chain(scripts, df):
+    for code in scripts:
+        scope = {"df": df.copy(), "pd": pd}
+        scope["result_df"] = scope["df"]
+        exec(code, scope)
+        df = scope["result_df"]
+    return df
+
+
+@pytest.mark.parametrize("scripts, expected", [
+    (['result_df = df[["region", "amount"]]'], ["amount", "region"]),
+    (['result_df = df[df["status"] == "open"][["region", "amount"]]'], ["amount", "region", "status"]),
+    (['result_df = df.groupby("region").agg(total=("amount", "sum")).reset_index()'], ["amount", "region"]),
+    (['result_df = df.groupby("region", as_index=False)["amount"].agg("mean")'], ["amount", "region"]),
+    (['df["total"] = df["amount"] * df["qty"]', 'result_df = df[["region", "total"]]'], ["amount", "qty", "region"]),
+    (['result_df = df.query("amount > 15 and region == \'EU\'")[["amount"]]'], ["amount", "region"]),
+    (['df["label"] = df["region"].str.lower() + "_x"\nresult_df = df[["label", "qty"]]'], ["qty", "region"]),
+    # Columns read by attribute further down a chain, column lists built with +
+    (['df["total"] = df.groupby("region").amount.transform("sum")\nresult_df = df[["region", "total"]]'], ["amount", "region"]),
+    (['cols = ["region"] + ["amount"]\nx = df[cols]\nresult_df = x[["region"]]'], ["amount", "region"]),
+    # Nothing narrows the columns down
+    (['result_df = df[df["amount"] > 15]'], None),
+    # Reducers across the columns of each row read every column, positional axis included
+    (['df["total"] = df.sum(1, numeric_only=True)\nresult_df = df[["total"]]'], None),
+    (['df["top"] = df.max(1, numeric_only=True)\nresult_df = df[["top"]]'], None),
+    (['df["filled"] = df.count(1)\nresult_df = df[["filled"]]'], None),
+    (['df["total"] = df.sum(axis="columns", numeric_only=True)\nresult_df = df[["total"]]'], None),
+    (['result_df = df.apply(lambda row: row.sum(), axis=1).to_frame()'], None),
+])
+def test_chain_input_columns(scripts, expected):
+    assert chain_input_columns(scripts) == expected
+
+
+@pytest.mark.parametrize("scripts", [
+    ['result_df = df[["region", "amount"]]'],
+    ['df["total"] = df["amount"] * df["qty"]', 'result_df = df[["region", "total"]]'],
+    ['df["total"] = df.sum(1, numeric_only=True)\nresult_df = df[["total"]]'],
+    ['df["filled"] = df.count(1)\nresult_df = df[["filled"]]'],
+    ['df["one"] = 1\nresult_df = df[["one"]]'],
+    ['df["total"] = df.groupby("region").amount.transform("sum")\nresult_df = df[["region", "total"]]'],
+    ['cols = ["region"] + ["amount"]\nx = df[cols]\nresult_df = x[["region"]]'],
+    ['result_df = df.groupby("region").agg(total=("amount", "sum")).reset_index()'],
+    ['result_df = df[df["status"].isin(["open"])].groupby("region")["qty"].sum().reset_index()'],
+])
+def test_projected_load_gives_the_same_result(scripts, tmp_path):
+    path = tmp_path / "upload.csv"
+    DF.to_csv(path, index=False)
+    full, _ = read_frame(str(path), "csv")
+    projected, _ = read_frame(str(path), "csv", columns=chain_input_columns(scripts))
+    pd.testing.assert_frame_equal(run_chain(scripts, projected), run_chain(scripts, full))
+
+
+def test_projection_naming_unknown_columns_loads_everything():
+    assert projected_columns(["total"], list(DF.columns)) is None
+    assert projected_columns(["amount", "total"], list(DF.columns)) is None
+    assert projected_columns([], list(DF.columns)) is None
+    assert projected_columns(["region", "amount"], list(DF.columns)) == ["region", "amount"]
+    assert projected_columns(None, list(DF.columns)) is None
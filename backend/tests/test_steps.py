@@ -0,0 +1,31 @@
+import pytest
+from sqlalchemy.dialects import postgresql
+from app.routes.workflow.workflowSteps import lock_workflow
+
+
+class RecordingSession:
+    """Keeps the SQL it's given; the workflow has two steps."""
+
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, statement):
+        self.statements.append(str(statement.compile(dialect=postgresql.dialect())))
+
+    async def scalar(self, statement):
+        self.statements.append(str(statement.compile(dialect=postgresql.dialect())))
+        return 2
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.mark.anyio
+async def test_lock_workflow_locks_the_row_before_counting_steps():
+    db = RecordingSession()
+    assert await lock_workflow(db, 7) == 2
+    lock, count = db.statements
+    assert "FROM workflows" in lock and lock.endswith("FOR UPDATE")
+    assert "count(*)" in count and "FROM workflow_steps" in count
@@ -0,0 +1,120 @@
+import os
+import time
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.routes.workflow import workflowUploadStore as store
+
+
+@pytest.fixture
+def dirs(tmp_path, monkeypatch):
+    temp = tmp_path / "temp"
+    for name, path in [("TEMP_DIR", temp), ("UPLOAD_STORE_DIR", temp / "uploads"),
+                       ("CHECKPOINT_DIR", temp / "checkpoints"), ("SHEET_CACHE_DIR", temp / "sheets")]:
+        path.mkdir(parents=True, exist_ok=True)
+        monkeypatch.setattr(store, name, str(path))
+    return temp
+
+
+def put_blob(digest: str, size: int, age: float) -> None:
+    path = store.blob_path(digest)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    used = time.time() - age
+    os.utime(path, (used, used))
+
+
+def test_eviction_is_lru_and_keeps_referenced_and_recent_content(dirs, monkeypatch):
+    monkeypatch.setattr(store, "UPLOAD_STORE_MAX_MB", 1)
+    mb = 1024 * 1024
+    put_blob("aa" + "0" * 62, mb, age=3000)  # Oldest, still referenced
+    put_blob("bb" + "0" * 62, mb, age=2000)
+    put_blob("cc" + "0" * 62, mb, age=1000)
+    put_blob("dd" + "0" * 62, mb, age=0)  # Just stored
+
+    total, candidates = store.eviction_candidates()
+    assert total == 4 * mb
+    assert [digest[:2] for digest, _ in candidates] == ["aa", "bb", "cc"]
+
+    freed = store.evict_store(total, candidates, referenced={"aa" + "0" * 62})
+    assert freed == 2 * mb
+    remaining = {digest[:2] for _, digest, _ in store._store_entries()}
+    assert remaining == {"aa", "dd"}
+
+
+def test_nothing_to_evict_within_budget(dirs):
+    put_blob("aa" + "0" * 62, 10, age=3000)
+    assert store.eviction_candidates() == (10, [])
+
+
+def link_raw(dirs, name: str, digest: str) -> None:
+    """A raw upload as link_upload makes it, a hard link to its blob."""
+    put_blob(digest, 1, age=0)
+    os.link(store.blob_path(digest), dirs / name)
+
+
+def test_orphan_sweep_only_removes_files_of_missing_workflows(dirs):
+    link_raw(dirs, "1_a.csv", "aa" + "0" * 62)
+    link_raw(dirs, "2_b.csv", "bb" + "0" * 62)
+    for name in ("1.arrow", "2.schema.json", "notes.txt"):
+        (dirs / name).write_text("x")
+    (dirs / "checkpoints" / "2").mkdir()
+    files = store.workflow_files()
+    assert set(files) == {1, 2}
+
+    assert store.sweep_orphans(files, existing={1}) == 3
+    assert sorted(os.listdir(dirs)) == ["1.arrow", "1_a.csv", "checkpoints", "notes.txt", "sheets", "uploads"]
+    assert os.listdir(dirs / "checkpoints") == []
+
+
+def test_orphan_sweep_keeps_files_the_store_did_not_write(dirs):
+    # Sample workbooks tracked in the repo, uploads from before the store
+    (dirs / "3_employee_payroll.xlsx").write_text("x")
+    (dirs / "8_updated_payroll_data.xlsx").write_text("x")
+    files = store.workflow_files()
+    assert files == {}
+    assert store.sweep_orphans(files, existing=set()) == 0
+    assert sorted(os.listdir(dirs)) == ["3_employee_payroll.xlsx", "8_updated_payroll_data.xlsx", "checkpoints", "sheets", "uploads"]
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.mark.anyio
+async def test_evict_uploads_only_looks_up_what_is_on_disk(dirs, monkeypatch):
+    link_raw(dirs, "5_a.csv", "aa" + "0" * 62)
+    link_raw(dirs, "9_b.csv", "bb" + "0" * 62)
+    lookups = []
+
+    async def present(db, column, values):
+        lookups.append((column.key, sorted(values)))
+        return {5} if column.key == "id" else set()
+
+    class Session:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+    monkeypatch.setattr(store, "_present", present)
+    monkeypatch.setattr(store, "AsyncSessionLocal", Session)
+    await store.evict_uploads(force=True)
+
+    assert lookups == [("id", [5, 9]), ("upload_hash", [])]
+    assert sorted(os.listdir(dirs)) == ["5_a.csv", "checkpoints", "sheets", "uploads"]
+
+
+def test_oversized_upload_is_refused_from_its_content_length(monkeypatch):
+    monkeypatch.setattr(store, "MAX_UPLOAD_MB", 0)
+    monkeypatch.setattr(store, "MULTIPART_OVERHEAD_BYTES", 100)
+    response = TestClient(app).post("/workflow/start-workflow", files={"file": ("a.csv", b"x" * 1000)})
+    assert response.status_code == 413
+
+
+@pytest.mark.parametrize("content_length, too_large", [(None, False), ("abc", False), ("10", False), (str(2 ** 50), True)])
+def test_request_too_large(content_length, too_large):
+    assert store.request_too_large(content_length) == too_large
@@ -0,0 +1,91 @@
+import pytest
+from app.routes.workflow.workflowValidation import validate_script, validate_sql
+
+HEADERS = ["Name", "Salary", "Region"]
+
+
+@pytest.mark.parametrize("code", [
+    'df["Bonus"] = df["Salary"] * 0.1\nresult_df = df[["Name", "Bonus"]]',
+    'df.rename(columns={"Salary": "Pay"}, inplace=True)\nresult_df = df[df["Pay"] > 10]',
+    'df.insert(0, "Bonus", df["Salary"] * 0.1)\nresult_df = df[["Name", "Bonus"]]',
+    'df.eval("Pay = Salary * 2", inplace=True)\nresult_df = df[["Pay"]]',
+    'df.columns = ["N", "S", "R"]\nresult_df = df[["N"]]',
+    'df = df.assign(Pay=df["Salary"])\nresult_df = df[["Pay"]]',
+    'df.loc[:, "Pay"] = df["Salary"]\nresult_df = df.groupby("Pay").sum()',
+    'result_df = df.sort_values(by="Salary").drop_duplicates(subset=["Name"])',
+    'result_df = df.dropna(0).dropna(subset=["Salary"])',
+    'for rate in [1, 2]:\n    df["Pay"] = df["Salary"] * rate\nresult_df = df[["Pay"]]',
+    'if len(df) > 1:\n    df["Pay"] = df["Salary"]\nelse:\n    df["Pay"] = 0\nresult_df = df.groupby("Pay").sum()',
+    'for name in ["a", "b"]:\n    df[name] = 1\nresult_df = df[["a", "b"]]',
+])
+def test_valid_scripts_pass(code):
+    report = validate_script(code, HEADERS)
+    assert report.ok, report.errors
+
+
+def test_unknown_column_is_reported_with_a_hint():
+    report = validate_script('result_df = df[df["Salery"] > 10]', HEADERS)
+    assert report.errors == ["Line 1: unknown column 'Salery', did you mean 'Salary'?"]
+
+
+def test_unknown_column_in_a_block_is_reported():
+    report = validate_script('for rate in [1, 2]:\n    df["Pay"] = df["Salery"] * rate\nresult_df = df', HEADERS)
+    assert len(report.errors) == 1 and "Salery" in report.errors[0]
+
+
+def test_unknown_column_in_dropna_subset_is_reported():
+    report = validate_script('result_df = df.dropna(subset=["Salery"])', HEADERS)
+    assert len(report.errors) == 1 and "Salery" in report.errors[0]
+
+
+def test_unknown_column_before_a_rename_is_still_reported():
+    report = validate_script('df["Pay"] = df["Salery"]\ndf.rename(columns={"Pay": "P"}, inplace=True)', HEADERS)
+    assert len(report.errors) == 1 and "Salery" in report.errors[0]
+
+
+@pytest.mark.parametrize("code", [
+    "import os\nresult_df = df",
+    'df.to_csv("out.csv")\nresult_df = df',
+    'result_df = pd.read_csv("/etc/passwd")',
+    "result_df = df.__class__",
+    'open("x")\nresult_df = df',
+    'from pandas import read_csv\nresult_df = read_csv("x.csv")',
+    'from numpy import load\nresult_df = df',
+    'import numpy as np\nnp.save("x.npy", df.values)\nresult_df = df',
+    'df.values.tofile("x.bin")\nresult_df = df',
+    'result_df = pd.io.parsers.read_csv("x.csv")',
+    'pd.io.common.os.system("id")\nresult_df = df',
+    'result_df = df.style.read_csv("x.csv")',
+    'import pandas.io\nresult_df = df',
+    'import statistics\nstatistics.sys.exit()\nresult_df = df',
+    'x = pd.core.frame\nresult_df = df',
+])
+def test_unsafe_scripts_are_rejected(code):
+    assert not validate_script(code, HEADERS).ok
+
+
+@pytest.mark.parametrize("code", [
+    'import numpy as np\ndf["Bonus"] = np.where(df["Salary"] > 10, 1, 0)\nresult_df = df',
+    'from pandas.api.types import is_numeric_dtype\nresult_df = df',
+    'df["Day"] = pd.to_datetime(df["Name"]) + pd.offsets.Day(1)\nresult_df = df',
+    'from datetime import datetime\ndf["Now"] = datetime.now()\nresult_df = df',
+])
+def test_allowed_modules_pass(code):
+    report = validate_script(code, HEADERS)
+    assert report.ok, report.errors
+
+
+def test_row_wise_apply_is_a_warning():
+    report = validate_script('df["x"] = df.apply(lambda r: r["Salary"] * 2, axis=1)\nresult_df = df', HEADERS)
+    assert report.ok and report.warnings
+
+
+@pytest.mark.parametrize("code, ok", [
+    ("SELECT * FROM input WHERE amount > 10", True),
+    ("WITH t AS (SELECT * FROM input) SELECT * FROM t", True),
+    ("SELECT * FROM read_csv('x.csv')", False),
+    ("SELECT 1; DROP TABLE input", False),
+    ("COPY input TO 'x.csv'", False),
+])
+def test_validate_sql(code, ok):
+    assert validate_sql(code).ok == ok
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+from app.routes.workflow.workflowVectorize import rewrite_row_wise
+
+ROW_WISE = [
+    'df["total"] = df.apply(lambda row: row["price"] * row["qty"], axis=1)\nresult_df = df',
+    'df["big"] = df.apply(lambda row: row["price"] > 2 and row["qty"] > 1, axis=1)\nresult_df = df',
+    'df["label"] = df.apply(lambda row: "high" if row["price"] > 2 else "low", axis=1)\nresult_df = df',
+    'df["name"] = df["name"].apply(lambda x: x.strip().lower())\nresult_df = df',
+    'df["name_len"] = df["name"].apply(lambda x: len(x))\nresult_df = df',
+    'df["qty_text"] = df["qty"].apply(lambda x: str(x))\nresult_df = df',
+    'df["double"] = df["price"].map(lambda x: x * 2 + 1)\nresult_df = df',
+]
+
+
+def run(code, df):
+    scope = {"df": df.copy(), "pd": pd, "np": np}
+    exec(code, scope)
+    return scope["result_df"]
+
+
+@pytest.mark.parametrize("code", ROW_WISE)
+def test_rewrite_gives_the_same_output(code):
+    df = pd.DataFrame({"price": [1.5, 2.5, 3.0, 0.5], "qty": [1, 2, 3, 4], "name": [" Ann", "BOB ", "cy", "Dee"]})
+    rewritten = rewrite_row_wise(code)
+    assert rewritten is not None and "apply" not in rewritten and "map(" not in rewritten
+    pd.testing.assert_frame_equal(run(rewritten, df), run(code, df))
+
+
+@pytest.mark.parametrize("code", [
+    'result_df = df[df["price"] > 2]',
+    # Needs the whole row object, not single fields
+    'df["n"] = df.apply(lambda row: len(row), axis=1)\nresult_df = df',
+    'df["x"] = df.apply(lambda row: sorted(row), axis=1)\nresult_df = df',
+])
+def test_nothing_to_rewrite(code):
+    assert rewrite_row_wise(code) is None